@@ -0,0 +1,109 @@
+"""Seeded generator of realistic *_swap documents for benchmarks."""
+import numpy as np
+import pandas as pd
+
+from sniper_engine import HIGH_GAS_FEE, LAUNCH_BLOCK_WINDOW, LARGE_BUY_THRESHOLD
+from swap_data import SWAP_COLLECTIONS
+
+TOKENS = tuple(col_name.replace('_swap', '').upper() for col_name in SWAP_COLLECTIONS)
+BASE_TIME = pd.Timestamp("2025-01-01")
+FIRST_LAUNCH_BLOCK = 25_000_000
+SECONDS_PER_BLOCK = 2
+ACTIVE_BLOCKS = 30 * 86400 // SECONDS_PER_BLOCK
+TAX_RATE = 0.01
+
+
+def _addresses(rng, n):
+    prefixes = rng.integers(0, 2**63, size=n, dtype=np.int64)
+    return np.array([f"0x{prefix:024x}{i:016x}" for i, prefix in enumerate(prefixes)], dtype=object)
+
+
+def _token_swaps(rng, token, n_rows, launch_block, makers, sniper_makers):
+    # Long tail: a few wallets trade constantly, most trade once or twice
+    weights = 1.0 / np.arange(1, len(makers) + 1)
+    maker = rng.choice(makers, n_rows, p=weights / weights.sum())
+    # Activity decays after launch
+    block = launch_block + np.minimum(rng.exponential(ACTIVE_BLOCKS / 6, n_rows), ACTIVE_BLOCKS).astype(np.int64)
+    is_buy = rng.random(n_rows) < 0.55
+    tokens = rng.lognormal(9.0, 1.6, n_rows)
+    fee = np.where(rng.random(n_rows) < 0.05, HIGH_GAS_FEE * 5, HIGH_GAS_FEE / 4)
+
+    # Launch-window snipers: a burst of large high-gas buys, mostly sold minutes later
+    n_snipers = len(sniper_makers)
+    buys_each = 3
+    sniper_buy_maker = np.repeat(sniper_makers, buys_each)
+    sniper_buy_block = launch_block + rng.integers(0, LAUNCH_BLOCK_WINDOW, n_snipers * buys_each)
+    sniper_buy_tokens = rng.uniform(LARGE_BUY_THRESHOLD / buys_each, LARGE_BUY_THRESHOLD, n_snipers * buys_each)
+    quick = rng.random(n_snipers) < 0.8
+    sniper_sell_block = launch_block + LAUNCH_BLOCK_WINDOW + np.where(
+        quick, rng.integers(60, 600, n_snipers), rng.integers(5_000, ACTIVE_BLOCKS, n_snipers))
+    sniper_sell_tokens = sniper_buy_tokens.reshape(n_snipers, buys_each).sum(axis=1) * rng.uniform(0.5, 1.0, n_snipers)
+
+    frame = pd.DataFrame({
+        "blockNumber": np.concatenate([block, sniper_buy_block, sniper_sell_block]),
+        "maker": np.concatenate([maker, sniper_buy_maker, sniper_makers]),
+        "swapType": np.concatenate([
+            np.where(is_buy, "buy", "sell"), np.full(n_snipers * buys_each, "buy"), np.full(n_snipers, "sell")]),
+        "amount": np.concatenate([tokens, sniper_buy_tokens, sniper_sell_tokens]),
+        "transactionFee": np.concatenate([fee, np.full(n_snipers * (buys_each + 1), HIGH_GAS_FEE * 10)]),
+    }).sort_values("blockNumber", kind="mergesort", ignore_index=True)
+
+    n = len(frame)
+    buy = (frame["swapType"] == "buy").to_numpy()
+    amount = frame.pop("amount").to_numpy()
+    price = 0.005 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    virtual_price = 1.5 * np.exp(np.cumsum(rng.normal(0, 0.0005, n)))
+    virtual = amount * price / virtual_price
+    timestamp = int(BASE_TIME.timestamp()) + (frame["blockNumber"].to_numpy() - FIRST_LAUNCH_BLOCK) * SECONDS_PER_BLOCK
+    readable = np.char.replace(np.datetime_as_string(timestamp.astype("datetime64[s]"), unit="s"), "T", " ")
+
+    frame["txHash"] = [f"0x{value:064x}" for value in rng.integers(0, 2**63, size=n, dtype=np.int64)]
+    frame["label"] = np.where(rng.random(n) < 0.9, "normal", "bot")
+    frame["timestamp"] = timestamp
+    frame["timestampReadable"] = readable.astype(object)
+    frame[f"{token}_OUT_BeforeTax"] = np.where(buy, amount, 0.0)
+    frame[f"{token}_OUT_AfterTax"] = np.where(buy, amount * (1 - TAX_RATE), 0.0)
+    frame[f"{token}_IN_BeforeTax"] = np.where(buy, 0.0, amount)
+    frame[f"{token}_IN_AfterTax"] = np.where(buy, 0.0, amount * (1 - TAX_RATE))
+    frame[f"{token}_OUT"] = np.where(buy, amount, 0.0)
+    frame[f"{token}_IN"] = np.where(buy, 0.0, amount)
+    frame["Virtual_IN"] = np.where(buy, virtual, 0.0)
+    frame["Virtual_OUT"] = np.where(buy, 0.0, virtual)
+    frame["genesis_usdc_price"] = price
+    frame["genesis_virtual_price"] = price / virtual_price
+    frame["virtual_usdc_price"] = virtual_price
+    frame["Tax_1pct"] = virtual * TAX_RATE
+    frame["genesis_token_symbol"] = token
+    frame["persona_name"] = token.title()
+    return frame
+
+
+def generate_swaps(n_rows, tokens=TOKENS, n_makers=None, sniper_share=0.002, seed=0):
+    """Synthetic swap documents for roughly `n_rows` swaps spread over `tokens`.
+
+    Returns ({collection name: frame of documents}, {token: launch block}).
+    Frames carry the same fields and token-prefixed amount columns as the
+    real collections, sorted by blockNumber. Makers follow a long-tailed
+    distribution and a `sniper_share` of them buy big inside each token's
+    launch window, most selling again within minutes.
+    """
+    rng = np.random.default_rng(seed)
+    n_makers = n_makers or max(100, n_rows // 5)
+    makers = _addresses(rng, n_makers)
+    n_snipers = max(1, int(n_makers * sniper_share))
+    per_token = n_rows // len(tokens)
+
+    collections, launch_blocks = {}, {}
+    for i, token in enumerate(tokens):
+        launch_block = FIRST_LAUNCH_BLOCK + i * 50_000
+        sniper_makers = rng.choice(makers, n_snipers, replace=False)
+        collections[f"{token.lower()}_swap"] = _token_swaps(rng, token, per_token, launch_block, makers, sniper_makers)
+        launch_blocks[token] = launch_block
+    return collections, launch_blocks
+
+
+def documents(frame, fields=None):
+    """Plain dicts as pymongo would decode them, optionally limited to `fields`"""
+    if fields is not None:
+        frame = frame[[col for col in frame.columns if col in fields]]
+    return frame.to_dict("records")
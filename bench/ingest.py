@@ -0,0 +1,120 @@
+"""Docs/sec of the dict-based and raw BSON swap ingest paths.
+
+    python -m bench.ingest                    # 1M rows, BSON encoded in memory
+    python -m bench.ingest --rows 100k --repeat 5
+    python -m bench.ingest --source mongo --uri mongodb://localhost:27017
+
+With --source memory the generated swaps are encoded into BSON batches up
+front, so only decoding is timed: `bson.decode_all` into dicts plus
+`stream_frame`, against `bson_columns.decode_batch`. With --source mongo
+both paths run through `load_frame` against the bench database (seeded as
+in bench.run), so the timings include the round trips. Exits 1 if the two
+paths give different frames.
+"""
+import argparse
+import sys
+import time
+
+import bson
+import pandas as pd
+
+from bench.generator import documents, generate_swaps
+from bench.run import BENCH_DB, parse_size, seed_mongo
+from bson_columns import decode_batch
+from swap_data import INGEST_BATCH_SIZE, load_frame, stream_frame, swap_projection
+
+
+def encoded_batches(collections, batch_size):
+    """{collection: [raw BSON batch, ...]} of the projected swap documents"""
+    batches = {}
+    for col_name, frame in collections.items():
+        docs = documents(frame, swap_projection(col_name.replace('_swap', '').upper() + "_"))
+        batches[col_name] = [
+            b"".join(bson.encode({"_id": bson.ObjectId(), **doc}) for doc in docs[start:start + batch_size])
+            for start in range(0, len(docs), batch_size)
+        ]
+    return batches
+
+
+class _Batches:
+    """Just enough cursor for `stream_frame`: the dicts of already fetched batches"""
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        for data in self.batches:
+            yield from bson.decode_all(data)
+
+
+def dict_path(batches):
+    return stream_frame(_Batches(batches)).drop(columns=["_id"])
+
+
+def raw_path(batches):
+    chunks = [decode_batch(data) for data in batches]
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+
+def best_of(repeat, func, *args):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Docs/sec of the dict-based and raw BSON swap ingest paths")
+    parser.add_argument("--rows", default="1M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per path; the best is reported")
+    parser.add_argument("--source", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--uri", default="mongodb://localhost:27017", help="mongod for --source mongo")
+    args = parser.parse_args(argv)
+
+    rows = parse_size(args.rows)
+    collections, _ = generate_swaps(rows, seed=args.seed)
+    if args.source == "mongo":
+        from pymongo import MongoClient
+        db = MongoClient(args.uri)[BENCH_DB]
+        seed_mongo(db, collections, rows, args.seed)
+        inputs = {
+            col_name: (db[col_name], swap_projection(col_name.replace('_swap', '').upper() + "_"))
+            for col_name in collections
+        }
+        paths = {
+            "dict": lambda col, projection: load_frame(col, None, projection, args.batch_size, raw=False),
+            "raw": lambda col, projection: load_frame(col, None, projection, args.batch_size, raw=True),
+        }
+    else:
+        inputs = {col_name: (batches,) for col_name, batches in encoded_batches(collections, args.batch_size).items()}
+        paths = {"dict": dict_path, "raw": raw_path}
+
+    ok = True
+    totals = {name: 0.0 for name in paths}
+    docs = 0
+    for col_name, col_args in inputs.items():
+        results = {}
+        for name, path in paths.items():
+            elapsed, results[name] = best_of(args.repeat, path, *col_args)
+            totals[name] += elapsed
+        same = results["dict"].equals(results["raw"]) and (results["dict"].dtypes == results["raw"].dtypes).all()
+        ok &= bool(same)
+        docs += len(results["dict"])
+        print(f"{col_name:14} {len(results['dict']):>10,} docs{'' if same else '  MISMATCH'}")
+
+    for name, elapsed in totals.items():
+        print(f"{name:5} {elapsed:8.3f}s  {docs / elapsed:>12,.0f} docs/s")
+    print(f"raw / dict speedup: {totals['dict'] / totals['raw']:.1f}x")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
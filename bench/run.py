@@ -0,0 +1,196 @@
+"""Benchmark the swap pipeline stages on synthetic data.
+
+    python -m bench.run                                   # all stages, 10k..10M rows
+    python -m bench.run --sizes 10k,100k --stages load,detect
+    python -m bench.run --source mongo --uri mongodb://localhost:27017
+    PNL_WORKERS=1 python -m bench.run --stages pnl,pnl_all   # serial lot matching
+
+Every (stage, size) runs in a fresh subprocess so peak RSS is per run. One
+JSON object per run is appended to --output with the wall time of the timed
+stage, the process's peak RSS before and after it, and the row counts.
+Inputs a stage needs (the loaded frame, detected snipers) are built before
+its timer starts.
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from bench.generator import documents, generate_swaps
+from pnl_engine import PNL_WORKERS, fifo_pnl, latest_prices, wallet_trade_stats
+from pnl_state import PnLStateStore
+from sniper_engine import find_sniper_buys
+from swap_data import clean_swaps, compact_swaps, decode_swaps, load_collection, load_collections, swap_projection
+from wallet_ids import encode_makers
+
+STAGES = ["load", "detect", "pnl", "pnl_all"]
+SIZES = ["10k", "100k", "1M", "10M"]
+BENCH_DB = "bench_swaps"
+
+
+def parse_size(size):
+    scale = {"k": 1_000, "m": 1_000_000}.get(size[-1].lower())
+    return int(float(size[:-1]) * scale) if scale else int(size)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _projected(collections):
+    return {
+        col_name: documents(frame, swap_projection(col_name.replace('_swap', '').upper() + "_"))
+        for col_name, frame in collections.items()
+    }
+
+
+def seed_mongo(db, collections, rows, seed, batch_size=50_000):
+    """Insert the generated swaps, unless the same (rows, seed) data set is already there"""
+    marker = {"_id": "dataset", "rows": rows, "seed": seed}
+    if db["bench_meta"].find_one(marker):
+        return
+    db["bench_meta"].delete_many({})
+    for col_name, frame in collections.items():
+        db[col_name].drop()
+        for start in range(0, len(frame), batch_size):
+            db[col_name].insert_many(documents(frame.iloc[start:start + batch_size]), ordered=False)
+    db["bench_meta"].insert_one(marker)
+
+
+class Run:
+    """Lazily builds each stage's inputs so only the timed stage is measured"""
+
+    def __init__(self, rows, source, uri, seed):
+        self.collections, self.launch_blocks = generate_swaps(rows, seed=seed)
+        self.source = source
+        if source == "mongo":
+            from pymongo import MongoClient
+            self.db = MongoClient(uri)[BENCH_DB]
+            seed_mongo(self.db, self.collections, rows, seed)
+            self.collections = {col_name: None for col_name in self.collections}
+        else:
+            self.docs = _projected(self.collections)
+        self._swaps = None
+        self._snipers = None
+
+    def load(self):
+        if self.source == "mongo":
+            frames, _ = load_collections(list(self.collections), lambda col_name: load_collection(self.db, col_name))
+        else:
+            frames = [decode_swaps(docs, col_name) for col_name, docs in self.docs.items()]
+        return encode_makers(compact_swaps(clean_swaps(pd.concat([df for df in frames if df is not None], ignore_index=True))))
+
+    def swaps(self):
+        if self._swaps is None:
+            self._swaps = self.load()
+        return self._swaps
+
+    def detect(self):
+        return find_sniper_buys(self.swaps(), self.launch_blocks)
+
+    def snipers(self):
+        if self._snipers is None:
+            self._snipers = self.detect()
+        return self._snipers
+
+    def pnl(self):
+        # global page: fold every swap into fresh state, then read the sniper pairs
+        store = PnLStateStore()
+        store.fold(self.swaps())
+        return store.wallet_pnl(self.snipers()[["wallet_id", "token_name"]].drop_duplicates())
+
+    def pnl_all(self):
+        # token page: every wallet of the busiest token
+        swaps = self.swaps()
+        token = swaps["token_name"].value_counts().idxmax()
+        trades = swaps[swaps["token_name"] == token]
+        stats = wallet_trade_stats(trades, ["wallet_id", "token_name"])
+        fifo = fifo_pnl(
+            trades, ["wallet_id", "token_name"],
+            buy_amount_col="OUT_AfterTax", buy_cost_col="OUT_BeforeTax",
+            sell_amount_col="IN_BeforeTax", sell_net_col="IN_AfterTax",
+            time_col="timestampReadable", latest_price=latest_prices(trades, time_col="timestampReadable"),
+        )
+        return stats.join(fifo)
+
+    def prepare(self, stage):
+        if stage in ("detect", "pnl", "pnl_all"):
+            self.swaps()
+        if stage == "pnl":
+            self.snipers()
+
+
+def run_stage(stage, rows, source, uri, seed):
+    run = Run(rows, source, uri, seed)
+    run.prepare(stage)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    result = getattr(run, stage)()
+    wall = time.perf_counter() - start
+    return {
+        "stage": stage,
+        "rows": rows,
+        "source": source,
+        "seed": seed,
+        "wall_s": round(wall, 4),
+        "peak_rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "result_rows": len(result),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the swap pipeline stages on synthetic data")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma-separated row counts, e.g. 10k,1M")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--source", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--uri", default="mongodb://localhost:27017", help="mongod for --source mongo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.jsonl")
+    parser.add_argument("--worker", nargs=2, metavar=("STAGE", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        stage, rows = args.worker
+        print(json.dumps(run_stage(stage, int(rows), args.source, args.uri, args.seed)))
+        return 0
+
+    meta = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pnl_workers": PNL_WORKERS,
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip(),
+    }
+    failed = 0
+    with open(args.output, "a") as out:
+        for size in args.sizes.split(","):
+            rows = parse_size(size.strip())
+            for stage in args.stages.split(","):
+                stage = stage.strip()
+                proc = subprocess.run(
+                    [sys.executable, "-m", "bench.run", "--worker", stage, str(rows),
+                     "--source", args.source, "--uri", args.uri, "--seed", str(args.seed)],
+                    capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    record = {"stage": stage, "rows": rows, "source": args.source, "error": proc.stderr.strip().splitlines()[-1:]}
+                    failed += 1
+                else:
+                    record = json.loads(proc.stdout.strip().splitlines()[-1])
+                record.update(meta)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                print(f"{stage:8} {rows:>10,}  " + (
+                    f"{record['wall_s']:9.3f}s  {record['peak_rss_mb']:9.1f} MB" if "error" not in record else f"failed: {record['error']}"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
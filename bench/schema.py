@@ -0,0 +1,94 @@
+"""Memory report and PnL tolerance check for the compact swap schema.
+
+    python -m bench.schema                  # 1M rows
+    python -m bench.schema --rows 100k --rtol 1e-4
+
+Loads synthetic swaps as the pages do, prints per-column memory before
+wallet encoding and after `compact_swaps`, then runs sniper detection and
+both PnL paths on the original and the compact frame. Exits 1 if the sniper buys differ or any PnL
+value drifts past --rtol, relative to the wallet's gross traded value.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from bench.generator import documents, generate_swaps
+from bench.run import parse_size
+from pnl_engine import fifo_pnl, latest_prices, wallet_trade_stats
+from pnl_state import PnLStateStore
+from sniper_engine import find_sniper_buys
+from swap_data import clean_swaps, compact_swaps, decode_swaps, memory_report
+from wallet_ids import encode_makers
+
+KEY = ["wallet_id", "token_name"]
+
+
+def load(rows, seed):
+    collections, launch_blocks = generate_swaps(rows, seed=seed)
+    frames = [decode_swaps(documents(frame), col_name) for col_name, frame in collections.items()]
+    return pd.concat(frames, ignore_index=True), launch_blocks
+
+
+def results(swaps, launch_blocks):
+    """Sniper buys, global-page PnL of the snipers and token-page PnL of every wallet"""
+    snipers = find_sniper_buys(swaps, launch_blocks)
+    store = PnLStateStore()
+    store.fold(swaps)
+    sniper_pnl = store.wallet_pnl(snipers[KEY].drop_duplicates())
+
+    token = swaps["token_name"].astype(object).value_counts().idxmax()
+    trades = swaps[swaps["token_name"] == token]
+    all_pnl = wallet_trade_stats(trades, KEY).join(fifo_pnl(
+        trades, KEY,
+        buy_amount_col="OUT_AfterTax", buy_cost_col="OUT_BeforeTax",
+        sell_amount_col="IN_BeforeTax", sell_net_col="IN_AfterTax",
+        time_col="timestampReadable", latest_price=latest_prices(trades, time_col="timestampReadable"),
+    ))
+    return snipers, sniper_pnl, all_pnl
+
+
+def gross_value(swaps, index):
+    """Total traded value per (wallet_id, token_name), the scale PnL errors are measured against"""
+    value = (swaps["OUT_BeforeTax"].fillna(0) + swaps["IN_BeforeTax"].fillna(0)) * swaps["genesis_usdc_price"].astype(float)
+    gross = value.groupby([swaps["wallet_id"], swaps["token_name"].astype(object)]).sum()
+    return gross.reindex(index).fillna(0).to_numpy()
+
+
+def max_drift(expected, actual, scale):
+    """Largest |expected - actual| / (scale + 1) per numeric column"""
+    actual = actual.set_axis(actual.index.to_flat_index()).reindex(expected.index.to_flat_index())
+    drift = {}
+    for col in expected.select_dtypes("number").columns:
+        diff = np.abs(expected[col].to_numpy(dtype=float) - actual[col].to_numpy(dtype=float)) / (scale + 1)
+        drift[col] = float(np.nanmax(diff)) if len(diff) else 0.0
+    return pd.Series(drift)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory report and PnL tolerance check for the compact swap schema")
+    parser.add_argument("--rows", default="1M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rtol", type=float, default=1e-4)
+    args = parser.parse_args(argv)
+
+    raw, launch_blocks = load(parse_size(args.rows), args.seed)
+    swaps = encode_makers(clean_swaps(raw))
+    compact = compact_swaps(swaps)
+    print(memory_report(raw, compact).to_string())
+
+    expected, actual = results(swaps, launch_blocks), results(compact, launch_blocks)
+    ok = expected[0]["Index"].tolist() == actual[0]["Index"].tolist()
+    print(f"\nsniper buys: {len(expected[0])} vs {len(actual[0])}{'' if ok else '  MISMATCH'}")
+    for name, want, got in [("sniper PnL", expected[1], actual[1]), ("all-wallet PnL", expected[2], actual[2])]:
+        drift = max_drift(want, got, gross_value(swaps, want.index))
+        within = (drift <= args.rtol).all()
+        ok &= bool(within)
+        print(f"\n{name}: max drift / gross value{'' if within else '  OVER TOLERANCE'}")
+        print(drift.to_string())
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Decode raw BSON batches straight into typed NumPy columns.
+
+`find_raw_batches` hands back each server batch as one bytes object of
+concatenated BSON documents. `decode_batch` walks all documents of a batch
+at once, one element position per step, with NumPy gathers: each step reads
+every document's next type byte, key and value offset (or, when all
+documents share the first one's keys and types, as swap documents usually
+do, just checks that they match it). Values are then cut
+out of the buffer per column: doubles and ints by reinterpreting bytes,
+strings as fixed-width bytes that are decoded once per distinct value. No
+per-document dict is built.
+
+The result matches `pd.DataFrame(list_of_dicts)` on the same documents:
+columns in first-seen order, NaN where a field is missing, None where it is
+null, int64 columns only where every document has an integer. `_id` is left
+out, since every loader drops it. Batches using anything beyond doubles,
+ints, strings and nulls (outside `_id`), or a field mixing strings with
+numbers, are decoded the dict way instead.
+"""
+import numpy as np
+import pandas as pd
+from bson import decode_all
+from numpy.lib.stride_tricks import as_strided
+
+MAX_KEY_LENGTH = 64
+MAX_STRING_LENGTH = 256
+PADDING = MAX_STRING_LENGTH + 16
+
+DOUBLE, STRING, OBJECT_ID, BOOLEAN, DATETIME, NULL, INT32, INT64 = 0x01, 0x02, 0x07, 0x08, 0x09, 0x0A, 0x10, 0x12
+FIXED_SIZES = {DOUBLE: 8, OBJECT_ID: 12, BOOLEAN: 1, DATETIME: 8, NULL: 0, INT32: 4, INT64: 8}
+NUMERIC = {DOUBLE, INT32, INT64}
+
+
+class Unsupported(ValueError):
+    """A batch the columnar decoder does not handle; decode it the dict way"""
+
+
+def _bytes_at(buf, offsets, width):
+    """`width` bytes from each of `offsets` as an (n, width) uint8 array.
+
+    The buffer is viewed as overlapping rows of `width` bytes, one starting
+    at every byte, so this is a single row gather rather than an index array
+    of n * width bytes.
+    """
+    rows = as_strided(buf, shape=(len(buf) - width + 1, width), strides=(1, 1), writeable=False)
+    return rows[offsets]
+
+
+def _read(buf, offsets, dtype):
+    """One `dtype` value at each byte offset of `buf`"""
+    dtype = np.dtype(dtype)
+    return _bytes_at(buf, offsets, dtype.itemsize).view(dtype)[:, 0]
+
+
+def _words(buf, offsets, lengths):
+    """Variable-length byte strings as (n, words) little-endian uint64s, zeroed past each length"""
+    width = -(-int(lengths.max()) // 8) * 8
+    rows = _bytes_at(buf, offsets, width)
+    rows[np.arange(width) >= lengths[:, None]] = 0
+    return rows.view("<u8")
+
+
+def _group(words):
+    """(group code per row, first row of each group) for the distinct rows of `words`.
+
+    Rows are hashed and factorized on the hash, which is much cheaper than
+    sorting byte strings; every row is then compared with its group's first
+    row, so a hash collision can't merge different values.
+    """
+    hashes = np.zeros(len(words), dtype=np.uint64)
+    for j in range(words.shape[1]):
+        hashes = hashes * np.uint64(0x100000001B3) ^ words[:, j]
+    codes, uniques = pd.factorize(hashes)
+    first = np.empty(len(uniques), dtype=np.int64)
+    first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    if not (words == words[first[codes]]).all():
+        raise Unsupported("hash collision between distinct values")
+    return codes, first
+
+
+def _document_starts(data):
+    starts = []
+    pos, end = 0, len(data)
+    while pos < end:
+        starts.append(pos)
+        size = int.from_bytes(data[pos:pos + 4], "little")
+        if size < 5:
+            raise Unsupported("malformed document length")
+        pos += size
+    return np.array(starts, dtype=np.int64)
+
+
+def _layout(data, start):
+    """[(key, type)] of the document at `start`, or None if it has a type without a known size"""
+    layout = []
+    pos, end = start + 4, start + int.from_bytes(data[start:start + 4], "little") - 1
+    while pos < end:
+        type_code = data[pos]
+        key_end = data.index(b"\0", pos + 1)
+        value = key_end + 1
+        if type_code == STRING:
+            size = 4 + int.from_bytes(data[value:value + 4], "little")
+        elif type_code in FIXED_SIZES:
+            size = FIXED_SIZES[type_code]
+        else:
+            return None
+        layout.append((data[pos + 1:key_end], type_code))
+        pos = value + size
+    return layout
+
+
+def _uniform_elements(buf, data, starts, end):
+    """`_elements` for a batch whose documents all share the first one's keys and types, else None.
+
+    Swap documents written by one pipeline usually do, so each step only
+    checks that every document's next type byte and key match the template
+    instead of working out and grouping the keys.
+    """
+    layout = _layout(data, int(starts[0]))
+    if layout is None:
+        return None
+    every_doc = np.arange(len(starts))
+    pos = starts + 4
+    found = {}
+    for key, type_code in layout:
+        expected = np.frombuffer(key + b"\0", dtype=np.uint8)
+        if not (buf[pos] == type_code).all() or not (_bytes_at(buf, pos + 1, len(expected)) == expected).all():
+            return None
+        values = pos + len(key) + 2
+        found[key] = [every_doc, np.full(len(starts), type_code, dtype=np.uint8), values]
+        pos = values + (4 + _read(buf, values, "<i4") if type_code == STRING else FIXED_SIZES[type_code])
+    return found if (pos == end).all() else None
+
+
+def _elements(buf, data, starts):
+    """{key: [doc index, type, value offset] arrays}, keys in the order pandas would give the columns"""
+    pos = starts + 4
+    end = starts + _read(buf, starts, "<i4") - 1
+    uniform = _uniform_elements(buf, data, starts, end)
+    if uniform is not None:
+        return uniform
+    nuls = np.flatnonzero(buf == 0)
+    found = {}
+    first_seen = {}
+    step = 0
+    active = np.flatnonzero(pos < end)
+    while len(active):
+        at = pos[active]
+        types = buf[at]
+        key_length = nuls[np.searchsorted(nuls, at + 1)] - (at + 1)
+        if key_length.max() > MAX_KEY_LENGTH:
+            raise Unsupported("key longer than MAX_KEY_LENGTH")
+        values = at + key_length + 2
+
+        sizes = np.zeros(len(at), dtype=np.int64)
+        for type_code in np.flatnonzero(np.bincount(types, minlength=256)).tolist():
+            is_type = types == type_code
+            if type_code == STRING:
+                sizes[is_type] = 4 + _read(buf, values[is_type], "<i4")
+            elif type_code in FIXED_SIZES:
+                sizes[is_type] = FIXED_SIZES[type_code]
+            else:
+                raise Unsupported(f"BSON type {type_code:#04x}")
+
+        key_codes, first = _group(_words(buf, at + 1, key_length))
+        for code, row in enumerate(first.tolist()):
+            key = buf[at[row] + 1:values[row] - 1].tobytes()
+            rows = key_codes == code
+            found.setdefault(key, []).append((active[rows], types[rows], values[rows]))
+            # pandas orders columns by the first document that has them, then by position in it
+            seen = (int(active[row]), step)
+            if key not in first_seen or seen < first_seen[key]:
+                first_seen[key] = seen
+
+        pos[active] = values + sizes
+        active = active[pos[active] < end[active]]
+        step += 1
+
+    order = sorted(first_seen, key=first_seen.get)
+    return {key: [np.concatenate(part) for part in zip(*found[key])] for key in order}
+
+
+def _strings(buf, data, offsets):
+    """Decoded strings at `offsets`; each distinct value is decoded once and shared"""
+    lengths = _read(buf, offsets, "<i4") - 1
+    if lengths.max() > MAX_STRING_LENGTH:
+        raise Unsupported("string longer than MAX_STRING_LENGTH")
+    if lengths.max() == 0:
+        return np.full(len(offsets), "", dtype=object)
+    words = _words(buf, offsets + 4, lengths)
+    # "ab" and "ab\0" zero-pad to the same words; grouping on the length too keeps them apart
+    codes, first = _group(np.column_stack([words, lengths.astype(np.uint64)]))
+    try:
+        # ASCII values decode in one go; a value ending in NUL bytes would lose them, so check lengths
+        values = words[first].view(f"S{words.shape[1] * 8}")[:, 0].astype("U")
+        if not (np.char.str_len(values) == lengths[first]).all():
+            raise UnicodeError
+        values = values.astype(object)
+    except UnicodeError:
+        values = np.array([data[start:start + length].decode("utf-8")
+                           for start, length in zip((offsets[first] + 4).tolist(), lengths[first].tolist())], dtype=object)
+    return values[codes]
+
+
+def _column(buf, data, n_docs, docs, types, offsets):
+    kinds = set(np.flatnonzero(np.bincount(types, minlength=256)).tolist())
+    is_null = types == NULL
+    if kinds <= NUMERIC | {NULL} and kinds & NUMERIC:
+        if kinds <= {INT32, INT64} and len(docs) == n_docs:
+            column = np.empty(n_docs, dtype=np.int64)
+        else:
+            column = np.full(n_docs, np.nan)
+        for type_code, dtype in ((DOUBLE, "<f8"), (INT32, "<i4"), (INT64, "<i8")):
+            is_type = types == type_code
+            if is_type.any():
+                column[docs[is_type]] = _read(buf, offsets[is_type], dtype)
+        return column
+    if kinds == {NULL} and len(docs) < n_docs:
+        # pandas reads a mix of None and missing as a float column
+        return np.full(n_docs, np.nan)
+    if kinds <= {STRING, NULL}:
+        column = np.full(n_docs, np.nan, dtype=object)
+        column[docs[is_null]] = None
+        is_string = ~is_null
+        if is_string.any():
+            column[docs[is_string]] = _strings(buf, data, offsets[is_string])
+        return column
+    raise Unsupported(f"field types {sorted(kinds)}")
+
+
+def decode_batch(data):
+    """Frame of one raw BSON batch, without `_id`; raises Unsupported for batches it can't decode"""
+    starts = _document_starts(data)
+    if not len(starts):
+        return pd.DataFrame()
+    # padding keeps fixed-width reads near the end of the buffer in bounds
+    buf = np.frombuffer(data + bytes(PADDING), dtype=np.uint8)
+    columns = {}
+    for key, (docs, types, offsets) in _elements(buf, data, starts).items():
+        if key == b"_id":
+            continue
+        columns[key.decode("utf-8")] = _column(buf, data, len(starts), docs, types, offsets)
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(starts)))
+
+
+def decode_batch_dicts(data, codec_options=None):
+    """The dict way: decode every document, then build the frame"""
+    kwargs = {} if codec_options is None else {"codec_options": codec_options}
+    df = pd.DataFrame(decode_all(data, **kwargs))
+    return df.drop(columns=["_id"], errors="ignore")
+
+
+def raw_frame(collection, query=None, projection=None, batch_size=None):
+    """Frame of a query's documents (without `_id`) via raw BSON batches, or None if there are none"""
+    cursor = collection.find_raw_batches(query or {}, projection)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    chunks = []
+    for data in cursor:
+        try:
+            chunks.append(decode_batch(data))
+        except Unsupported:
+            chunks.append(decode_batch_dicts(data, collection.codec_options))
+    chunks = [chunk for chunk in chunks if len(chunk)]
+    if not chunks:
+        return None
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
@@ -1,22 +1,18 @@
 #--IMPORTING AND GENERAL SETUP
-import os
-from dotenv import load_dotenv
 import streamlit as st
-from pymongo import MongoClient
+from mongo_db import get_db
+from perf import perf_panel, span, start_run
 from datetime import datetime, timezone, date
 
 
 #--STREAMLIT CONFIGURATION
 st.set_page_config(layout="wide")
+start_run("cards2")
 
 #st.write("Loaded URI:", os.environ.get("MongoLink"))
 
-#--ENVIRONMENT LOADING AND DB CONNECTION
-load_dotenv()
-
-dbconn = os.getenv("MongoLink")
-client = MongoClient(dbconn)
-db = client['genesis_tokens_swap_info']
+#--DB CONNECTION (shared pooled client, see mongo_db.py)
+db = get_db()
 
 # UI elements
 # --GLOBAL CSS
@@ -110,7 +106,6 @@ html, body {
 #trigger rebuild
 # ───── Sidebar ─────
 import streamlit as st
-import os
 
 def render_sidebar():
     with st.sidebar:
@@ -211,7 +206,8 @@ def shorten(addr):
     return addr
 
 # Fetch all docs once
-all_docs = list(db["swap_progress"].find({}))
+with span("swap_progress fetch"):
+    all_docs = list(db["swap_progress"].find({}))
 # Correct filtering from swap_progress using token_collection
 token_collection = ['jarvis_swap', 'tian_swap', 'badai_swap', 'aispace_swap', 'wint_swap']
 # Normalize to lowercase for matching
@@ -277,4 +273,7 @@ default_start = date(2024, 1, 1)
 start_date = start_date or default_start
 end_date = end_date or today
 # Use predefined list of 21 tokens
-render_token_cards_from_docs(filtered_tokens, all_docs)
\ No newline at end of file
+with span("render: token cards"):
+    render_token_cards_from_docs(filtered_tokens, all_docs)
+
+perf_panel()
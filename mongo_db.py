@@ -0,0 +1,56 @@
+"""Shared MongoDB access: one pooled client per process for every page."""
+import os
+
+import streamlit as st
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from mongo_telemetry import telemetry
+from swap_data import SWAP_DB
+
+load_dotenv()
+
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "120000"))
+MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+TELEMETRY = os.getenv("MONGO_TELEMETRY", "1") != "0"
+
+
+def mongo_uri():
+    """Connection string from Streamlit secrets, falling back to the environment.
+
+    The pages used to read either MONGO_URI (secrets) or MongoLink (.env);
+    both names are still accepted.
+    """
+    for key in ("MONGO_URI", "MongoLink"):
+        try:
+            if key in st.secrets:
+                return st.secrets[key]
+        except FileNotFoundError:
+            break
+    return os.getenv("MONGO_URI") or os.getenv("MongoLink")
+
+
+@st.cache_resource
+def get_client():
+    """The process-wide MongoClient; its connection pool is shared by all sessions"""
+    return MongoClient(
+        mongo_uri(),
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        connectTimeoutMS=CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=SOCKET_TIMEOUT_MS,
+        maxIdleTimeMS=MAX_IDLE_TIME_MS,
+        readPreference=READ_PREFERENCE,
+        appname="speedrun",
+        event_listeners=[telemetry] if TELEMETRY else [],
+    )
+
+
+def get_db(name=SWAP_DB):
+    return get_client()[name]
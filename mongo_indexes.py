@@ -0,0 +1,194 @@
+"""Create the indexes the pages rely on and check the app's queries for collection scans.
+
+    python mongo_indexes.py                                  # URI from secrets / .env
+    python mongo_indexes.py --uri mongodb://localhost:27017  # local mongod
+    python mongo_indexes.py --check-only                     # explain without creating
+
+Every query the pages issue on a swap collection is explained, built with
+the same helpers the pages use. Whole-collection passes (the loads, the
+KPI aggregation, unfiltered column bounds) scan by design and are reported
+as "scan"; exits non-zero if any other query still plans a COLLSCAN.
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, MongoClient
+
+from swap_data import SWAP_DB, SWAP_COLLECTIONS, swap_projection
+from swap_snapshot import delta_query
+from swap_table import bounds_pipeline, build_query, page_pipeline
+from token_kpis import kpi_pipeline
+
+SWAP_INDEXES = [
+    [("maker", ASCENDING), ("timestamp", ASCENDING)],
+    [("swapType", ASCENDING), ("timestamp", ASCENDING)],
+    [("genesis_token_symbol", ASCENDING), ("timestamp", ASCENDING)],
+    # keyset pagination of the transactions table sorts on (field, _id) for every stored sort field
+    [("timestamp", ASCENDING), ("_id", ASCENDING)],
+    [("blockNumber", ASCENDING), ("_id", ASCENDING)],
+    [("genesis_usdc_price", ASCENDING), ("_id", ASCENDING)],
+    [("genesis_virtual_price", ASCENDING), ("_id", ASCENDING)],
+    [("virtual_usdc_price", ASCENDING), ("_id", ASCENDING)],
+    [("Tax_1pct", ASCENDING), ("_id", ASCENDING)],
+    [("transactionFee", ASCENDING), ("_id", ASCENDING)],
+    # the table search matches tx hashes by prefix
+    [("txHash", ASCENDING)],
+    # the table's swap type filter and its options (distinct labels)
+    [("label", ASCENDING), ("timestamp", ASCENDING)],
+]
+PROGRESS_INDEXES = [
+    [("token_symbol", ASCENDING)],
+]
+
+
+def ensure_indexes(db, collections=SWAP_COLLECTIONS):
+    """Create any missing indexes; returns {collection: [index names]}"""
+    created = {}
+    for col_name in collections:
+        created[col_name] = [db[col_name].create_index(keys) for keys in SWAP_INDEXES]
+    created["swap_progress"] = [db["swap_progress"].create_index(keys) for keys in PROGRESS_INDEXES]
+    return created
+
+
+def app_queries(db, col_name):
+    """(description, explain command, full scan by design) for each query the pages issue on a swap collection"""
+    token = col_name.replace('_swap', '')
+    sample = db[col_name].find_one(
+        {}, {"maker": 1, "txHash": 1, "label": 1, "blockNumber": 1, "timestamp": 1}, sort=[("timestamp", -1)]
+    )
+    if sample is None:
+        return []
+    maker, block, ts = sample.get("maker"), sample.get("blockNumber", 0), sample.get("timestamp", 0)
+    tx_hash, label = sample.get("txHash", ""), sample.get("label", "")
+
+    def find(description, query, projection=None, sort=None, limit=0, full_scan=False):
+        command = {"find": col_name, "filter": query}
+        if projection:
+            command["projection"] = projection
+        if sort:
+            command["sort"] = sort
+        if limit:
+            command["limit"] = limit
+        return description, command, full_scan
+
+    def aggregate(description, pipeline, full_scan=False):
+        return description, {"aggregate": col_name, "pipeline": pipeline, "cursor": {}}, full_scan
+
+    def count(description, query):
+        # the pipeline count_documents runs (count_rows only uses it for a non-empty filter)
+        return aggregate(description, [{"$match": query}, {"$group": {"_id": 1, "n": {"$sum": 1}}}])
+
+    def page(description, query, sort_col="TIME", after=None, full_scan=False):
+        pipeline, _ = page_pipeline(token, query, sort_col=sort_col, ascending=False, after=after)
+        return aggregate(description, pipeline, full_scan)
+
+    buys = build_query(token, swap_type="buy")
+    by_label = build_query(token, label=label)
+    by_maker = build_query(token, search=maker or "")
+    by_hash = build_query(token, search=tx_hash)
+    by_day = build_query(token, date_range=(datetime.fromtimestamp(ts, tz=timezone.utc).date(),) * 2)
+    value_column = token.upper()
+    return [
+        # header and version probes
+        find("launch swap by genesis_token_symbol", {"genesis_token_symbol": token.upper()},
+             sort={"timestamp": 1}, limit=1),
+        find("collection version (newest block)", {}, projection={"blockNumber": 1, "_id": 0},
+             sort={"blockNumber": -1}, limit=1),
+        # loads
+        find("swaps after a block checkpoint", delta_query(block),
+             projection=swap_projection(token.upper() + "_")),
+        find("every swap (full load)", {}, projection=swap_projection(token.upper() + "_"), full_scan=True),
+        find("swaps by maker", {"maker": maker}, sort={"timestamp": 1}),
+        find("swaps at a block", {"blockNumber": block}),
+        find("swaps in a time range", {"timestamp": {"$gte": ts - 86400, "$lte": ts}}),
+        # transactions table options, pages and counts
+        ("distinct labels", {"distinct": col_name, "key": "label", "query": {}}, False),
+        find("first swap time", {}, projection={"timestamp": 1}, sort={"timestamp": 1}, limit=1),
+        find("last swap time", {}, projection={"timestamp": 1}, sort={"timestamp": -1}, limit=1),
+        page("transactions page, newest first", {}),
+        page("transactions page, by block", {}, sort_col="BLOCK"),
+        page("transactions page, by price", {}, sort_col="GENESIS \nPRICE ($)"),
+        page("transactions page, by fee", {}, sort_col=f"TX FEE ({token.upper()})"),
+        page("transactions page, by amount (derived)", {}, sort_col=value_column, full_scan=True),
+        page("transactions page, buys after a cursor", buys, after=(ts, sample["_id"])),
+        page("transactions page, one label", by_label),
+        page("transactions page, one day", by_day),
+        page("transactions page, maker search", by_maker),
+        page("transactions page, tx hash search", by_hash),
+        page("transactions page, search anywhere", build_query(token, search=tx_hash[2:10], search_anywhere=True),
+             full_scan=True),
+        count("transactions count, buys", buys),
+        count("transactions count, one label", by_label),
+        count("transactions count, maker search", by_maker),
+        count("transactions count, tx hash search", by_hash),
+        aggregate("column bounds, one day", bounds_pipeline(token, by_day, value_column)),
+        aggregate("column bounds, every swap", bounds_pipeline(token, {}, value_column), full_scan=True),
+        # tab KPIs
+        aggregate("token KPIs ($facet)", kpi_pipeline(token), full_scan=True),
+    ]
+
+
+def progress_queries():
+    return [
+        ("swap_progress by token_symbol",
+         {"find": "swap_progress", "filter": {"token_symbol": "JARVIS"}, "limit": 1}),
+    ]
+
+
+def _stages(node):
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node["stage"]
+        for key, value in node.items():
+            if key != "rejectedPlans":
+                yield from _stages(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _stages(value)
+
+
+def uses_collscan(db, command):
+    plan = db.command("explain", command, verbosity="queryPlanner")
+    return "COLLSCAN" in set(_stages(plan))
+
+
+def check_query_plans(db, collections=SWAP_COLLECTIONS):
+    """Explain every app query; returns [(collection, description, collscan, full scan by design)]"""
+    results = []
+    for col_name in collections:
+        for description, command, full_scan in app_queries(db, col_name):
+            results.append((col_name, description, uses_collscan(db, command), full_scan))
+    for description, command in progress_queries():
+        results.append(("swap_progress", description, uses_collscan(db, command), False))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", help="MongoDB connection string (default: MONGO_URI / MongoLink)")
+    parser.add_argument("--db", default=SWAP_DB)
+    parser.add_argument("--check-only", action="store_true", help="only run the explain checks")
+    args = parser.parse_args(argv)
+
+    if args.uri is None:
+        from mongo_db import mongo_uri
+        args.uri = mongo_uri()
+    db = MongoClient(args.uri)[args.db]
+
+    if not args.check_only:
+        for col_name, names in ensure_indexes(db).items():
+            print(f"{col_name}: {', '.join(names)}")
+
+    scans = 0
+    for col_name, description, collscan, full_scan in check_query_plans(db):
+        status = "ok" if not collscan else "scan" if full_scan else "COLLSCAN"
+        print(f"{status:8}  {col_name:15}  {description}")
+        scans += collscan and not full_scan
+    if scans:
+        print(f"{scans} queries still do a collection scan")
+    return 1 if scans else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
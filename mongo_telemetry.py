@@ -0,0 +1,156 @@
+"""pymongo command monitoring: per-rerun command totals and a slow-query log."""
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+import bson
+import pandas as pd
+from pymongo import monitoring
+
+import perf
+
+SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG = os.getenv("MONGO_SLOW_QUERY_LOG", ".mongo_slow_queries.jsonl")
+# Raw-batch cursor replies report their size for free; any other reply has to be
+# re-encoded to measure it, which costs about as much as decoding it, so that is opt-in
+MEASURE_REPLY_BYTES = os.getenv("MONGO_TELEMETRY_REPLY_BYTES", "0") == "1"
+TRACKED_COMMANDS = {"find", "aggregate", "getMore", "count", "distinct"}
+
+# Frames from these packages are skipped when looking for the calling function
+_LIBRARY_PATHS = tuple(
+    os.path.dirname(module.__file__) + os.sep
+    for module in (monitoring, bson, threading, pd)
+    if getattr(module, "__file__", None)
+) + (os.path.dirname(os.__file__) + os.sep, "<frozen")
+
+
+def _caller():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename != __file__ and not filename.startswith(_LIBRARY_PATHS) and "site-packages" not in filename:
+            return f"{os.path.basename(filename)}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def _batch(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return cursor.get("firstBatch", cursor.get("nextBatch", ()))
+    return None
+
+
+def _raw_count(batch):
+    """Documents in a raw BSON array, read from the element headers without decoding them"""
+    count, pos, end = 0, 4, len(batch) - 1
+    while pos < end:
+        pos = batch.index(b"\x00", pos + 1) + 1  # element type byte, then the array index as a C string
+        pos += struct.unpack_from("<i", batch, pos)[0]
+        count += 1
+    return count
+
+
+def _returned(reply):
+    batch = _batch(reply)
+    if isinstance(batch, bytes):
+        return _raw_count(batch)
+    if batch is not None:
+        return len(batch)
+    if "values" in reply:
+        return len(reply["values"])
+    return 1 if "n" in reply else 0
+
+
+def _reply_bytes(reply):
+    batch = _batch(reply)
+    if isinstance(batch, bytes):
+        return len(batch)
+    return len(bson.encode(reply)) if MEASURE_REPLY_BYTES else 0
+
+
+def _summary(command_name, command):
+    collection = command.get(command_name)
+    if command_name == "getMore":
+        collection = command.get("collection")
+    detail = command.get("filter", command.get("pipeline", command.get("query", command.get("key"))))
+    return collection, detail
+
+
+class CommandTelemetry(monitoring.CommandListener):
+    """Records latency, documents returned and reply bytes for every read command.
+
+    Commands are tagged with the page whose rerun issued them (via perf) and
+    the first calling function outside pymongo/pandas/stdlib, and kept on
+    that rerun for the perf panel's totals. Commands slower than
+    SLOW_QUERY_MS are appended to SLOW_QUERY_LOG. Reply bytes cover raw-batch
+    cursors only, unless MONGO_TELEMETRY_REPLY_BYTES=1 re-encodes the rest.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log=SLOW_QUERY_LOG):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name not in TRACKED_COMMANDS:
+            return
+        collection, detail = _summary(event.command_name, event.command)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                perf.current_page(), _caller(), collection, detail
+            )
+
+    def succeeded(self, event):
+        self._finish(event, reply=event.reply)
+
+    def failed(self, event):
+        self._finish(event, failure=event.failure)
+
+    def _finish(self, event, reply=None, failure=None):
+        with self._lock:
+            tag = self._pending.pop((event.connection_id, event.request_id), None)
+        if tag is None:
+            return
+        page, function, collection, detail = tag
+        entry = {
+            "page": page or "-",
+            "function": function,
+            "command": event.command_name,
+            "collection": collection,
+            "ms": event.duration_micros / 1000,
+            "docs": _returned(reply) if reply is not None else 0,
+            "bytes": _reply_bytes(reply) if reply is not None else 0,
+            "error": str(failure.get("errmsg", failure)) if failure is not None else None,
+        }
+        run = perf.current_run()
+        if run is not None:
+            run.commands.append(entry)
+        if entry["ms"] >= self.slow_ms:
+            self._log_slow(entry, detail)
+
+    def _log_slow(self, entry, detail):
+        line = dict(entry, ts=time.time(), detail=str(detail)[:500])
+        try:
+            with self._lock, open(self.slow_log, "a") as f:
+                f.write(json.dumps(line, default=str) + "\n")
+        except OSError as e:
+            print(f"Could not write slow query log: {e}")
+
+
+telemetry = CommandTelemetry()
+
+
+def command_totals(commands):
+    """Per (function, command, collection) totals of a rerun's commands"""
+    if not commands:
+        return pd.DataFrame(columns=["function", "command", "collection", "calls", "ms", "docs", "bytes"])
+    df = pd.DataFrame(commands)
+    totals = df.groupby(["function", "command", "collection"], sort=False, dropna=False).agg(
+        calls=("ms", "size"), ms=("ms", "sum"), docs=("docs", "sum"), bytes=("bytes", "sum")
+    ).reset_index()
+    return totals.sort_values("ms", ascending=False, ignore_index=True).round({"ms": 2})
@@ -1,13 +1,29 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
-from pymongo import MongoClient
-from collections import defaultdict, deque
-from dotenv import load_dotenv
 import altair as alt
+from sniper_engine import DETECTION_PARAMS, find_sniper_buys, quick_sell_snipers
+from pnl_state import PNL_COLUMNS, PnLStateStore
+from mongo_db import get_db
+from swap_data import (
+    SWAP_DB, SWAP_COLLECTIONS, clean_swaps, compact_swaps, load_collections, memory_report, swap_versions
+)
+from wallet_ids import decode_makers, encode_makers
+from swap_snapshot import SwapSnapshot
+from perf import bind, perf_panel, record, span, start_run, stop_page
+from result_cache import memoize, stale_while_revalidate
+from precompute import SNIPER_SOURCE, SNIPER_SUMMARY, latest_run, read_table
 
 # Streamlit Page Setup - MUST be first command
 st.set_page_config(page_title="Sniper PnL Dashboard", layout="wide")
+start_run("global_snipers")
+
+# Dashboard results are rebuilt in the background once older than the soft
+# TTL, and rebuilt before serving once older than the max staleness
+DASHBOARD_SOFT_TTL = int(os.getenv("DASHBOARD_SOFT_TTL", "300"))
+DASHBOARD_MAX_STALE = int(os.getenv("DASHBOARD_MAX_STALE", "1800"))
+
 # ───── Global Styling ─────
 st.markdown("""
     <style>
@@ -133,73 +149,37 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-
-load_dotenv()
-
-# MongoDB Connection
-@st.cache_resource
-def get_mongo_client():
-    """Cache MongoDB client connection"""
-    return MongoClient(st.secrets["MONGO_URI"])
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def load_swap_data():
-    """Load and cache swap data from MongoDB"""
-    client = get_mongo_client()
-    db = client["genesis_tokens_swap_info"]
+@memoize("global_snipers.load_swap_data", max_entries=1)
+def load_swap_data(version, _db):
+    """Load swap data from MongoDB; cached until the collections' version moves"""
     
     # swap_collections = [col for col in db.list_collection_names() if col.endswith('_swap')]
-    swap_collections = ['jarvis_swap', 'tian_swap', 'badai_swap', 'aispace_swap', 'wint_swap']
-    combined_df = pd.DataFrame()
-
-    for col_name in swap_collections:
-        token_name = col_name.replace('_swap', '')  
-        token_prefix = token_name.upper() + "_"     
-        # Build projection dict with correct prefixed column names
-        projection = {
-            f"{token_prefix}OUT_BeforeTax": 1,
-            f"{token_prefix}OUT_AfterTax": 1,
-            f"{token_prefix}IN_BeforeTax": 1,
-            f"{token_prefix}IN_AfterTax": 1,
-            "maker": 1,
-            "token_name": 1,
-            "swapType": 1,
-            "timestamp": 1,
-            "timestampReadable": 1,
-            "blockNumber": 1,
-            "genesis_usdc_price": 1,
-            "transactionFee": 1,
-            "Tax_1pct": 1
-        }
-        collection = db[col_name]
-        data = list(collection.find({}, projection))
-        if not data:
-            continue
-        df = pd.DataFrame(data)
-        df.drop(columns=['_id'], errors='ignore', inplace=True)
-        # Remove token prefix from relevant columns
-        df.columns = [col.replace(token_prefix, '') if col.startswith(token_prefix) else col for col in df.columns]
-        df["token_name"] = token_name.upper()
-        combined_df = pd.concat([combined_df, df], ignore_index=True)
-
-    if combined_df.empty:
+    # Each collection loads from its local snapshot plus the tail of swaps newer
+    # than its last synced block; collections load concurrently, concat once
+    frames, timings = load_collections(SWAP_COLLECTIONS, bind(lambda col_name: SwapSnapshot(col_name).load(_db)))
+    print("Swap collection load times:", ", ".join(f"{col} {secs:.2f}s" for col, secs in timings.items()))
+    for col, secs in timings.items():
+        record(f"load_swap_data: fetch {col}", secs)
+    if not frames:
         return None
-
-    combined_df = combined_df.dropna(subset=['transactionFee'])
-    combined_df = combined_df.dropna(subset=['genesis_usdc_price'])
-    combined_df['timestampReadable'] = pd.to_datetime(combined_df['timestampReadable'])
-    
-    return combined_df
-
-@st.cache_data(ttl=600)  # Cache for 10 minutes
-def load_launch_blocks():
-    """Load and cache launch block information"""
-    client = get_mongo_client()
-    db = client["genesis_tokens_swap_info"]
-    db_persona = client["virtualgenesis"]
-    
+    with span("load_swap_data: concat + clean"):
+        combined_df = pd.concat(frames, ignore_index=True)
+
+        if combined_df.empty:
+            return None
+
+        combined_df = clean_swaps(combined_df)
+    with span("load_swap_data: compact dtypes"):
+        compact_df = encode_makers(compact_swaps(combined_df))
+    report = memory_report(combined_df, compact_df)
+    print(f"Swap frame memory: {report.loc['total', 'MB before']:.1f} MB -> {report.loc['total', 'MB after']:.1f} MB")
+    return compact_df
+
+@memoize("global_snipers.load_launch_blocks", max_entries=1)
+def load_launch_blocks(version, _db, _combined_df):
+    """Load and cache launch block information, refreshed with the swap data version"""
     try:
-        launch_info = list(db["Personas"].find({}, {"symbol": 1, "blockNumber": 1})) 
+        launch_info = list(_db["Personas"].find({}, {"symbol": 1, "blockNumber": 1})) 
         launch_df = pd.DataFrame(launch_info)
         
         # Check if the DataFrame has the expected columns
@@ -207,207 +187,123 @@ def load_launch_blocks():
             token_launch_blocks = dict(zip(launch_df['symbol'], launch_df['blockNumber']))
         else:
             # use the combined_df to get launch blocks
-            combined_df = load_swap_data()
-            if combined_df is not None:
-                token_launch_blocks = combined_df.sort_values(by='blockNumber').groupby('token_name')['blockNumber'].first().to_dict()
+            if _combined_df is not None:
+                token_launch_blocks = _combined_df.sort_values(by='blockNumber').groupby('token_name', observed=True)['blockNumber'].first().to_dict()
             else:
                 token_launch_blocks = {}
             print("Warning: Could not fetch launch info from Personas collection, using fallback method")
     except Exception as e:
         print(f"Error fetching launch info: {e}")
         # use the combined_df to get launch blocks
-        combined_df = load_swap_data()
-        if combined_df is not None:
-            token_launch_blocks = combined_df.sort_values(by='blockNumber').groupby('token_name')['blockNumber'].first().to_dict()
+        if _combined_df is not None:
+            token_launch_blocks = _combined_df.sort_values(by='blockNumber').groupby('token_name', observed=True)['blockNumber'].first().to_dict()
         else:
             token_launch_blocks = {}
     
     return token_launch_blocks
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def process_sniper_data(combined_df, token_launch_blocks):
-    """Process and cache sniper identification logic"""
-    # Identify Large Buys
-    buy_df = combined_df[combined_df['swapType'] == 'buy'].copy()
-    buy_df = buy_df.sort_values(by=['maker', 'token_name', 'timestampReadable'])
-    chunked_buys = []
-    time_threshold = pd.Timedelta(minutes=10)
-
-    for (maker, token), group in buy_df.groupby(['maker', 'token_name']):
-        current_chunk = []
-        current_sum = 0
-        chunk_start_time = None
-        for row in group.itertuples():
-            if not current_chunk:
-                chunk_start_time = row.timestampReadable
-                current_chunk = [row]
-                current_sum = row.OUT_BeforeTax
-            else:
-                if row.timestampReadable - chunk_start_time <= time_threshold:
-                    current_chunk.append(row)
-                    current_sum += row.OUT_BeforeTax
-                else:
-                    if current_sum > 100000:
-                        chunked_buys.extend(current_chunk)
-                    chunk_start_time = row.timestampReadable
-                    current_chunk = [row]
-                    current_sum = row.OUT_BeforeTax
-        if current_sum > 100000:
-            chunked_buys.extend(current_chunk)
-
-    df_chunked_large_buys = pd.DataFrame(chunked_buys).drop_duplicates()
-    df_high_gas = df_chunked_large_buys[df_chunked_large_buys['transactionFee'] > 0.000002]
-
-    def is_sniper_buy(row):
-        launch_block = token_launch_blocks.get(row['token_name'])
-        return launch_block is not None and row['blockNumber'] <= launch_block + 100
-
-    df_sniper_buys = df_high_gas[df_high_gas.apply(is_sniper_buy, axis=1)]
-
-    sells = combined_df[combined_df['swapType'] == 'sell'][['maker', 'timestampReadable', 'token_name']]
-
-    merged = pd.merge(
-        df_sniper_buys[['maker', 'timestampReadable', 'token_name']],
-        sells,
-        on=['maker', 'token_name'],
-        suffixes=('_buy', '_sell')
-    )
-
-    merged['time_diff'] = (merged['timestampReadable_sell'] - merged['timestampReadable_buy']).dt.total_seconds()
-    quick_sells = merged[merged['time_diff'].between(0, 20 * 60)]
-    quick_sells_pairs = set(zip(quick_sells['maker'], quick_sells['token_name']))
-    potential_sniper_df = df_sniper_buys[
-        df_sniper_buys.apply(lambda row: (row['maker'], row['token_name']) in quick_sells_pairs, axis=1)
-    ].copy()
-    
-    return potential_sniper_df, combined_df
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def calculate_pnl(potential_sniper_df, combined_df):
-    """Calculate and cache PnL results"""
-    results = []
-    sniper_pairs = potential_sniper_df[['maker', 'token_name']].drop_duplicates()
-
-    for _, row in sniper_pairs.iterrows():
-        maker = row['maker']
-        token = row['token_name']
-        df = combined_df[(combined_df['maker'] == maker) & (combined_df['token_name'] == token)]
-        df = df.sort_values(by='timestamp')
-        trades_by_maker = defaultdict(list)
-
-        buy_txn_count = (df['swapType'] == 'buy').sum()
-        sell_txn_count = (df['swapType'] == 'sell').sum()
-        first_buy_time = df.loc[df['swapType'] == 'buy', 'timestampReadable'].min()
-        last_sell_time = df.loc[df['swapType'] == 'sell', 'timestampReadable'].max()
-        avg_buy_price = df.loc[df['swapType'] == 'buy', 'genesis_usdc_price'].mean()
-        avg_sell_price = df.loc[df['swapType'] == 'sell', 'genesis_usdc_price'].mean()
-        total_tax_paid = df['Tax_1pct'].sum()
-        total_transaction_fee_paid = df['transactionFee'].sum()
-
-        for _, doc in df.iterrows():
-            swap_type = doc.get("swapType")
-            price = float(doc.get("genesis_usdc_price", 0) or 0)
-            if price <= 0:
-                continue
-            if swap_type == "buy":
-                amount_bought_before_tax = float(doc.get("OUT_BeforeTax", 0) or 0)
-                amount_received = float(doc.get("OUT_AfterTax", 0) or 0)
-                if amount_bought_before_tax <= 0:
-                    continue
-                trades_by_maker[maker].append({
-                    'type': 'buy',
-                    'amount_bought_before_tax': amount_bought_before_tax,
-                    'amount_received': amount_received,
-                    'price': price
-                })
-            elif swap_type == "sell":
-                amount_sold_net = float(doc.get("IN_AfterTax", 0) or 0)
-                amount_from_wallet = float(doc.get("IN_BeforeTax", 0) or 0)
-                if amount_sold_net <= 0:
-                    continue
-                trades_by_maker[maker].append({
-                    'type': 'sell',
-                    'amount_sold_net': amount_sold_net,
-                    'amount_from_wallet': amount_from_wallet,
-                    'price': price
-                })
-
-        total_realized_pnl = 0.0
-        remaining_tokens = 0.0
-        buy_queue = deque()
-
-        for trade in trades_by_maker[maker]:
-            if trade['type'] == 'buy':
-                buy_queue.append({
-                    'amount': trade['amount_received'],
-                    'amount_paid_for': trade['amount_bought_before_tax'],
-                    'price': trade['price']
-                })
-            elif trade['type'] == 'sell':
-                remaining_to_match = trade['amount_from_wallet']
-                amount_sold_net = trade['amount_sold_net']
-                sell_price = trade['price']
-
-                while remaining_to_match > 0 and buy_queue:
-                    buy = buy_queue.popleft()
-                    matched_amount = min(remaining_to_match, buy['amount'])
-                    ratio = matched_amount / buy['amount']
-                    matched_paid = buy['amount_paid_for'] * ratio
-
-                    proceeds_ratio = matched_amount / trade['amount_from_wallet']
-                    actual_proceeds = amount_sold_net * sell_price * proceeds_ratio
-                    cost_paid = matched_paid * buy['price']
-
-                    total_realized_pnl += actual_proceeds - cost_paid
-
-                    remaining_to_match -= matched_amount
-                    remaining_buy = buy['amount'] - matched_amount
-                    if remaining_buy > 0:
-                        remaining_paid = buy['amount_paid_for'] * (remaining_buy / buy['amount'])
-                        buy_queue.appendleft({
-                            'amount': remaining_buy,
-                            'amount_paid_for': remaining_paid,
-                            'price': buy['price']
-                        })
-
-        remaining_tokens = sum(b['amount'] for b in buy_queue)
-
-        # Get latest price for the token from combined_df
-        latest_token_row = combined_df[combined_df['token_name'] == token].sort_values(by='timestamp', ascending=False).head(1)
-        if not latest_token_row.empty:
-            latest_price = float(latest_token_row['genesis_usdc_price'].values[0])
-        else:
-            latest_price = 0.0
-        unrealized_pnl = remaining_tokens * latest_price
-
-        results.append({
-            'Sniper Wallet Address': maker,
-            'Token': token,
-            'Net PnL': round(total_realized_pnl, 6),
-            'Unrealized PnL': round(unrealized_pnl, 6),
-            'Remaining Tokens': round(remaining_tokens, 6),
-            'Buy Txn Count': int(buy_txn_count),
-            'Sell Txn Count': int(sell_txn_count),
-            'First Buy Time': first_buy_time,
-            'Last Sell Time': last_sell_time,
-            'Average Buy Price USD': round(avg_buy_price, 6),
-            'Average Sell Price USD': round(avg_sell_price, 6),
-            'Total Tax Paid': round(total_tax_paid, 6),
-            'Total Transaction Fee Paid': round(total_transaction_fee_paid, 6)
-        })
-
-    return pd.DataFrame(results)
-
-# Load data with caching
-with st.spinner("Loading data..."):
-    combined_df = load_swap_data()
+@memoize("global_snipers.process_sniper_data", salt=DETECTION_PARAMS, max_entries=2)
+def process_sniper_data(version, _combined_df, token_launch_blocks):
+    """Process and cache sniper identification logic, keyed on the swap data version"""
+    with span("process_sniper_data: chunking"):
+        df_sniper_buys = find_sniper_buys(_combined_df, token_launch_blocks)
+
+    with span("process_sniper_data: quick-sell merge"):
+        potential_sniper_df = quick_sell_snipers(df_sniper_buys, _combined_df)
+
+    return potential_sniper_df
+
+@st.cache_resource
+def get_pnl_state():
+    """Shared incremental PnL state, folded forward as new swaps arrive"""
+    return PnLStateStore()
+
+def sniper_pnl_table(addresses, tokens, pnl, pending=None):
+    """The sniper PnL table from per-pair PnL columns, as `PnLStateStore.wallet_pnl` returns them.
+
+    Pairs flagged in `pending` have swaps in blocks not yet folded into the
+    PnL state, so their stats are behind; they are marked rather than shown
+    as if complete.
+    """
+    pending = np.zeros(len(pnl), dtype=bool) if pending is None else pending
+    return pd.DataFrame({
+        'Sniper Wallet Address': addresses,
+        'Token': tokens,
+        'Status': np.where(pending, 'Pending', 'Settled'),
+        'Net PnL': pnl['realized'].round(6).to_numpy(),
+        'Unrealized PnL': pnl['unrealized'].round(6).to_numpy(),
+        'Remaining Tokens': pnl['remaining'].round(6).to_numpy(),
+        'Buy Txn Count': pnl['buy_count'].to_numpy(),
+        'Sell Txn Count': pnl['sell_count'].to_numpy(),
+        'First Buy Time': pnl['first_buy_time'].to_numpy(),
+        'Last Sell Time': pnl['last_sell_time'].to_numpy(),
+        'Average Buy Price USD': pnl['avg_buy_price'].round(6).to_numpy(),
+        'Average Sell Price USD': pnl['avg_sell_price'].round(6).to_numpy(),
+        'Total Tax Paid': pnl['total_tax'].round(6).to_numpy(),
+        'Total Transaction Fee Paid': pnl['total_fees'].round(6).to_numpy()
+    })
+
+def calculate_pnl(potential_sniper_df, pnl_state, combined_df):
+    """Read sniper PnL results from the incremental PnL state, marking pairs still inside the settle window"""
+    sniper_pairs = potential_sniper_df[['wallet_id', 'token_name']].drop_duplicates()
+    pnl = pnl_state.wallet_pnl(sniper_pairs)
+    pending = pnl_state.pending(combined_df, sniper_pairs)
+    return sniper_pnl_table(decode_makers(sniper_pairs['wallet_id']), sniper_pairs['token_name'].to_numpy(), pnl, pending)
+
+def load_precomputed(db):
+    """The latest precompute.py run's sniper PnL table and source block, or None if there is no run"""
+    run = latest_run(db)
+    if run is None:
+        return None
+    summary = read_table(db, SNIPER_SUMMARY, run)
+    if summary.empty:
+        # a run that found no snipers is a result too, not a missing run
+        summary = pd.DataFrame(columns=PNL_COLUMNS, dtype=float).assign(maker=None, token_name=None)
+    summary['first_buy_time'] = pd.to_datetime(summary['first_buy_time'])
+    summary['last_sell_time'] = pd.to_datetime(summary['last_sell_time'])
+    pnl_df = sniper_pnl_table(summary['maker'].to_numpy(), summary['token_name'].to_numpy(), summary)
+    return pnl_df, max(run['source_blocks'].values(), default=None)
+
+def build_dashboard(db, pnl_state):
+    """Swap data, launch blocks, snipers and their PnL at the current collection versions.
+
+    May run on the background refresh thread, so it only uses the resources
+    it is handed and the page's memoized loaders, never st.* caches.
+    """
+    if SNIPER_SOURCE == "precomputed":
+        with span("load_precomputed"):
+            result = load_precomputed(db)
+        if result is not None:
+            return result
+        print("No precomputed sniper run found; computing live")
+
+    with span("load_swap_data"):
+        swap_version = swap_versions(db, SWAP_COLLECTIONS)
+        combined_df = load_swap_data(swap_version, db)
     if combined_df is None:
-        st.error("No data found from MongoDB collections.")
-        st.stop()
-    
-    token_launch_blocks = load_launch_blocks()
-    potential_sniper_df, combined_df = process_sniper_data(combined_df, token_launch_blocks)
-    pnl_df = calculate_pnl(potential_sniper_df, combined_df)
+        return None
+
+    with span("load_launch_blocks"):
+        token_launch_blocks = load_launch_blocks(swap_version, db, combined_df)
+    with span("process_sniper_data"):
+        potential_sniper_df = process_sniper_data(swap_version, combined_df, token_launch_blocks)
+    with span("pnl_state.refresh"):
+        pnl_state.refresh(combined_df)
+    with span("calculate_pnl"):
+        pnl_df = calculate_pnl(potential_sniper_df, pnl_state, combined_df)
+    as_of_block = max((block for _, block, _ in swap_version if block is not None), default=None)
+    return pnl_df, as_of_block
+
+# Load data with caching; a warm cache is served at once and refreshed behind it
+dashboard = stale_while_revalidate("global_snipers.dashboard", DASHBOARD_SOFT_TTL, DASHBOARD_MAX_STALE)
+db = get_db(SWAP_DB)
+pnl_state = get_pnl_state()
+with st.spinner("Loading data..."):
+    result = dashboard.get(lambda: build_dashboard(db, pnl_state))
+if result is None:
+    st.error("No data found from MongoDB collections.")
+    stop_page()
+pnl_df, as_of_block = result
 
 def render_sidebar():
     with st.sidebar:
@@ -460,6 +356,15 @@ render_sidebar()
 # Streamlit UI
 # Page Title
 st.markdown("<h1 style='color: white;'>Potential Snipers – PnL Overview</h1>", unsafe_allow_html=True)
+data_age = dashboard.age() or 0
+st.caption(
+    (f"Data as of block {as_of_block:,}" if as_of_block is not None else "Data as of an unknown block")
+    + f" · computed {data_age / 60:.0f} min ago"
+    + (" · refreshing in the background" if dashboard.refreshing else "")
+)
+if pnl_df.empty:
+    st.info("No snipers found in the swap data so far.")
+    stop_page()
 
 # Filter Popover Top-Right
 header_left, header_right = st.columns([6, 1])
@@ -531,7 +436,8 @@ filtered_df['S.No'] = range(1, len(filtered_df) + 1)
 # Autosize all columns
 column_config = {col: {"width": "auto"} for col in filtered_df.columns}
 st.markdown("<div class='scrollable'>", unsafe_allow_html=True)
-st.dataframe(filtered_df, hide_index=True, column_config=column_config)
+with span("render: summary table"):
+    st.dataframe(filtered_df, hide_index=True, column_config=column_config)
 st.markdown("</div>", unsafe_allow_html=True)
 
 # Add gap between table and KPIs
@@ -640,7 +546,7 @@ st.subheader("📈 Sniper & Token Activity Overview")
 graph1, graph2 = st.columns(2)
 
 # Top 10 Snipers by Net PnL (filtered)
-with graph1:
+with graph1, span("render: top snipers chart"):
     top10_snipers = pnl_df.groupby('Sniper Wallet Address')['Net PnL'].sum().nlargest(10).reset_index()
     chart = alt.Chart(top10_snipers).mark_bar().encode(
         x=alt.X('Net PnL:Q', title='Net PnL'),
@@ -650,7 +556,7 @@ with graph1:
     st.altair_chart(chart, use_container_width=True)
 
 # Token Sniper Activity — only show tokens in filtered_df
-with graph2:
+with graph2, span("render: token activity chart"):
     token_sniper_counts = pnl_df.groupby('Token')['Sniper Wallet Address'].nunique().reset_index()
     chart2 = alt.Chart(token_sniper_counts).mark_bar().encode(
         x=alt.X('Sniper Wallet Address:Q', title='Unique Snipers'),
@@ -666,4 +572,6 @@ hist = alt.Chart(pnl_df).mark_bar().encode(
     y=alt.Y('count()', title='Number of Snipers'),
     tooltip=['count()']
 ).properties(title='Sniper Profit Distribution', height=300)
-st.altair_chart(hist, use_container_width=True)
\ No newline at end of file
+st.altair_chart(hist, use_container_width=True)
+
+perf_panel()
@@ -1,15 +1,27 @@
 import os
-from dotenv import load_dotenv
 import pandas as pd
 import streamlit as st
-from pymongo import MongoClient
-from datetime import timedelta, datetime, timezone, time
+from pymongo.errors import OperationFailure
+from datetime import datetime, timezone, time
 from random import randint
 import altair as alt
-from collections import defaultdict, deque
+from sniper_engine import DETECTION_PARAMS, find_sniper_buys, quick_sell_snipers
+from pnl_engine import latest_prices, swap_pnl
+from mongo_db import get_db
+from swap_data import VERSION_TTL, collection_version, compact_swaps, load_frame, memory_report, swap_projection
+from wallet_ids import decode_makers, encode_makers
+from swap_table import (
+    PAGE_SIZES, build_query, column_bounds, count_rows, display_transactions,
+    fetch_page, format_transactions, sortable_columns, transaction_fields,
+)
+from token_kpis import KpiSchemaError, aggregate_token_kpis, token_kpis_from_frame
+from perf import perf_panel, span, start_run, stop_page
+from result_cache import memoize
+from precompute import SNIPER_BUYS, SNIPER_SOURCE, WALLET_PNL, latest_run, read_table
 
 # ───── Streamlit Setup ─────
 st.set_page_config(layout="wide", page_title="Sniper Analysis by Lampros")
+start_run("tokendatatestcopy")
 
 # ───── Global Styling ─────
 st.markdown("""
@@ -107,10 +119,11 @@ def render_sidebar():
 render_sidebar()
 
 # ───── Load DB Connection ─────
-load_dotenv()
-dbconn = os.getenv("MongoLink")
-client = MongoClient(dbconn)
-db = client['genesis_tokens_swap_info']
+db = get_db()
+
+@st.cache_data(ttl=300, max_entries=64)
+def load_token_kpis(token):
+    return aggregate_token_kpis(db, token)
 
 
 # ───── Token Parameter ─────
@@ -129,12 +142,12 @@ if not token:
     if st.button("View Token Details") and selected:
         st.switch_page(f"/tokendatatestcopy.py?token={selected.lower()}")
     
-    st.stop()
+    stop_page()
 colh, cold, colmpty = st.columns([3, 4, 5])
 with colh:
     st.markdown(f"<h1 style='margin-top: 0rem; color: white;'>TOKEN {token.upper()}</h1>", unsafe_allow_html=True)
 
-with cold:
+with cold, span("header probes"):
     doc = db["swap_progress"].find_one({"token_symbol": token.upper()})
     if doc:
         token_addr = doc.get("token_address", "N/A")
@@ -159,7 +172,7 @@ with cold:
         timestamp = swap_doc.get("timestamp", 0) if swap_doc else 0
         launch_time = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%d-%m-%Y %H:%M') if timestamp else "N/A"
         collection_name = f"{token.lower()}_swap"
-        swap_count = db[collection_name].count_documents({})
+        swap_count = count_rows(db[collection_name], {})
         details_card = f"""
         <div style="
             background-color: rgba(255, 255, 255, 0.1);
@@ -186,74 +199,68 @@ with colmpty:
     st.write("")
 
 # ───── Collection Naming ─────
-token_in_col = f"{token.upper()}_IN"
-token_out_col = f"{token.upper()}_OUT"
-virtual_in_col = "Virtual_IN"
-virtual_out_col = "Virtual_OUT"
 collection_name = f"{token}_swap"
+swaps = db[collection_name]
 
 # ───── Fetch Data ─────
-data = list(db[collection_name].find({}, {
-    "blockNumber": 1, "txHash": 1, "maker": 1, "swapType": 1, "label": 1, "timestampReadable": 1,
-    token_in_col: 1, token_out_col: 1, virtual_in_col: 1, virtual_out_col: 1,
-    "genesis_usdc_price": 1, "genesis_virtual_price": 1, "virtual_usdc_price": 1, "Tax_1pct":1, "transactionFee":1
-}))
-#st.write("Fetched rows:", len(data))
-#st.write("Sample doc:", data[0] if data else "No data")
-
-tabdf = pd.DataFrame(data).fillna(0)
-
-# ───── Process Data ─────
-def extract_amount(row):
-    if row.get("swapType") == "buy":
-        return pd.Series([row.get(token_out_col), row.get(virtual_in_col)])
-    elif row.get("swapType") == "sell":
-        return pd.Series([row.get(token_in_col), row.get(virtual_out_col)])
-    return pd.Series([None, None])
-
-# Step 1: Extract TokenAmount and Virtual, round to 4 decimals
-tabdf[["TokenAmount", "Virtual"]] = tabdf.apply(extract_amount, axis=1)
-tabdf["TokenAmount"] = pd.to_numeric(tabdf["TokenAmount"], errors="coerce").round(4)
-tabdf["Virtual"] = pd.to_numeric(tabdf["Virtual"], errors="coerce").round(4)
-tabdf.rename(columns={"TokenAmount": token.upper()}, inplace=True)
-
-# Step 2: Select and rename required columns
-tabdf = tabdf[[ 
-    "blockNumber", "txHash", "maker", "swapType", "label", "timestampReadable", token.upper(), "Virtual", "genesis_usdc_price", "genesis_virtual_price", "virtual_usdc_price", "Tax_1pct", "transactionFee"
-]].rename(columns={
-    "blockNumber": "BLOCK",
-    "txHash": "TX HASH",
-    "maker": "MAKER",
-    "swapType": "TX TYPE",
-    "label": "SWAP TYPE",
-    "timestampReadable": "TIME",
-    "Virtual": "VIRTUAL",
-    "genesis_usdc_price": "GENESIS \nPRICE ($)",
-    "genesis_virtual_price": "GENESIS PRICE \n($VIRTUAL)",
-    "virtual_usdc_price": "VIRTUAL \nPRICE ($)",
-    "Tax_1pct": "TAX (ETH)",
-    "transactionFee": f"TX FEE ({token.upper()})"
-})
-
-# Step 3: Transaction Value Calculation
-tabdf["TRANSACTION VALUE ($)"] = (
-    pd.to_numeric(tabdf[token.upper()], errors="coerce") *
-    pd.to_numeric(tabdf["GENESIS \nPRICE ($)"], errors="coerce")
-).round(4)
-
-# Step 4: Parse TIME as datetime
-tabdf["TIME"] = pd.to_datetime(tabdf["TIME"], errors="coerce")
-
-# Step 5: Minimal display formatting — no HTML tags
-tabdf["TX HASH"] = tabdf["TX HASH"].astype(str).str[:8] + "..." + tabdf["TX HASH"].astype(str).str[-4:]
-tabdf["MAKER"] = tabdf["MAKER"].apply(lambda addr: f"{addr[:5]}...{addr[-5:]}" if isinstance(addr, str) else addr)
-tabdf["TX TYPE"] = tabdf["TX TYPE"].astype(str)
+# The transactions table pages through Mongo (see swap_table.py); only the
+# current page is fetched, filtered and sorted server-side.
+@st.cache_data(ttl=300, max_entries=64)
+def load_table_options(token):
+    col = db[f"{token}_swap"]
+    labels = sorted(label for label in col.distinct("label") if label is not None)
+    first = col.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+    last = col.find_one({}, {"timestamp": 1}, sort=[("timestamp", -1)])
+    if not first or not last:
+        return labels, None
+    to_date = lambda doc: datetime.fromtimestamp(doc["timestamp"], tz=timezone.utc).date()
+    return labels, (to_date(first), to_date(last))
+
+@st.cache_data(ttl=300, max_entries=256)
+def count_transactions(token, query):
+    return count_rows(db[f"{token}_swap"], query)
+
+@st.cache_data(ttl=300, max_entries=256)
+def load_column_bounds(token, query, column):
+    return column_bounds(db[f"{token}_swap"], token, query, column)
+
+# ───── Shared Swap Frame ─────
+# One projected load per token and collection version; every tab derives its
+# views from this frame instead of querying the collection again.
+def token_fields(token):
+    """Every swap field the page reads: the transactions table's plus sniper detection and PnL's"""
+    return {**transaction_fields(token), **swap_projection(f"{token.upper()}_")}
+
+@st.cache_data(ttl=VERSION_TTL, max_entries=64)
+def load_swap_version(token):
+    return collection_version(db, f"{token}_swap")
+
+@memoize("tokendatatestcopy.load_swap_data")
+def load_swap_data(token, version):
+    col_name = f"{token}_swap"
+    df = load_frame(db[col_name], projection=token_fields(token))
+    if df is None:
+        return None
+    df["token_name"] = token.upper()
+    df["timestampReadable"] = pd.to_datetime(df["timestampReadable"], errors='coerce')
+    compact_df = encode_makers(compact_swaps(df))
+    report = memory_report(df, compact_df)
+    print(f"{col_name} frame memory: {report.loc['total', 'MB before']:.1f} MB -> {report.loc['total', 'MB after']:.1f} MB")
+    return compact_df
+
+def load_transactions(token):
+    """Every swap as a display frame, from the shared frame; only needed for the pandas KPI fallback"""
+    swaps = load_swap_data(token, load_swap_version(token))
+    if swaps is None:
+        return display_transactions(format_transactions([], token))
+    documents = swaps.astype({col: object for col in swaps.select_dtypes("category").columns})
+    documents["maker"] = decode_makers(swaps["wallet_id"])
+    return display_transactions(format_transactions(documents, token))
 
 # Step 6: Sortable Columns
-sortable_columns = ["BLOCK", "TIME", token.upper(), "VIRTUAL", "GENESIS \nPRICE ($)", "TRANSACTION VALUE ($)", "GENESIS PRICE \n($VIRTUAL)", "VIRTUAL \nPRICE ($)", "TAX (ETH)", f"TX FEE ({token.upper()})"]
-
-# Final filtered_df copy
-filtered_df = tabdf.copy()
+sort_options = sortable_columns(token)
+with span("load_table_options"):
+    label_values, time_bounds = load_table_options(token)
 
 tab1, tab2, tab3 = st.tabs(["TRANSCTIONS", "SNIPER INSIGHTS", "OTHER"])
 
@@ -268,20 +275,20 @@ with tab1:
     
         with col2:
             st.markdown("<div style='color: white; font-weight: 500;'>Swap Type</div>", unsafe_allow_html=True)
-            label_options = ["All"] + sorted(tabdf["SWAP TYPE"].dropna().unique())
+            label_options = ["All"] + label_values
             label_filter = st.selectbox("", label_options)
     
         with col3:
             st.markdown("<div style='color: white; font-weight: 500;'>Date Range</div>", unsafe_allow_html=True)
             date_range = st.date_input(
                 "",
-                value=(tabdf["TIME"].min(), tabdf["TIME"].max())
+                value=time_bounds or ()
             )
 
     
         with col4:
             st.markdown("<div style='color: white; font-weight: 500;'>Sort by</div>", unsafe_allow_html=True)
-            sort_col = st.selectbox("", sortable_columns)
+            sort_col = st.selectbox("", sort_options)
     
         with col5:
             st.markdown("<div style='color: white; font-weight: 500;'>Order</div>", unsafe_allow_html=True)
@@ -290,38 +297,19 @@ with tab1:
         with col10:
             st.markdown("<div style='color: white; font-weight: 500;'>Search</div>", unsafe_allow_html=True)
             search_query = st.text_input("", placeholder="BLOCK | MAKER | TX HASH")
-            if search_query:
-                q = search_query.strip().lower()
-                filtered_df = filtered_df[
-                    filtered_df["BLOCK"].astype(str).str.contains(q) |
-                    filtered_df["MAKER"].str.lower().str.contains(q) |
-                    filtered_df["TX HASH"].str.lower().str.contains(q)
-                ]
+            # prefix search uses the indexes; matching anywhere reads every filtered swap
+            search_anywhere = st.checkbox("Match anywhere (slower)", value=False)
     
     # ───── Apply Filters ─────
-    mask = pd.Series(True, index=tabdf.index)
-
-    if swap_filter != "all":
-        mask &= tabdf["TX TYPE"].str.lower() == swap_filter.lower()
-
-    if label_filter != "All":
-        mask &= tabdf["SWAP TYPE"] == label_filter
-
-    if isinstance(date_range, tuple) and len(date_range) == 2:
-        start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]) + timedelta(days=1)
-        mask &= (tabdf["TIME"] >= start_date) & (tabdf["TIME"] <= end_date)
-
-    filtered_df = tabdf.loc[mask].copy()
-
-    if isinstance(date_range, tuple) and len(date_range) == 2:
-        start_date = pd.to_datetime(date_range[0])
-        end_date = pd.to_datetime(date_range[1]) + timedelta(days=1)
-        filtered_df["TIME"] = pd.to_datetime(filtered_df["TIME"], errors='coerce')
-        filtered_df = filtered_df[
-            (filtered_df["TIME"] >= start_date) & (filtered_df["TIME"] <= end_date)
-        ]
+    query = build_query(
+        token,
+        swap_type=swap_filter or "all",
+        label=label_filter,
+        date_range=date_range if isinstance(date_range, tuple) and len(date_range) == 2 else None,
+        search=search_query,
+        search_anywhere=search_anywhere,
+    )
 
-    
     # ───── Filters: Panel 2 (Numeric Range) ─────
     with st.container():
         col6, col7 = st.columns([1, 4])
@@ -331,21 +319,44 @@ with tab1:
             selected_col = st.selectbox("", numeric_columns)
     
         with col7:
-            if selected_col in filtered_df.columns and not filtered_df[selected_col].dropna().empty:
-                col_min, col_max = filtered_df[selected_col].min(), filtered_df[selected_col].max()
-                if pd.notnull(col_min) and pd.notnull(col_max) and col_min != col_max:
+            bounds = load_column_bounds(token, query, selected_col)
+            if bounds is not None:
+                col_min, col_max = bounds
+                if col_min != col_max:
                     st.markdown(f"<div style='color: white; font-weight: 500;'>Range for {selected_col}</div>", unsafe_allow_html=True)
                     value_range = st.slider(
                         "", float(col_min), float(col_max), (float(col_min), float(col_max)),
                         step=0.000001, format="%.6f"
                     )
-                    filtered_df = filtered_df[
-                        (filtered_df[selected_col] >= value_range[0]) &
-                        (filtered_df[selected_col] <= value_range[1])
-                    ]
-    
+                    if value_range != (float(col_min), float(col_max)):
+                        query = build_query(
+                            token,
+                            swap_type=swap_filter or "all",
+                            label=label_filter,
+                            date_range=date_range if isinstance(date_range, tuple) and len(date_range) == 2 else None,
+                            search=search_query,
+                            search_anywhere=search_anywhere,
+                            value_range=(selected_col, value_range[0], value_range[1]),
+                        )
+
+    # ───── Pagination ─────
+    # Keyset cursors for the pages visited so far; any filter or sort change starts over
+    page_size = st.session_state.get("tx_page_size", PAGE_SIZES[1])
+    page_key = repr((token, query, sort_col, sort_dir, page_size))
+    if st.session_state.get("tx_page_key") != page_key:
+        st.session_state["tx_page_key"] = page_key
+        st.session_state["tx_cursors"] = [None]
+    cursors = st.session_state["tx_cursors"]
+    with span("transactions: fetch page"):
+        rows, next_after = fetch_page(
+            swaps, token, query, sort_col=sort_col, ascending=(sort_dir == "Ascending"),
+            after=cursors[-1], page_size=page_size,
+        )
+    with span("transactions: count"):
+        total_rows = count_transactions(token, query)
+
     #--TABLE RENDERING
-    filtered_df = filtered_df.sort_values(by=sort_col, ascending=(sort_dir == "Ascending"))
+    filtered_df = display_transactions(format_transactions(rows, token))
     #ordering columns
     ordered_cols = [
         "BLOCK", "TX HASH", "MAKER", "TX TYPE", "SWAP TYPE", "TIME",
@@ -354,53 +365,24 @@ with tab1:
     ]
     filtered_df = filtered_df[[col for col in ordered_cols if col in filtered_df.columns]]
     
-    tabdf["date"] = tabdf["TIME"].dt.date
-    volume_df = tabdf.groupby("date")[token.upper()].sum().reset_index()
     # --- KPI METRICS ---
+    # Aggregated in MongoDB; the pandas path covers schemas the pipeline can't handle
+    with span("token KPIs"):
+        try:
+            kpis = load_token_kpis(token)
+        except (OperationFailure, KpiSchemaError):
+            kpis = token_kpis_from_frame(load_transactions(token), token)
+    unique_makers = kpis["unique_makers"]
+    sell_volume_usd = kpis["sell_volume_usd"]
+    buy_volume_usd = kpis["buy_volume_usd"]
+    volume_df = kpis["volume_df"]
+    buyers = kpis["buyers"]
+    sellers = kpis["sellers"]
+
     with st.container():
         
         col1, col2, col3= st.columns([1,2,2])
 
-        with col1:
-            
-            if "MAKER_CLEAN" not in tabdf.columns:
-                import re
-                tabdf["MAKER_CLEAN"] = tabdf["MAKER"].apply(lambda addr: re.sub(r'<.*?>', '', addr) if isinstance(addr, str) else addr)
-            unique_makers = tabdf["MAKER_CLEAN"].nunique()
-            
-            sell_volume_usd = (
-                tabdf[tabdf["TX TYPE"] == "sell"][token.upper()] *
-                tabdf[tabdf["TX TYPE"] == "sell"]["GENESIS \nPRICE ($)"]
-            ).sum()
-            
-            buy_volume_usd = (
-                tabdf[tabdf["TX TYPE"] == "buy"][token.upper()] *
-                tabdf[tabdf["TX TYPE"] == "buy"]["GENESIS \nPRICE ($)"]
-            ).sum()
-            
-        tabdf["MAKER_CLEAN"] = tabdf["MAKER"].str.replace(r"<.*?>", "", regex=True)
-        # BUYERS: Group by address, compute total USD bought
-        buyers = (
-            tabdf[tabdf["TX TYPE"] == "buy"]
-            .groupby("MAKER_CLEAN")
-            .apply(lambda df: (df[token.upper()] * df["GENESIS \nPRICE ($)"]).sum())
-            .nlargest(10)
-            .reset_index(name="buy_volume_usd")
-        )
-
-        # SELLERS: Group by address, compute total USD sold
-        sellers = (
-            tabdf[tabdf["TX TYPE"] == "sell"]
-            .groupby("MAKER_CLEAN")
-            .apply(lambda df: (df[token.upper()] * df["GENESIS \nPRICE ($)"]).sum())
-            .nlargest(10)
-            .reset_index(name="sell_volume_usd")
-        )
-
-        # Shorten address for readability
-        buyers["MAKER_SHORT"] = buyers["MAKER_CLEAN"].apply(lambda a: a[:6] + "..." + a[-4:])
-        sellers["MAKER_SHORT"] = sellers["MAKER_CLEAN"].apply(lambda a: a[:6] + "..." + a[-4:])
-
         with col2:
             
             chart_buyers = alt.Chart(buyers).mark_bar(color="#4fb0ff").encode(
@@ -443,12 +425,29 @@ with tab1:
 
     # --- Render Everything ---
     with st.container():
-        styled_df = filtered_df.style.applymap(
-            lambda x: 'color: #74fe64; font-weight: bold;' if x == 'buy' else ('color: red; font-weight: bold;' if x == 'sell' else ''),
-            subset=['TX TYPE']
-        )
+        with span("render: transactions table"):
+            styled_df = filtered_df.style.applymap(
+                lambda x: 'color: #74fe64; font-weight: bold;' if x == 'buy' else ('color: red; font-weight: bold;' if x == 'sell' else ''),
+                subset=['TX TYPE']
+            )
 
-        st.dataframe(styled_df, use_container_width=True, hide_index=True)
+            st.dataframe(styled_df, use_container_width=True, hide_index=True)
+
+        page_number = len(cursors)
+        first_row = (page_number - 1) * page_size + 1 if rows else 0
+        pcol1, pcol2, pcol3, pcol4 = st.columns([2, 1, 1, 6])
+        with pcol1:
+            st.markdown(f"<div style='color: white;'>Rows {first_row:,}–{first_row + len(rows) - 1 if rows else 0:,} of {total_rows:,}</div>", unsafe_allow_html=True)
+        with pcol2:
+            if st.button("◀ Prev", disabled=page_number == 1):
+                cursors.pop()
+                st.rerun()
+        with pcol3:
+            if st.button("Next ▶", disabled=next_after is None):
+                cursors.append(next_after)
+                st.rerun()
+        with pcol4:
+            st.selectbox("Rows per page", PAGE_SIZES, index=1, key="tx_page_size")
 
         st.title("")
         col1, col2, col3 = st.columns([1,2,2])
@@ -459,35 +458,23 @@ with tab1:
             st.markdown(f"<div class='glass-kpi'><h4>SELL VOLUME ($)</h4><p>${sell_volume_usd:,.2f}</p></div>", unsafe_allow_html=True)
             st.write("")
             st.markdown(f"<div class='glass-kpi'><h4>BUY VOLUME ($)</h4><p>${buy_volume_usd:,.2f}</p></div>", unsafe_allow_html=True)
-        with col2:
+        with col2, span("render: top buyers chart"):
             st.subheader("TOP 10 BUYERS")
             st.altair_chart(chart_buyers, use_container_width=True)
-        with col3:
+        with col3, span("render: top sellers chart"):
             st.subheader("TOP 10 SELLERS")
             st.altair_chart(chart_sellers, use_container_width=True)
         st.subheader("SWAP VOLUME OVER TIME")
-        st.altair_chart(chart, use_container_width=True)
+        with span("render: swap volume chart"):
+            st.altair_chart(chart, use_container_width=True)
 #-----TAB2 : SNIPER INSIGHTS WITH PNL-----
 with tab2:
     # ───── Token from Query Params ─────
     token_upper = token.upper()
-    # ───── Load Swap Data for Token ─────
-    @st.cache_data(ttl=300)
-    def load_swap_data(token):
-        col_name = f"{token}_swap"
-        data = list(db[col_name].find())
-        if not data:
-            return None
-        df = pd.DataFrame(data)
-        df.drop(columns=["_id"], errors="ignore", inplace=True)
-        df["token_name"] = token.upper()
-        df["timestampReadable"] = pd.to_datetime(df["timestampReadable"], errors='coerce')
-        return df
     # ───── Launch Block (fallback logic) ─────
-    @st.cache_data(ttl=600)
+    @st.cache_data(ttl=600, max_entries=1)
     def load_launch_blocks():
-        client = MongoClient(dbconn)
-        db = client["genesis_tokens_swap_info"]
+        db = get_db()
         try:
             persona_data = list(db["swap_progress"].find({}, {"token_symbol": 1, "genesis_block": 1}))
             df = pd.DataFrame(persona_data)
@@ -497,186 +484,137 @@ with tab2:
             print("Error loading launch blocks:", e)
         return {}
     # ───── Sniper Detection Logic ─────
-    @st.cache_data(ttl=300)
-    def process_sniper_data(combined_df, token_launch_blocks):
-        buy_df = combined_df[combined_df["swapType"] == "buy"].copy()
-        buy_df = buy_df.sort_values(by=["maker", "timestampReadable"])
-        chunked_buys = []
-        time_threshold = pd.Timedelta(minutes=10)
-
-        for maker, group in buy_df.groupby("maker"):
-            current_chunk = []
-            chunk_start_time = None
-            current_sum = 0
-            for row in group.itertuples():
-                if not current_chunk:
-                    chunk_start_time = row.timestampReadable
-                    current_chunk = [row]
-                    token_prefix = row.token_name  # e.g., "AFATH"
-                    field = f"{token_prefix}_OUT_BeforeTax"
-                    current_sum = getattr(row, field, 0)  # fallback to 0 if field missing
-
-                elif row.timestampReadable - chunk_start_time <= time_threshold:
-                    current_chunk.append(row)
-                    current_sum += getattr(row, field, 0)
-                else:
-                    if current_sum > 100000:
-                        chunked_buys.extend(current_chunk)
-                    chunk_start_time = row.timestampReadable
-                    current_chunk = [row]
-                    token_prefix = row.token_name
-                    field = f"{token_prefix}_OUT_BeforeTax"
-                    current_sum = getattr(row, field, 0)
-
-            if current_sum > 100000:
-                chunked_buys.extend(current_chunk)
-
-        df_chunked_large_buys = pd.DataFrame(chunked_buys).drop_duplicates()
-        if "transactionFee" in df_chunked_large_buys.columns:
-            df_high_gas = df_chunked_large_buys[df_chunked_large_buys["transactionFee"] > 0.000002]
-        else:
-            df_high_gas = df_chunked_large_buys.copy()
-            st.warning("⚠️ 'transactionFee' missing in dataset — skipping gas filter.")
-
-
-        def is_sniper_buy(row):
-            launch_block = token_launch_blocks.get(row["token_name"])
-            return launch_block is not None and row["blockNumber"] <= launch_block + 100
-
-        df_sniper_buys = df_high_gas[df_high_gas.apply(is_sniper_buy, axis=1)]
-
-        sells = combined_df[combined_df["swapType"] == "sell"][["maker", "timestampReadable", "token_name"]]
-        merged = pd.merge(
-            df_sniper_buys[["maker", "timestampReadable", "token_name"]],
-            sells,
-            on=["maker", "token_name"],
-            suffixes=("_buy", "_sell"),
-        )
-        merged["time_diff"] = (merged["timestampReadable_sell"] - merged["timestampReadable_buy"]).dt.total_seconds()
-        quick_sells = merged[merged["time_diff"].between(0, 20 * 60)]
-        potential_sniper_df = df_sniper_buys[df_sniper_buys["maker"].isin(quick_sells["maker"])].copy()
-        return potential_sniper_df, combined_df
+    @memoize("tokendatatestcopy.process_sniper_data", salt=DETECTION_PARAMS)
+    def process_sniper_data(version, _combined_df, token_launch_blocks):
+        combined_df = _combined_df
+        amount_col = f"{combined_df['token_name'].iloc[0]}_OUT_BeforeTax"
+        with span("process_sniper_data: chunking"):
+            df_sniper_buys = find_sniper_buys(combined_df, token_launch_blocks, amount_col=amount_col, by=["wallet_id"])
+
+        with span("process_sniper_data: quick-sell merge"):
+            potential_sniper_df = quick_sell_snipers(df_sniper_buys, combined_df)
+        return potential_sniper_df
     # ───── PnL Calculation ─────
-    @st.cache_data(ttl=300)
-    def calculate_pnl(potential_sniper_df, combined_df):
-        results = []
-        sniper_pairs = potential_sniper_df[["maker", "token_name"]].drop_duplicates()
-        for _, row in sniper_pairs.iterrows():
-            maker = row["maker"]
-            token = row["token_name"]
-            df = combined_df[(combined_df["maker"] == maker) & (combined_df["token_name"] == token)]
-            df = df.sort_values(by="timestampReadable")
-            trades = defaultdict(list)
-            # Dynamic field names based on token
-            out_before_tax_col = f"{token}_OUT_BeforeTax"
-            out_after_tax_col = f"{token}_OUT_AfterTax"
-            in_before_tax_col = f"{token}_IN_BeforeTax"
-            in_after_tax_col = f"{token}_IN_AfterTax"
-
-            buy_txn_count = (df["swapType"] == "buy").sum()
-            sell_txn_count = (df["swapType"] == "sell").sum()
-            first_buy_time = df.loc[df["swapType"] == "buy", "timestampReadable"].min()
-            last_sell_time = df.loc[df["swapType"] == "sell", "timestampReadable"].max()
-            avg_buy_price = df.loc[df["swapType"] == "buy", "genesis_usdc_price"].mean()
-            avg_sell_price = df.loc[df["swapType"] == "sell", "genesis_usdc_price"].mean()
-            total_tax_paid = df["Tax_1pct"].sum()
-            total_tx_fees = df["transactionFee"].sum()
-
-            for _, tx in df.iterrows():
-                        token_prefix = tx["token_name"]
-                        if tx["swapType"] == "buy":
-                            out_before_tax = tx.get(f"{token_prefix}_OUT_BeforeTax", 0.0)
-                            out_after_tax = tx.get(f"{token_prefix}_OUT_AfterTax", 0.0)
-                            trades[maker].append({
-                                "type": "buy",
-                                "amount": out_after_tax,  # amount received after tax
-                                "amount_paid_for": out_before_tax,  # original amount paid for (before tax)
-                                "price": tx["genesis_usdc_price"]
-                            })
-                        elif tx["swapType"] == "sell":
-                            in_before_tax = tx.get(f"{token}_IN_BeforeTax", 0.0)
-                            in_after_tax = tx.get(f"{token}_IN_AfterTax", 0.0)
-                            trades[maker].append({
-                                "type": "sell",
-                                "amount_sold_net": in_after_tax,  # net amount sold (after tax)
-                                "from_wallet": in_before_tax,  # amount from wallet (before tax)
-                                "price": tx["genesis_usdc_price"]
-                            })
-                    
-            buy_queue = deque()
-            realized = 0.0
-                    
-            for tx in trades[maker]:
-                if tx["type"] == "buy":
-                    buy_queue.append({
-                        "amount": tx["amount"],  # tokens received after tax
-                        "amount_paid_for": tx["amount_paid_for"],  # original USD amount paid
-                        "price": tx["price"]
-                    })
-                elif tx["type"] == "sell":
-                    to_match = tx["from_wallet"]  # tokens to sell (from wallet)
-                    amount_sold_net = tx["amount_sold_net"]  # net tokens sold (after tax)
-                    sell_price = tx["price"]
-                    
-                    while to_match > 0 and buy_queue:
-                        buy = buy_queue.popleft()
-                        match_amt = min(to_match, buy["amount"])
-                        
-                        # Calculate matched cost using Version 1 logic
-                        ratio = match_amt / buy["amount"]
-                        matched_paid = buy["amount_paid_for"] * ratio
-                        
-                        # Calculate proceeds using Version 1 logic with tax consideration
-                        proceeds_ratio = match_amt / tx["from_wallet"]
-                        actual_proceeds = amount_sold_net * sell_price * proceeds_ratio
-                        cost_paid = matched_paid * buy["price"]
-                        
-                        realized += actual_proceeds - cost_paid
-                        
-                        to_match -= match_amt
-                        leftover = buy["amount"] - match_amt
-                        if leftover > 0:
-                            remaining_paid = buy["amount_paid_for"] * (leftover / buy["amount"])
-                            buy_queue.appendleft({
-                                "amount": leftover,
-                                "amount_paid_for": remaining_paid,
-                                "price": buy["price"]
-                            })
-            # summing leftover tokens for unrealized
-            remaining = sum(b["amount"] for b in buy_queue)
-            latest_price = combined_df[combined_df["token_name"] == token].sort_values(by="timestampReadable", ascending=False).head(1)["genesis_usdc_price"].values[0]
-            unrealized = remaining * latest_price
-
-            results.append({
-                "Wallet Address": maker,
-                "Net PnL ($)": round(realized, 4),
-                "Unrealized PnL ($)": round(unrealized, 4),
-                "Remaining Tokens": float(f"{remaining:.4f}"),
-                "BUY COUNT": buy_txn_count,
-                "SELL COUNT": sell_txn_count,
-                "First Buy Time": first_buy_time,
-                "Last Sell Time": last_sell_time,
-                "Average Buy Price ($)": round(avg_buy_price, 4),
-                "Average Sell Price ($)": round(avg_sell_price, 4),
-                "Total Tax Paid": round(total_tax_paid, 4),
-                "TXN FEES (ETH)": round(total_tx_fees, 4)
-            })
-        print("Returning results with rows:", len(results))
-        print("Result keys:", results[0].keys() if results else "No results")
-        return pd.DataFrame(results)
+    def sniper_pnl_table(addresses, pnl):
+        """The sniper summary table from per-pair PnL columns, as `PnLStateStore.wallet_pnl` returns them"""
+        return pd.DataFrame({
+            "Wallet Address": addresses,
+            "Net PnL ($)": pnl["realized"].round(4).to_numpy(),
+            "Unrealized PnL ($)": pnl["unrealized"].round(4).to_numpy(),
+            "Remaining Tokens": [float(f"{remaining:.4f}") for remaining in pnl["remaining"]],
+            "BUY COUNT": pnl["buy_count"].to_numpy(),
+            "SELL COUNT": pnl["sell_count"].to_numpy(),
+            "First Buy Time": pnl["first_buy_time"].to_numpy(),
+            "Last Sell Time": pnl["last_sell_time"].to_numpy(),
+            "Average Buy Price ($)": pnl["avg_buy_price"].round(4).to_numpy(),
+            "Average Sell Price ($)": pnl["avg_sell_price"].round(4).to_numpy(),
+            "Total Tax Paid": pnl["total_tax"].round(4).to_numpy(),
+            "TXN FEES (ETH)": pnl["total_fees"].round(4).to_numpy()
+        })
+
+    def participants_table(wallet_ids, pnl):
+        """The all-participants PnL table from per-pair PnL and trade stats columns"""
+        return pd.DataFrame({
+            "wallet_id": wallet_ids,
+            "Wallet Address": decode_makers(wallet_ids),
+            "Net PnL ($)": pnl["realized"].round(4).to_numpy(),
+            "Unrealized PnL ($)": pnl["unrealized"].round(4).to_numpy(),
+            "Remaining Tokens": [float(f"{remaining:.4f}") for remaining in pnl["remaining"]],
+            "Txn Count (BUY)": pnl["buy_count"].to_numpy(),
+            "Txn Count (SELL)": pnl["sell_count"].to_numpy(),
+            "First Buy Time": pnl["first_buy_time"].to_numpy(),
+            "Last Sell Time": pnl["last_sell_time"].to_numpy(),
+            "Average Buy Price ($)": pnl["avg_buy_price"].round(4).to_numpy(),
+            "Average Sell Price ($)": pnl["avg_sell_price"].round(4).to_numpy(),
+            "Total Tax Paid": pnl["total_tax"].round(4).to_numpy(),
+            "Total Tx Fees Paid (ETH)": pnl["total_fees"].round(4).to_numpy()
+        })
+
+    # ───── Precomputed Results ─────
+    @st.cache_data(ttl=VERSION_TTL, max_entries=1)
+    def load_precompute_run():
+        """The latest precompute.py run, or None"""
+        return latest_run(db)
+
+    @memoize("tokendatatestcopy.load_precomputed")
+    def load_precomputed(token, run_id):
+        """(sniper buys, sniper PnL table, all-participants PnL table) of a precompute.py run, or None if it has no swaps of `token`"""
+        run = {"_id": run_id}
+        query = {"token_name": token.upper()}
+        wallet_pnl = read_table(db, WALLET_PNL, run, query)
+        if wallet_pnl.empty:
+            return None
+        wallet_pnl["first_buy_time"] = pd.to_datetime(wallet_pnl["first_buy_time"])
+        wallet_pnl["last_sell_time"] = pd.to_datetime(wallet_pnl["last_sell_time"])
+        wallet_pnl = encode_makers(wallet_pnl)
+        sniper_buys = read_table(db, SNIPER_BUYS, run, query)
+        if sniper_buys.empty:
+            sniper_buys = pd.DataFrame({"wallet_id": pd.Series(dtype="int32"), "token_name": pd.Series(dtype=object)})
+        else:
+            sniper_buys = encode_makers(sniper_buys)
+
+        sniper_pairs = sniper_buys[["wallet_id", "token_name"]].drop_duplicates()
+        sniper_pnl = sniper_pairs.merge(wallet_pnl, on=["wallet_id", "token_name"])
+        pnl_df = sniper_pnl_table(decode_makers(sniper_pnl["wallet_id"]), sniper_pnl)
+        pnl_all_df = participants_table(wallet_pnl["wallet_id"].to_numpy(), wallet_pnl)
+        pnl_all_df["Total Buys (USD)"] = wallet_pnl["buy_usd"].to_numpy()
+        pnl_all_df["Total Sells (USD)"] = wallet_pnl["sell_usd"].to_numpy()
+        return sniper_buys, pnl_df, pnl_all_df
+
+    @memoize("tokendatatestcopy.calculate_pnl", salt=DETECTION_PARAMS)
+    def calculate_pnl(version, token_launch_blocks, _potential_sniper_df, _combined_df):
+        potential_sniper_df, combined_df = _potential_sniper_df, _combined_df
+        sniper_pairs = potential_sniper_df[["wallet_id", "token_name"]].drop_duplicates()
+        print("Returning results with rows:", len(sniper_pairs))
+        if sniper_pairs.empty:
+            return pd.DataFrame()
+        # One grouped pass for the trade stats and one FIFO pass over the sniper
+        # pairs' swaps, priced at the token's latest swap
+        with span("FIFO matching"):
+            pnl = swap_pnl(
+                combined_df.merge(sniper_pairs, on=["wallet_id", "token_name"]), ["wallet_id", "token_name"],
+                prefix=f"{combined_df['token_name'].iloc[0]}_",
+                latest_price=latest_prices(combined_df, time_col="timestampReadable"),
+            )
+        pnl = pnl.reindex(pd.MultiIndex.from_frame(sniper_pairs))
+        return sniper_pnl_table(decode_makers(sniper_pairs["wallet_id"]), pnl)
     # ───── Load and Process ─────
+    precomputed = None
+    if SNIPER_SOURCE == "precomputed":
+        with span("load_precomputed"):
+            precompute_run = load_precompute_run()
+            if precompute_run is not None:
+                precomputed = load_precomputed(token, precompute_run["_id"])
+        if precomputed is None:
+            print(f"No precomputed sniper run for {token_upper}; computing live")
     with st.spinner("Loading data..."):
-        combined_df = load_swap_data(token)
-        if combined_df is None:
-            st.error("No data found for this token.")
-            st.stop()
-        token_launch_blocks = load_launch_blocks()
+        if precomputed is None:
+            with span("load_swap_data"):
+                swap_version = load_swap_version(token)
+                combined_df = load_swap_data(token, swap_version)
+            if combined_df is None:
+                st.error("No data found for this token.")
+                stop_page()
+        with span("load_launch_blocks"):
+            token_launch_blocks = load_launch_blocks()
         st.write(token_launch_blocks)
-        potential_sniper_df, combined_df = process_sniper_data(combined_df, token_launch_blocks)
-    pnl_df = calculate_pnl(potential_sniper_df, combined_df)
+        if precomputed is None:
+            if "transactionFee" not in combined_df.columns:
+                st.warning("⚠️ 'transactionFee' missing in dataset — skipping gas filter.")
+            with span("process_sniper_data"):
+                potential_sniper_df = process_sniper_data(swap_version, combined_df, token_launch_blocks)
+    if precomputed is None:
+        with span("calculate_pnl"):
+            pnl_df = calculate_pnl(swap_version, token_launch_blocks, potential_sniper_df, combined_df)
+    else:
+        potential_sniper_df, pnl_df, precomputed_pnl_all_df = precomputed
+        source_block = precompute_run["source_blocks"].get(token_upper)
+        st.caption(
+            f"Precomputed as of block {source_block:,}" if source_block is not None else "Precomputed"
+        )
     if pnl_df.empty:
         st.markdown("### ❌ No Snipers Detected")
-        st.stop()
+        stop_page()
     #-----------------------------------------------------------------------------------------------------------------------------
     # Streamlit UI
     st.title(f"Potential Snipers – PnL Overview for {token_upper}")
@@ -711,8 +649,9 @@ with tab2:
                 return 'color: red; font-weight: bold;'
         return ''
 
-    styled_df = filtered_df.style.applymap(highlight_net_pnl, subset=["Net PnL ($)"])
-    st.dataframe(styled_df, use_container_width=True, hide_index=True)
+    with span("render: sniper table"):
+        styled_df = filtered_df.style.applymap(highlight_net_pnl, subset=["Net PnL ($)"])
+        st.dataframe(styled_df, use_container_width=True, hide_index=True)
 
 
 
@@ -823,102 +762,28 @@ with tab2:
                 st.altair_chart(bar_chart, use_container_width=True)
     # --- Top 50 Traders by Net PnL ---
     # ───── PnL for All Participants ─────
-    def calculate_pnl_all(df):
-        results = []
-        wallet_pairs = df[["maker", "token_name"]].drop_duplicates()
-        for _, row in wallet_pairs.iterrows():
-            maker = row["maker"]
-            token = row["token_name"]
-            user_df = df[(df["maker"] == maker) & (df["token_name"] == token)].sort_values(by="timestampReadable")
-            trades = defaultdict(list)
-
-            # Dynamic fields
-            out_before_tax = f"{token}_OUT_BeforeTax"
-            out_after_tax = f"{token}_OUT_AfterTax"
-            in_before_tax = f"{token}_IN_BeforeTax"
-            in_after_tax = f"{token}_IN_AfterTax"
-
-            buy_txn_count = (user_df["swapType"] == "buy").sum()
-            sell_txn_count = (user_df["swapType"] == "sell").sum()
-            first_buy_time = user_df.loc[user_df["swapType"] == "buy", "timestampReadable"].min()
-            last_sell_time = user_df.loc[user_df["swapType"] == "sell", "timestampReadable"].max()
-            avg_buy_price = user_df.loc[user_df["swapType"] == "buy", "genesis_usdc_price"].mean()
-            avg_sell_price = user_df.loc[user_df["swapType"] == "sell", "genesis_usdc_price"].mean()
-            total_tax_paid = user_df["Tax_1pct"].sum()
-            total_tx_fees = user_df["transactionFee"].sum()
-
-            for _, tx in user_df.iterrows():
-                prefix = tx["token_name"]
-                if tx["swapType"] == "buy":
-                    trades[maker].append({
-                        "type": "buy",
-                        "amount": tx.get(f"{prefix}_OUT_AfterTax", 0),
-                        "cost": tx.get(f"{prefix}_OUT_BeforeTax", 0),
-                        "price": tx["genesis_usdc_price"]
-                    })
-                elif tx["swapType"] == "sell":
-                    trades[maker].append({
-                        "type": "sell",
-                        "amount": tx.get(f"{prefix}_IN_AfterTax", 0),
-                        "from_wallet": tx.get(f"{prefix}_IN_BeforeTax", 0),
-                        "price": tx["genesis_usdc_price"]
-                    })
-
-            buy_queue = deque()
-            realized = 0.0
-            for tx in trades[maker]:
-                if tx["type"] == "buy":
-                    buy_queue.append(tx)
-                elif tx["type"] == "sell":
-                    to_match = tx["from_wallet"]
-                    proceeds = tx["amount"] * tx["price"]
-                    while to_match > 0 and buy_queue:
-                        buy = buy_queue.popleft()
-                        match_amt = min(to_match, buy["amount"])
-                        match_cost = buy["cost"] * (match_amt / buy["amount"])
-                        realized += proceeds * (match_amt / tx["from_wallet"]) - match_cost * buy["price"]
-                        to_match -= match_amt
-                        leftover = buy["amount"] - match_amt
-                        if leftover > 0:
-                            buy_queue.appendleft({
-                                "amount": leftover,
-                                "cost": buy["cost"] * (leftover / buy["amount"]),
-                                "price": buy["price"]
-                            })
-
-            remaining = sum(b["amount"] for b in buy_queue)
-            latest_price = df[df["token_name"] == token].sort_values(by="timestampReadable", ascending=False).head(1)["genesis_usdc_price"].values[0]
-            unrealized = remaining * latest_price
-
-            results.append({
-                "Wallet Address": maker,
-                "Net PnL ($)": round(realized, 4),
-                "Unrealized PnL ($)": round(unrealized, 4),
-                "Remaining Tokens": float(f"{remaining:.4f}"),
-                "Txn Count (BUY)": buy_txn_count,
-                "Txn Count (SELL)": sell_txn_count,
-                "First Buy Time": first_buy_time,
-                "Last Sell Time": last_sell_time,
-                "Average Buy Price ($)": round(avg_buy_price, 4),
-                "Average Sell Price ($)": round(avg_sell_price, 4),
-                "Total Tax Paid": round(total_tax_paid, 4),
-                "Total Tx Fees Paid (ETH)": round(total_tx_fees, 4)
-            })
-
-        return pd.DataFrame(results)
+    @memoize("tokendatatestcopy.calculate_pnl_all")
+    def calculate_pnl_all(version, _df):
+        df = _df
+        # One grouped pass for the trade stats and one FIFO pass for PnL,
+        # instead of masking the whole frame for every wallet
+        with span("FIFO matching"):
+            pnl = swap_pnl(df, ["wallet_id", "token_name"], prefix=f"{df['token_name'].iloc[0]}_")
+        return participants_table(pnl.index.get_level_values("wallet_id").to_numpy(), pnl)
     # --- Top 50 Traders by Net PnL (All Participants) ---
     st.subheader("📊 Top 50 Traders by Net PnL (All Participants)")
 
     # Calculate full PnL
-    pnl_all_df = calculate_pnl_all(combined_df)
+    if precomputed is None:
+        with span("calculate_pnl_all"):
+            pnl_all_df = calculate_pnl_all(swap_version, combined_df)
+    else:
+        pnl_all_df = precomputed_pnl_all_df
     pnl_all_df = pnl_all_df.sort_values(by="Net PnL ($)", ascending=False).reset_index(drop=True)
     pnl_all_df["Rank"] = pnl_all_df.index + 1
 
     # Add "Is Sniper" column
-    sniper_wallets = set(potential_sniper_df["maker"].unique())
-    pnl_all_df["Is Sniper"] = pnl_all_df["Wallet Address"].apply(
-        lambda addr: "Yes" if addr in sniper_wallets else "No"
-    )
+    pnl_all_df["Is Sniper"] = pnl_all_df["wallet_id"].isin(potential_sniper_df["wallet_id"]).map({True: "Yes", False: "No"})
 
 
     # Wallet shortening
@@ -931,24 +796,21 @@ with tab2:
     pnl_all_df["Net PnL ($)"] = pnl_all_df["Net PnL ($)"].round(4)
 
     # Total Buys and Sells in USD
-    def get_total_usd(tx_df, maker, token, tx_type):
-        subset = tx_df[
-            (tx_df["maker"] == maker) & 
-            (tx_df["token_name"] == token) & 
-            (tx_df["swapType"] == tx_type)
-        ]
-        try:
-            field = f"{token}_OUT_AfterTax" if tx_type == "buy" else f"{token}_IN_AfterTax"
-            return (subset["genesis_usdc_price"] * subset[field]).sum()
-        except KeyError:
-            return 0.0
-
-    pnl_all_df["Total Buys (USD)"] = pnl_all_df.apply(
-        lambda row: get_total_usd(combined_df, row["Wallet Address"], token_upper, "buy"), axis=1
-    )
-    pnl_all_df["Total Sells (USD)"] = pnl_all_df.apply(
-        lambda row: get_total_usd(combined_df, row["Wallet Address"], token_upper, "sell"), axis=1
-    )
+    def total_usd_by_wallet(tx_df, token, tx_type):
+        field = f"{token}_OUT_AfterTax" if tx_type == "buy" else f"{token}_IN_AfterTax"
+        if field not in tx_df.columns:
+            return pd.Series(dtype=float)
+        subset = tx_df[(tx_df["token_name"] == token) & (tx_df["swapType"] == tx_type)]
+        return (subset["genesis_usdc_price"] * subset[field]).groupby(subset["wallet_id"]).sum()
+
+    # precomputed runs already carry these totals
+    if precomputed is None:
+        pnl_all_df["Total Buys (USD)"] = pnl_all_df["wallet_id"].map(
+            total_usd_by_wallet(combined_df, token_upper, "buy")
+        ).fillna(0.0)
+        pnl_all_df["Total Sells (USD)"] = pnl_all_df["wallet_id"].map(
+            total_usd_by_wallet(combined_df, token_upper, "sell")
+        ).fillna(0.0)
 
 
     # Number of Trades
@@ -974,11 +836,14 @@ with tab2:
             return 'color: #74fe64; font-weight: bold;'
         return ''
 
-    styled_df = display_df.style.applymap(highlight_sniper, subset=["Is Sniper"])
-    st.dataframe(styled_df, use_container_width=True, hide_index=True)
+    with span("render: top traders table"):
+        styled_df = display_df.style.applymap(highlight_sniper, subset=["Is Sniper"])
+        st.dataframe(styled_df, use_container_width=True, hide_index=True)
 
 
 
 
 with tab3:
         st.header("MORE INSIGHTS INCOMING, STAY TUNED!")
+
+perf_panel()
@@ -0,0 +1,172 @@
+"""Per-stage timing spans for page renders, a hidden debug panel and a rolling metrics file.
+
+Wrap a stage in `with span("name"):` (or `@timed("name")`). Spans are
+collected per rerun of the page's script thread (worker threads join it via
+`bind`); `perf_panel()` at the end of a page appends them to the metrics
+file and, when the page is opened with `?debug=perf`, shows this rerun's
+timings next to p50/p95 per stage. Pages that end early call `stop_page()`
+instead of `st.stop()` so those reruns are recorded too.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+METRICS_FILE = os.getenv("PERF_METRICS_FILE", ".perf_metrics.jsonl")
+METRICS_MAX_BYTES = int(os.getenv("PERF_METRICS_MAX_BYTES", str(5 * 1024 * 1024)))
+DEBUG_PARAM = "debug"
+
+_local = threading.local()
+_file_lock = threading.Lock()
+
+
+class _Run:
+    """Spans and Mongo commands of one page rerun"""
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.spans = []
+        self.commands = []
+
+
+def start_run(page):
+    """Begin collecting spans for one rerun of `page`"""
+    _local.run = _Run(page)
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+def current_page():
+    run = current_run()
+    return run.page if run is not None else None
+
+
+def bind(func):
+    """Wrap `func` so it records into the caller's rerun when run on another thread"""
+    run = current_run()
+
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        previous = current_run()
+        _local.run = run
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.run = previous
+    return inner
+
+
+def record(name, seconds):
+    """Add an externally measured stage time to the current rerun"""
+    run = current_run()
+    if run is not None:
+        run.spans.append((name, seconds))
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of `span`"""
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def flush(path=METRICS_FILE):
+    """Append this rerun's spans to the metrics file, keeping it under METRICS_MAX_BYTES"""
+    run = current_run()
+    if run is None or not run.spans:
+        return
+    now = time.time()
+    lines = "".join(
+        json.dumps({"ts": now, "page": run.page, "stage": name, "s": round(secs, 6)}) + "\n"
+        for name, secs in run.spans
+    )
+    run.spans = []
+    try:
+        with _file_lock:
+            with open(path, "a") as f:
+                f.write(lines)
+            if os.path.getsize(path) > METRICS_MAX_BYTES:
+                # roll: keep the newer half
+                with open(path) as f:
+                    kept = f.readlines()
+                kept = kept[len(kept) // 2:]
+                tmp = path + ".tmp"
+                with open(tmp, "w") as f:
+                    f.writelines(kept)
+                os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not write perf metrics: {e}")
+
+
+def stage_percentiles(path=METRICS_FILE, page=None):
+    """count, p50 and p95 seconds per (page, stage) from the metrics file"""
+    try:
+        metrics = pd.read_json(path, lines=True)
+    except (ValueError, OSError):
+        return pd.DataFrame(columns=["page", "stage", "count", "p50 (s)", "p95 (s)"])
+    if page is not None:
+        metrics = metrics[metrics["page"] == page]
+    grouped = metrics.groupby(["page", "stage"], sort=False)["s"]
+    return pd.DataFrame({
+        "count": grouped.size(),
+        "p50 (s)": grouped.quantile(0.5).round(4),
+        "p95 (s)": grouped.quantile(0.95).round(4),
+    }).reset_index()
+
+
+def perf_panel():
+    """Flush this rerun's spans; render them with the rolling percentiles when ?debug=perf"""
+    run = current_run()
+    if run is None:
+        return
+    spans, commands = list(run.spans), list(run.commands)
+    elapsed = time.perf_counter() - run.started
+    flush()
+    if st.query_params.get(DEBUG_PARAM) != "perf":
+        return
+    with st.expander("⏱ Performance", expanded=True):
+        this_run = pd.DataFrame(spans, columns=["stage", "seconds"])
+        st.markdown(f"**This rerun** — {elapsed:.3f}s to this point; spans inside cached functions only show on a cache miss")
+        st.dataframe(this_run.round(4), hide_index=True, use_container_width=True)
+        st.markdown("**Rolling p50 / p95**")
+        st.dataframe(stage_percentiles(page=run.page), hide_index=True, use_container_width=True)
+        if commands:
+            from mongo_telemetry import command_totals
+            totals = command_totals(commands)
+            st.markdown(
+                f"**MongoDB commands** — {len(commands)} calls, {totals['ms'].sum():.1f} ms, "
+                f"{totals['docs'].sum():,} docs, {totals['bytes'].sum() / 1e6:.2f} MB"
+            )
+            st.dataframe(totals, hide_index=True, use_container_width=True)
+        from result_cache import MB, cache_stats, shared_budget
+        stats = cache_stats()
+        if stats:
+            st.markdown(f"**Result caches** — {shared_budget.bytes / MB:.1f} of {shared_budget.max_bytes / MB:.0f} MB shared budget")
+            st.dataframe(pd.DataFrame(stats), hide_index=True, use_container_width=True)
+
+
+def stop_page():
+    """`st.stop()` for an early exit, after `perf_panel()` so the rerun's spans are still flushed and shown"""
+    perf_panel()
+    st.stop()
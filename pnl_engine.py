@@ -0,0 +1,296 @@
+"""FIFO lot-matching engine for realized and unrealized wallet PnL."""
+import multiprocessing
+import os
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from wallet_ids import known_wallets
+
+# Lot matching is a per-trade Python loop; past PNL_PARALLEL_MIN_ROWS trades
+# it is split across PNL_WORKERS processes. PNL_WORKERS=1 keeps it serial.
+PNL_WORKERS = int(os.getenv("PNL_WORKERS", str(os.cpu_count() or 1)))
+PNL_PARALLEL_MIN_ROWS = int(os.getenv("PNL_PARALLEL_MIN_ROWS", "200000"))
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def match_lots(wallet_ids, is_buy, amount, cost, sell_net, price, n_wallets,
+               initial_realized=None, keep_lots=False):
+    """Match sells against earlier buys FIFO, one wallet at a time.
+
+    All inputs are per-trade arrays sorted by (wallet, time); `wallet_ids` are
+    dense codes in 0..n_wallets-1. For a buy, `amount` is the tokens received
+    and `cost` the tokens paid for; for a sell, `amount` is the tokens taken
+    from the wallet and `sell_net` the tokens actually sold.
+
+    Open lots live in flat arrays with a head pointer per wallet: a sell
+    advances the head past the lots it empties and shrinks the lot it stops in
+    place. Returns (realized, remaining) arrays indexed by wallet id.
+
+    A lot with a zero or negative amount has nothing to give and is skipped
+    when a sell reaches it. This is the one place results differ from the
+    old per-wallet deque loops: those divided by the lot's amount, so a zero
+    lot raised ZeroDivisionError (or gave NaN with NumPy floats) and a
+    negative one was matched as if it were a buy.
+
+    To resume from saved state, pass the saved open lots as leading buys and
+    the saved realized PnL as `initial_realized`. With `keep_lots` the open
+    lots are returned too, as a (wallet_ids, amount, cost, price) tuple.
+    """
+    wallet_ids = np.asarray(wallet_ids).tolist()
+    is_buy = np.asarray(is_buy, dtype=bool).tolist()
+    amount = np.asarray(amount, dtype=float).tolist()
+    cost = np.asarray(cost, dtype=float).tolist()
+    sell_net = np.asarray(sell_net, dtype=float).tolist()
+    price = np.asarray(price, dtype=float).tolist()
+
+    lot_amount = array("d")
+    lot_cost = array("d")
+    lot_price = array("d")
+    realized = np.zeros(n_wallets)
+    remaining = np.zeros(n_wallets)
+    start_pnl = [0.0] * n_wallets if initial_realized is None else np.asarray(initial_realized, dtype=float).tolist()
+    open_lots = []
+
+    current = None
+    head = 0
+    pnl = 0.0
+    for i, wallet in enumerate(wallet_ids):
+        if wallet != current:
+            if current is not None:
+                realized[current] = pnl
+                remaining[current] = sum(lot_amount[head:])
+                open_lots.append((current, head, len(lot_amount)))
+            current = wallet
+            head = len(lot_amount)
+            pnl = start_pnl[wallet]
+
+        if is_buy[i]:
+            lot_amount.append(amount[i])
+            lot_cost.append(cost[i])
+            lot_price.append(price[i])
+            continue
+
+        from_wallet = amount[i]
+        proceeds = sell_net[i] * price[i]
+        to_match = from_wallet
+        while to_match > 0 and head < len(lot_amount):
+            lot = lot_amount[head]
+            if lot <= 0:
+                # an empty lot has nothing to give; skip it (the deque loops divided by zero here)
+                head += 1
+                continue
+            matched = min(to_match, lot)
+            matched_paid = lot_cost[head] * (matched / lot)
+            pnl += proceeds * (matched / from_wallet) - matched_paid * lot_price[head]
+            to_match -= matched
+            leftover = lot - matched
+            if leftover > 0:
+                lot_cost[head] = lot_cost[head] * (leftover / lot)
+                lot_amount[head] = leftover
+            else:
+                head += 1
+
+    if current is not None:
+        realized[current] = pnl
+        remaining[current] = sum(lot_amount[head:])
+        open_lots.append((current, head, len(lot_amount)))
+    if not keep_lots:
+        return realized, remaining
+
+    keep = np.zeros(len(lot_amount), dtype=bool)
+    lot_wallet = np.empty(len(lot_amount), dtype=np.int64)
+    for wallet, start, end in open_lots:
+        keep[start:end] = True
+        lot_wallet[start:end] = wallet
+    lots = (
+        lot_wallet[keep],
+        np.frombuffer(lot_amount, dtype=float)[keep],
+        np.frombuffer(lot_cost, dtype=float)[keep],
+        np.frombuffer(lot_price, dtype=float)[keep],
+    )
+    return realized, remaining, lots
+
+
+def _get_pool(workers):
+    """The process-wide worker pool, started on first use and kept for later calls"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn, not fork: the app process has server and cache threads running
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next call starts a fresh one"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if pool is not None and _pool is pool:
+            _pool, _pool_workers = None, None
+
+
+def match_lots_sharded(wallet_ids, is_buy, amount, cost, sell_net, price, n_wallets,
+                       initial_realized=None, keep_lots=False, workers=None):
+    """`match_lots` with the wallet groups sharded across a process pool.
+
+    Groups never depend on each other, so each group's rows go whole to the
+    shard its hashed id picks. Shards are sent as plain numpy arrays with
+    their own dense ids and matched in parallel, and their results are
+    scattered back by wallet id, so the output is the same as `match_lots`'.
+    Runs serially for fewer than PNL_PARALLEL_MIN_ROWS trades, for one
+    worker, or if the pool cannot be used.
+    """
+    workers = PNL_WORKERS if workers is None else workers
+    wallet_ids = np.asarray(wallet_ids)
+    serial = (wallet_ids, is_buy, amount, cost, sell_net, price, n_wallets, initial_realized, keep_lots)
+    if workers <= 1 or len(wallet_ids) < PNL_PARALLEL_MIN_ROWS:
+        return match_lots(*serial)
+
+    columns = [np.asarray(col, dtype=dtype) for col, dtype in
+               [(is_buy, bool), (amount, float), (cost, float), (sell_net, float), (price, float)]]
+    start_pnl = np.zeros(n_wallets) if initial_realized is None else np.asarray(initial_realized, dtype=float)
+    shard_of = pd.util.hash_array(wallet_ids.astype(np.int64)) % np.uint64(workers)
+    shards = []
+    for shard in range(workers):
+        rows = shard_of == shard
+        if not rows.any():
+            continue
+        # rows stay in (wallet, time) order; wallets get shard-local dense ids
+        ids, local_ids = np.unique(wallet_ids[rows], return_inverse=True)
+        shards.append((ids, [local_ids] + [col[rows] for col in columns] + [len(ids), start_pnl[ids], keep_lots]))
+
+    pool = None
+    try:
+        pool = _get_pool(workers)
+        results = list(pool.map(match_lots, *zip(*(args for _, args in shards))))
+    except (BrokenProcessPool, OSError) as e:
+        print(f"PnL process pool unavailable, matching lots serially: {e}")
+        _discard_pool(pool)
+        return match_lots(*serial)
+
+    realized = np.zeros(n_wallets)
+    remaining = np.zeros(n_wallets)
+    lot_parts = []
+    for (ids, _), result in zip(shards, results):
+        realized[ids] = result[0]
+        remaining[ids] = result[1]
+        if keep_lots:
+            lot_wallet, lot_amount, lot_cost, lot_price = result[2]
+            lot_parts.append((ids[lot_wallet], lot_amount, lot_cost, lot_price))
+    if not keep_lots:
+        return realized, remaining
+
+    lot_wallet, lot_amount, lot_cost, lot_price = (np.concatenate(part) for part in zip(*lot_parts))
+    # back to wallet order, each wallet's lots still oldest first
+    order = np.argsort(lot_wallet, kind="stable")
+    return realized, remaining, (lot_wallet[order], lot_amount[order], lot_cost[order], lot_price[order])
+
+
+def numeric_column(df, col):
+    """Float values of `col`, or zeros when the column is missing."""
+    if col in df.columns:
+        return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+    return np.zeros(len(df))
+
+
+def latest_prices(df, time_col="timestamp", price_col="genesis_usdc_price", by="token_name"):
+    """Price of the most recent swap per `by` value."""
+    if df.empty:
+        return pd.Series(dtype=float)
+    latest = df.loc[df.groupby(by, observed=True)[time_col].idxmax().dropna()]
+    return latest.set_index(by)[price_col].astype(float)
+
+
+def fifo_pnl(trades, by, buy_amount_col, buy_cost_col, sell_amount_col, sell_net_col,
+             price_col="genesis_usdc_price", time_col="timestamp", latest_price=None):
+    """Realized PnL, remaining tokens and unrealized PnL for every wallet group.
+
+    `trades` holds the buys and sells to match; rows are sorted by `by` +
+    `time_col` here. `latest_price` maps token_name to its current price (see
+    `latest_prices`). Returns one row per group indexed by `by`.
+    """
+    by = list(by)
+    columns = ["realized", "remaining", "unrealized"]
+    trades = known_wallets(trades.dropna(subset=by))
+    if trades.empty:
+        return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_tuples([], names=by), dtype=float)
+
+    trades = trades.sort_values(by=by + [time_col], kind="mergesort")
+    grouped = trades.groupby(by, sort=False, observed=True)
+    wallet_ids = grouped.ngroup().to_numpy()
+    is_buy = (trades["swapType"] == "buy").to_numpy()
+
+    amount = np.where(is_buy, numeric_column(trades, buy_amount_col), numeric_column(trades, sell_amount_col))
+    cost = numeric_column(trades, buy_cost_col)
+    sell_net = numeric_column(trades, sell_net_col)
+    price = numeric_column(trades, price_col)
+
+    realized, remaining = match_lots_sharded(
+        wallet_ids, is_buy, amount, cost, sell_net, price, grouped.ngroups
+    )
+
+    keys = trades[by].drop_duplicates()
+    result = pd.DataFrame({"realized": realized, "remaining": remaining}, index=pd.MultiIndex.from_frame(keys))
+    if latest_price is None:
+        current_price = 0.0
+    else:
+        current_price = result.index.get_level_values("token_name").map(latest_price).to_numpy(dtype=float)
+    result["unrealized"] = result["remaining"] * current_price
+    return result
+
+
+def wallet_trade_stats(trades, by, time_col="timestampReadable", price_col="genesis_usdc_price"):
+    """Trade counts, first/last trade times, average prices and fee totals per group.
+
+    Computed with one grouped pass over `trades`; returns one row per group
+    indexed by `by`, in order of first appearance.
+    """
+    by = list(by)
+    trades = known_wallets(trades.dropna(subset=by))
+    keys = pd.MultiIndex.from_frame(trades[by].drop_duplicates())
+    buys = trades[trades["swapType"] == "buy"].groupby(by, sort=False, observed=True)
+    sells = trades[trades["swapType"] == "sell"].groupby(by, sort=False, observed=True)
+    grouped = trades.groupby(by, sort=False, observed=True)
+
+    stats = pd.concat({
+        "buy_count": buys.size(),
+        "sell_count": sells.size(),
+        "first_buy_time": buys[time_col].min(),
+        "last_sell_time": sells[time_col].max(),
+        "avg_buy_price": buys[price_col].mean(),
+        "avg_sell_price": sells[price_col].mean(),
+        "total_tax": grouped["Tax_1pct"].sum(),
+        "total_fees": grouped["transactionFee"].sum(),
+    }, axis=1).reindex(keys)
+    stats[["buy_count", "sell_count"]] = stats[["buy_count", "sell_count"]].fillna(0).astype(int)
+    return stats
+
+
+def swap_pnl(trades, by, prefix="", time_col="timestampReadable", latest_price=None):
+    """`wallet_trade_stats` joined with `fifo_pnl` over every swap in `trades`, as the token page computes them.
+
+    Amounts come from the `{prefix}OUT_*` / `{prefix}IN_*` columns (the token
+    page keeps its token's prefix, the shared frames strip it). Unlike
+    `PnLStateStore`, no unpriced or empty swap is left out. `latest_price`
+    defaults to the latest price in `trades` itself.
+    """
+    if latest_price is None:
+        latest_price = latest_prices(trades, time_col=time_col)
+    fifo = fifo_pnl(
+        trades, by,
+        buy_amount_col=f"{prefix}OUT_AfterTax", buy_cost_col=f"{prefix}OUT_BeforeTax",
+        sell_amount_col=f"{prefix}IN_BeforeTax", sell_net_col=f"{prefix}IN_AfterTax",
+        time_col=time_col, latest_price=latest_price,
+    )
+    return wallet_trade_stats(trades, by, time_col=time_col).join(fifo)
@@ -0,0 +1,330 @@
+"""Incremental per-(wallet, token) PnL state for the global sniper page."""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from pnl_engine import match_lots_sharded, numeric_column
+from swap_data import SETTLE_BLOCKS
+from wallet_ids import known_wallets
+
+KEY = ["wallet_id", "token_name"]
+STAT_COLUMNS = [
+    "realized", "remaining", "buy_count", "sell_count", "first_buy_time", "last_sell_time",
+    "buy_price_sum", "buy_price_n", "sell_price_sum", "sell_price_n", "total_tax", "total_fees",
+]
+ADDITIVE_COLUMNS = [
+    "buy_count", "sell_count", "buy_price_sum", "buy_price_n",
+    "sell_price_sum", "sell_price_n", "total_tax", "total_fees",
+]
+LOT_COLUMNS = ["amount", "cost", "price"]
+# The columns of `PnLStateStore.wallet_pnl`
+PNL_COLUMNS = [
+    "realized", "remaining", "unrealized", "buy_count", "sell_count", "first_buy_time", "last_sell_time",
+    "avg_buy_price", "avg_sell_price", "total_tax", "total_fees",
+]
+# A token's tip block counts as settled once no newer block has arrived for this long
+SETTLE_SECONDS = float(os.getenv("PNL_SETTLE_SECONDS", "60"))
+
+
+def matchable_trades(swaps):
+    """Swaps the FIFO matcher uses: priced buys with a paid amount, priced sells with a net amount"""
+    price = numeric_column(swaps, 'genesis_usdc_price')
+    is_buy = (swaps['swapType'] == 'buy').to_numpy()
+    is_sell = (swaps['swapType'] == 'sell').to_numpy()
+    keep = ~(price <= 0) & (
+        (is_buy & ~(numeric_column(swaps, 'OUT_BeforeTax') <= 0)) |
+        (is_sell & ~(numeric_column(swaps, 'IN_AfterTax') <= 0))
+    )
+    return swaps[keep]
+
+
+def _blank(col, n):
+    """`n` values of a stat column for wallets with no trades: zeros, or NaT for times"""
+    if col.endswith("_time"):
+        return np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    return np.zeros(n)
+
+
+def _grown(array, size, fill):
+    """`array` with room for at least `size` entries, doubling so repeated growth stays amortized"""
+    if len(array) >= size:
+        return array
+    grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _per_row(tokens, values):
+    """`values[token]` for every row's token as floats, NaN for tokens without one"""
+    return tokens.map(values).astype(float).to_numpy(na_value=np.nan)
+
+
+def _ranges(starts, ends):
+    """Positions covered by the [start, end) ranges, in order"""
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+class _TokenState:
+    """One token's PnL state in arrays indexed by wallet_id.
+
+    Every stat column is a dense array over the wallet dictionary's IDs, and
+    each wallet's open lots are the range [lot_start, lot_end) of flat lot
+    buffers. A fold only appends the affected wallets' new lots and moves
+    their ranges, so its cost follows the rows folded, not the state size.
+    The ranges left behind are dropped by `_compact` once they outnumber the
+    live lots.
+    """
+
+    def __init__(self):
+        self.stats = {col: _blank(col, 0) for col in STAT_COLUMNS}
+        self.traded = np.zeros(0, dtype=bool)
+        self.lot_start = np.zeros(0, dtype=np.int64)
+        self.lot_end = np.zeros(0, dtype=np.int64)
+        self.lots = {col: np.zeros(0) for col in LOT_COLUMNS}
+        self.n_lots = 0
+        self.dead_lots = 0
+
+    def _reserve(self, n_wallets):
+        for col, values in self.stats.items():
+            self.stats[col] = _grown(values, n_wallets, _blank(col, 1)[0])
+        self.traded = _grown(self.traded, n_wallets, False)
+        self.lot_start = _grown(self.lot_start, n_wallets, 0)
+        self.lot_end = _grown(self.lot_end, n_wallets, 0)
+
+    def fold(self, swaps):
+        self._reserve(int(swaps["wallet_id"].max()) + 1)
+        self._fold_stats(swaps)
+        self._fold_lots(matchable_trades(swaps))
+
+    def _fold_stats(self, swaps):
+        buys = swaps[swaps['swapType'] == 'buy'].groupby("wallet_id")
+        sells = swaps[swaps['swapType'] == 'sell'].groupby("wallet_id")
+        grouped = swaps.groupby("wallet_id")
+        delta = pd.concat({
+            "buy_count": buys.size(),
+            "sell_count": sells.size(),
+            "first_buy_time": buys['timestampReadable'].min(),
+            "last_sell_time": sells['timestampReadable'].max(),
+            "buy_price_sum": buys['genesis_usdc_price'].sum(),
+            "buy_price_n": buys['genesis_usdc_price'].count(),
+            "sell_price_sum": sells['genesis_usdc_price'].sum(),
+            "sell_price_n": sells['genesis_usdc_price'].count(),
+            "total_tax": grouped['Tax_1pct'].sum(),
+            "total_fees": grouped['transactionFee'].sum(),
+        }, axis=1)
+
+        ids = delta.index.to_numpy()
+        stats = self.stats
+        for col in ADDITIVE_COLUMNS:
+            stats[col][ids] += delta[col].fillna(0).to_numpy(dtype=float)
+        stats["first_buy_time"][ids] = np.fmin(stats["first_buy_time"][ids], delta["first_buy_time"].to_numpy(dtype="datetime64[ns]"))
+        stats["last_sell_time"][ids] = np.fmax(stats["last_sell_time"][ids], delta["last_sell_time"].to_numpy(dtype="datetime64[ns]"))
+        self.traded[ids] = True
+
+    def _fold_lots(self, trades):
+        if trades.empty:
+            return
+        trades = trades.sort_values(by=["wallet_id", "timestamp"], kind="mergesort")
+        trade_wallet = trades["wallet_id"].to_numpy()
+        affected = np.unique(trade_wallet)
+        starts, ends = self.lot_start[affected], self.lot_end[affected]
+        carried = _ranges(starts, ends)
+
+        # Saved open lots go first as plain buys, then the new trades in time order
+        is_buy = (trades['swapType'] == 'buy').to_numpy()
+        n_carried = len(carried)
+        wallet = np.concatenate([np.repeat(affected, ends - starts), trade_wallet])
+        order = np.argsort(wallet, kind="stable")
+        columns = {
+            "is_buy": np.concatenate([np.ones(n_carried, dtype=bool), is_buy]),
+            "amount": np.concatenate([self.lots["amount"][carried], np.where(
+                is_buy, numeric_column(trades, 'OUT_AfterTax'), numeric_column(trades, 'IN_BeforeTax'))]),
+            "cost": np.concatenate([self.lots["cost"][carried], numeric_column(trades, 'OUT_BeforeTax')]),
+            "sell_net": np.concatenate([np.zeros(n_carried), numeric_column(trades, 'IN_AfterTax')]),
+            "price": np.concatenate([self.lots["price"][carried], numeric_column(trades, 'genesis_usdc_price')]),
+        }
+        columns = {name: values[order] for name, values in columns.items()}
+
+        realized, remaining, (lot_wallet, *new_lots) = match_lots_sharded(
+            np.searchsorted(affected, wallet[order]), columns["is_buy"], columns["amount"], columns["cost"],
+            columns["sell_net"], columns["price"], len(affected),
+            initial_realized=self.stats["realized"][affected], keep_lots=True,
+        )
+        self.stats["realized"][affected] = realized
+        self.stats["remaining"][affected] = remaining
+
+        # The new open lots come back grouped by wallet; append them and point each wallet at its range
+        end = self.n_lots + len(lot_wallet)
+        groups = np.arange(len(affected))
+        for col, values in zip(LOT_COLUMNS, new_lots):
+            self.lots[col] = _grown(self.lots[col], end, 0.0)
+            self.lots[col][self.n_lots:end] = values
+        self.lot_start[affected] = self.n_lots + np.searchsorted(lot_wallet, groups, side="left")
+        self.lot_end[affected] = self.n_lots + np.searchsorted(lot_wallet, groups, side="right")
+        self.n_lots = end
+        self.dead_lots += n_carried
+        if self.dead_lots > self.n_lots - self.dead_lots:
+            self._compact()
+
+    def _compact(self):
+        """Move every wallet's live lots to the front of the buffers"""
+        wallets = np.flatnonzero(self.lot_end > self.lot_start)
+        starts, ends = self.lot_start[wallets], self.lot_end[wallets]
+        live = _ranges(starts, ends)
+        self.lots = {col: values[live] for col, values in self.lots.items()}
+        lengths = ends - starts
+        self.lot_start[:] = 0
+        self.lot_end[:] = 0
+        self.lot_start[wallets] = np.cumsum(lengths) - lengths
+        self.lot_end[wallets] = np.cumsum(lengths)
+        self.n_lots = len(live)
+        self.dead_lots = 0
+
+    def traded_wallets(self):
+        return np.flatnonzero(self.traded)
+
+    def wallet_stats(self, wallet_ids):
+        """{stat column: values} for `wallet_ids`; wallets that never traded the token get `_blank` values"""
+        wallet_ids = np.asarray(wallet_ids, dtype=np.int64)
+        known = (wallet_ids >= 0) & (wallet_ids < len(self.traded))
+        known[known] = self.traded[wallet_ids[known]]
+        stats = {}
+        for col, values in self.stats.items():
+            stats[col] = _blank(col, len(wallet_ids))
+            stats[col][known] = values[wallet_ids[known]]
+        return stats
+
+
+class PnLStateStore:
+    """Running PnL state per (wallet, token), folded forward one block range at a time.
+
+    Keeps every wallet's open FIFO lots, realized PnL, trade counts, first and
+    last trade times, price sums and fee/tax totals, plus the last processed
+    blockNumber per token. `refresh` only folds swaps past that checkpoint, so
+    its cost follows new activity instead of the token's whole history. Swaps
+    must be folded in block order, which is how the collections are appended.
+    """
+
+    def __init__(self):
+        self.checkpoints = {}
+        self.latest = {}
+        self.tokens = {}
+        self.refreshed_at = None
+        self._tips = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, swaps, max_age=0):
+        """Fold in the rows of `swaps` past each token's checkpoint; skipped if refreshed within `max_age` seconds.
+
+        `swaps` is the cleaned, wallet-encoded frame the page already loaded,
+        so a refresh reads nothing from MongoDB. Rows in the newest
+        SETTLE_BLOCKS blocks of a token are held back, since swaps for them
+        may still be written; they are folded once later blocks arrive, or
+        once the tip has not moved for SETTLE_SECONDS.
+
+        The rows to fold are picked in one pass over `swaps`, comparing each
+        row's block with its token's checkpoint and settled tip.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.refreshed_at is not None and now - self.refreshed_at < max_age:
+                return False
+            tokens = swaps["token_name"]
+            blocks = swaps["blockNumber"]
+            settled, after = {}, {}
+            for token, tip in blocks.groupby(tokens, observed=True).max().dropna().items():
+                tip = int(tip)
+                if self._tips.get(token, (None,))[0] != tip:
+                    self._tips[token] = (tip, now)
+                through = tip if now - self._tips[token][1] >= SETTLE_SECONDS else tip - SETTLE_BLOCKS
+                checkpoint = self.checkpoints.get(token)
+                if checkpoint is not None and through <= checkpoint:
+                    continue
+                settled[token] = through
+                # a token's first fold also takes its rows without a block
+                after[token] = -np.inf if checkpoint is None else checkpoint
+            if settled:
+                row_blocks = blocks.to_numpy(dtype=float, na_value=np.nan)
+                row_after = _per_row(tokens, after)
+                fresh = ((row_blocks > row_after) & (row_blocks <= _per_row(tokens, settled))) | (
+                    np.isneginf(row_after) & np.isnan(row_blocks)
+                )
+                self.fold(swaps[fresh])
+                self.checkpoints.update(settled)
+            self.refreshed_at = now
+            return True
+
+    def pending(self, swaps, pairs):
+        """Whether each of `pairs` has rows of `swaps` that `refresh` has not folded yet, in `pairs` order.
+
+        Those pairs' stats lag behind `swaps` until their blocks settle; a
+        token never refreshed counts as pending for every pair.
+        """
+        with self._lock:
+            checkpoints = dict(self.checkpoints)
+        row_blocks = swaps["blockNumber"].to_numpy(dtype=float, na_value=np.nan)
+        row_checkpoints = _per_row(swaps["token_name"], checkpoints)
+        held = swaps.loc[(row_blocks > row_checkpoints) | np.isnan(row_checkpoints), KEY].drop_duplicates()
+        held_pairs = pd.MultiIndex.from_frame(held.astype({"token_name": object}))
+        return pd.MultiIndex.from_frame(pairs[KEY].astype({"token_name": object})).isin(held_pairs)
+
+    def fold(self, swaps):
+        """Fold cleaned, wallet-encoded swaps that all come after the ones already folded"""
+        swaps = swaps.dropna(subset=KEY)
+        if swaps.empty:
+            return
+        # swaps without a maker still move the latest price, but belong to no wallet
+        for token, rows in known_wallets(swaps).groupby("token_name", observed=True):
+            self.tokens.setdefault(token, _TokenState()).fold(rows)
+        self.latest = self._fold_latest(swaps)
+
+    def _fold_latest(self, swaps):
+        latest = dict(self.latest)
+        newest = swaps.loc[swaps.groupby('token_name', observed=True)['timestamp'].idxmax().dropna()]
+        for row in newest.itertuples():
+            if row.token_name not in latest or row.timestamp > latest[row.token_name][0]:
+                latest[row.token_name] = (row.timestamp, float(row.genesis_usdc_price))
+        return latest
+
+    def _wallets(self, pairs=None):
+        """STAT_COLUMNS per (wallet_id, token_name): every pair that traded, or the given pairs in order"""
+        if pairs is None:
+            pairs = pd.concat([
+                pd.DataFrame({"wallet_id": state.traded_wallets(), "token_name": token})
+                for token, state in self.tokens.items()
+            ] or [pd.DataFrame({"wallet_id": [], "token_name": []})], ignore_index=True)
+            pairs = pairs.sort_values(KEY, kind="mergesort")
+        wallet_ids = pairs["wallet_id"].to_numpy(dtype=np.int64)
+        tokens = pairs["token_name"].astype(object).to_numpy()
+        stats = {col: _blank(col, len(pairs)) for col in STAT_COLUMNS}
+        for token, state in self.tokens.items():
+            rows = tokens == token
+            if rows.any():
+                for col, values in state.wallet_stats(wallet_ids[rows]).items():
+                    stats[col][rows] = values
+        return pd.DataFrame(stats, index=pd.MultiIndex.from_frame(pairs[KEY]))
+
+    def wallet_pnl(self, pairs=None):
+        """PnL and trade stats per (wallet_id, token_name), optionally for just the given pairs"""
+        wallets = self._wallets(pairs)
+        prices = {token: price for token, (_, price) in self.latest.items()}
+        current_price = wallets.index.get_level_values("token_name").map(prices).to_numpy(dtype=float)
+        remaining = wallets["remaining"].astype(float).fillna(0.0)
+        return pd.DataFrame({
+            "realized": wallets["realized"].astype(float).fillna(0.0),
+            "remaining": remaining,
+            "unrealized": remaining * current_price,
+            "buy_count": wallets["buy_count"].fillna(0).astype(int),
+            "sell_count": wallets["sell_count"].fillna(0).astype(int),
+            "first_buy_time": wallets["first_buy_time"],
+            "last_sell_time": wallets["last_sell_time"],
+            "avg_buy_price": wallets["buy_price_sum"].astype(float) / wallets["buy_price_n"].replace(0, np.nan),
+            "avg_sell_price": wallets["sell_price_sum"].astype(float) / wallets["sell_price_n"].replace(0, np.nan),
+            "total_tax": wallets["total_tax"].astype(float).fillna(0.0),
+            "total_fees": wallets["total_fees"].astype(float).fillna(0.0),
+        }, index=wallets.index)
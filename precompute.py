@@ -0,0 +1,222 @@
+"""Precompute sniper buys and PnL into MongoDB, off the pages' request path.
+
+    python precompute.py --once                                  # one run, URI from secrets / .env
+    python precompute.py --interval 300                          # a run every 5 minutes
+    python precompute.py --uri mongodb://localhost:27017 --once  # local mongod
+
+Each run loads every swap collection, detects snipers and computes PnL
+the way each page does, then writes:
+
+    precomputed_sniper_buys      the token page's sniper buys, one document per buy
+    precomputed_wallet_pnl       the token page's PnL per (maker, token) that traded
+    precomputed_sniper_summary   the global page's sniper PnL table
+    precompute_runs              run id, times, source block per token, row counts
+
+The global page detects snipers on cleaned swaps with Personas launch
+blocks, the token page on every swap with swap_progress genesis blocks, so
+the two are computed separately. Every document carries its run_id, run_at
+and its token's source block. A run is recorded in precompute_runs only once
+all its documents are written. The run before it keeps its documents until
+the next run is recorded, so a reader that looked up `latest_run` just
+before a new run finished can still read the tables it found there.
+
+The pages read these tables when SNIPER_SOURCE is "precomputed" (the
+default) and a run exists, and compute live otherwise.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from bson import ObjectId
+from pymongo import ASCENDING, MongoClient
+
+from pnl_engine import swap_pnl
+from pnl_state import PnLStateStore
+from sniper_engine import find_sniper_buys, quick_sell_snipers
+from swap_data import SWAP_DB, SWAP_COLLECTIONS, clean_swaps, compact_swaps, load_collection, load_collections
+from wallet_ids import decode_makers, encode_makers, known_wallets
+
+# "live" makes the pages compute snipers and PnL per process even when a run exists
+SNIPER_SOURCE = os.getenv("SNIPER_SOURCE", "precomputed")
+SNIPER_BUYS = "precomputed_sniper_buys"
+WALLET_PNL = "precomputed_wallet_pnl"
+SNIPER_SUMMARY = "precomputed_sniper_summary"
+RUNS = "precompute_runs"
+RUN_HISTORY = timedelta(days=7)
+BATCH_SIZE = 10_000
+
+
+def load_swaps(db, collections=SWAP_COLLECTIONS):
+    """Every swap, compacted and wallet-encoded but not cleaned (the token page keeps unpriced swaps), or None"""
+    frames, timings = load_collections(collections, lambda col_name: load_collection(db, col_name))
+    print("Swap collection load times:", ", ".join(f"{col} {secs:.2f}s" for col, secs in timings.items()))
+    if not frames:
+        return None
+    return encode_makers(compact_swaps(pd.concat(frames, ignore_index=True)))
+
+
+def launch_blocks(db, swaps):
+    """Launch block per token from Personas, else each token's first priced swap block, as on the global page"""
+    try:
+        personas = pd.DataFrame(list(db["Personas"].find({}, {"symbol": 1, "blockNumber": 1})))
+        if not personas.empty and "symbol" in personas.columns and "blockNumber" in personas.columns:
+            return dict(zip(personas["symbol"], personas["blockNumber"]))
+    except Exception as e:
+        print(f"Error fetching launch info: {e}")
+    print("Warning: Could not fetch launch info from Personas collection, using fallback method")
+    swaps = clean_swaps(swaps)
+    return swaps.sort_values(by="blockNumber").groupby("token_name", observed=True)["blockNumber"].first().to_dict()
+
+
+def genesis_blocks(db):
+    """Launch block per token from swap_progress, as on the token page"""
+    try:
+        progress = pd.DataFrame(list(db["swap_progress"].find({}, {"token_symbol": 1, "genesis_block": 1})))
+        if not progress.empty and "token_symbol" in progress and "genesis_block" in progress:
+            return dict(zip(progress["token_symbol"], progress["genesis_block"]))
+    except Exception as e:
+        print(f"Error loading launch blocks: {e}")
+    return {}
+
+
+def traded_usd(swaps):
+    """USD bought and sold per (wallet_id, token_name), as the token page totals them"""
+    swaps = known_wallets(swaps)
+    price = swaps["genesis_usdc_price"].astype(float)
+    keys = [swaps["wallet_id"], swaps["token_name"]]
+    return pd.DataFrame({
+        "buy_usd": (price * swaps["OUT_AfterTax"]).where(swaps["swapType"] == "buy").groupby(keys, observed=True).sum(),
+        "sell_usd": (price * swaps["IN_AfterTax"]).where(swaps["swapType"] == "sell").groupby(keys, observed=True).sum(),
+    })
+
+
+def compute(swaps, token_launch_blocks, page_launch_blocks):
+    """(token page sniper buys, token page PnL of every (wallet, token), global page sniper PnL), keyed by maker address"""
+    cleaned = clean_swaps(swaps)
+    global_buys = quick_sell_snipers(find_sniper_buys(cleaned, token_launch_blocks), cleaned)
+    global_state = PnLStateStore()
+    global_state.fold(cleaned)
+    summary = global_state.wallet_pnl(global_buys[["wallet_id", "token_name"]].drop_duplicates())
+
+    # the token page reads its collection as it is, unpriced and fee-less swaps
+    # included, and runs the plain FIFO over all of them rather than PnLStateStore
+    sniper_buys = quick_sell_snipers(find_sniper_buys(swaps, page_launch_blocks), swaps)
+    wallet_pnl = swap_pnl(swaps, ["wallet_id", "token_name"])
+    wallet_pnl = wallet_pnl.join(traded_usd(swaps).reindex(wallet_pnl.index).fillna(0.0))
+
+    sniper_buys = sniper_buys.drop(columns=["Index"], errors="ignore")
+    sniper_buys.insert(0, "maker", decode_makers(sniper_buys.pop("wallet_id")))
+    return sniper_buys, _with_makers(wallet_pnl), _with_makers(summary)
+
+
+def _with_makers(pnl):
+    keys = pnl.index.to_frame(index=False)
+    pnl = pnl.reset_index(drop=True)
+    pnl.insert(0, "token_name", keys["token_name"].astype(object).to_numpy())
+    pnl.insert(0, "maker", decode_makers(keys["wallet_id"]))
+    return pnl
+
+
+def _records(frame):
+    """BSON-ready dicts: plain Python values, None for missing"""
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
+
+
+def write_run(db, tables, source_blocks, started_at):
+    """Write one run's tables, record the run, then drop the documents of runs before the previous one"""
+    run_id = ObjectId()
+    run_at = datetime.now(timezone.utc)
+    previous = latest_run(db)
+    for name, frame in tables.items():
+        col = db[name]
+        col.create_index([("run_id", ASCENDING), ("token_name", ASCENDING)])
+        frame = frame.assign(
+            run_id=run_id, run_at=run_at,
+            source_block=frame["token_name"].astype(object).map(source_blocks),
+        )
+        for start in range(0, len(frame), BATCH_SIZE):
+            col.insert_many(_records(frame.iloc[start:start + BATCH_SIZE]), ordered=False)
+    db[RUNS].insert_one({
+        "_id": run_id,
+        "status": "complete",
+        "started_at": started_at,
+        "run_at": run_at,
+        "source_blocks": source_blocks,
+        "rows": {name: len(frame) for name, frame in tables.items()},
+    })
+    # readers may still be on the previous run; its documents go once the next run is recorded
+    keep = [run_id] if previous is None else [run_id, previous["_id"]]
+    for name in tables:
+        db[name].delete_many({"run_id": {"$nin": keep}})
+    db[RUNS].delete_many({"run_at": {"$lt": run_at - RUN_HISTORY}, "_id": {"$nin": keep}})
+    return run_id
+
+
+def run_once(db, collections=SWAP_COLLECTIONS):
+    """One full precompute run; returns its run id, or None if there were no swaps"""
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    swaps = load_swaps(db, collections)
+    if swaps is None:
+        print("No swaps found; nothing written")
+        return None
+    source_blocks = {
+        str(token): int(block)
+        for token, block in swaps.groupby("token_name", observed=True)["blockNumber"].max().items()
+    }
+    sniper_buys, wallet_pnl, summary = compute(swaps, launch_blocks(db, swaps), genesis_blocks(db))
+    run_id = write_run(
+        db, {SNIPER_BUYS: sniper_buys, WALLET_PNL: wallet_pnl, SNIPER_SUMMARY: summary}, source_blocks, started_at
+    )
+    print(
+        f"Run {run_id}: {len(sniper_buys)} sniper buys, {len(wallet_pnl)} wallet PnL rows, "
+        f"{len(summary)} sniper pairs in {time.perf_counter() - start:.1f}s"
+    )
+    return run_id
+
+
+def latest_run(db):
+    """The newest complete run's document, or None"""
+    return db[RUNS].find_one({"status": "complete"}, sort=[("_id", -1)])
+
+
+def read_table(db, name, run=None, query=None):
+    """One precomputed table of the latest (or given) run as a DataFrame, or None if there is no run"""
+    run = run or latest_run(db)
+    if run is None:
+        return None
+    data = list(db[name].find({**(query or {}), "run_id": run["_id"]}, {"_id": 0, "run_id": 0}))
+    return pd.DataFrame(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", help="MongoDB connection string (default: MONGO_URI / MongoLink)")
+    parser.add_argument("--db", default=SWAP_DB)
+    parser.add_argument("--interval", type=float, default=300, help="seconds between run starts")
+    parser.add_argument("--once", action="store_true", help="run once and exit")
+    args = parser.parse_args(argv)
+
+    if args.uri is None:
+        from mongo_db import mongo_uri
+        args.uri = mongo_uri()
+    db = MongoClient(args.uri, appname="speedrun-precompute")[args.db]
+
+    if args.once:
+        run_once(db)
+        return 0
+    while True:
+        start = time.monotonic()
+        try:
+            run_once(db)
+        except Exception as e:
+            print(f"Precompute run failed: {e}")
+        time.sleep(max(0.0, args.interval - (time.monotonic() - start)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""In-process result caches keyed on cheap data versions instead of argument hashes.
+
+`st.cache_data` hashes every argument on every call (for a DataFrame, every
+row) and unpickles a fresh copy of the result on every hit. `memoize` keys a
+function on a version tuple the caller already has, such as the
+(collection, max blockNumber, document count) its inputs were loaded at, so a
+lookup is one tuple hash and a hit returns the stored object itself.
+
+As with `st.cache_data`, parameters whose name starts with an underscore are
+left out of the key; pass the version they were derived from as a separate
+argument. Results are shared between sessions, so callers must not modify
+them in place.
+
+All caches share one byte budget of RESULT_CACHE_MAX_MB, measured with
+deep memory usage; past it the least recently used result of any cache is
+evicted first. Concurrent misses on one key share a single computation. `cache_stats()` reports hits, misses,
+evictions and coalesced waiters for the perf panel.
+
+`stale_while_revalidate` keeps a whole page's results served from memory
+past their soft expiry while a background thread rebuilds them.
+"""
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+import perf
+
+MB = 1024 * 1024
+DEFAULT_MAX_BYTES = int(float(os.getenv("RESULT_CACHE_MAX_MB", "1024")) * MB)
+
+_caches = {}
+_revalidating = {}
+
+
+class CacheBudget:
+    """A byte budget shared by several ResultCaches, least recently used first out across all of them.
+
+    Every cache using the budget also uses its lock, so an entry can be
+    evicted from one cache while another is storing.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self._order = OrderedDict()
+
+    # the methods below are called with `lock` held
+
+    def touch(self, cache, key):
+        self._order.move_to_end((cache, key))
+
+    def add(self, cache, key, size):
+        self._order[(cache, key)] = size
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            (evicted_from, evicted_key), _ = self._order.popitem(last=False)
+            self.bytes -= evicted_from._drop(evicted_key)
+            evicted_from.evictions += 1
+
+    def remove(self, cache, key):
+        self.bytes -= self._order.pop((cache, key))
+
+
+# RESULT_CACHE_MAX_MB bounds every memoized result in the process together
+shared_budget = CacheBudget(DEFAULT_MAX_BYTES)
+
+
+def _freeze(value):
+    """Hashable stand-in for dicts, lists and sets in a cache key"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+def deep_size(value):
+    """Approximate bytes held by a cached result, counting object columns deeply"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(deep_size(k) + deep_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(deep_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Results of one function by key, least recently used first out.
+
+    Entries are sized with `deep_size` when stored and charged to `budget`
+    (`shared_budget` by default). Past its bytes the least recently used
+    entries of all its caches are evicted, and past `max_entries`, if set, this
+    cache's own, so the keys sessions keep asking for stay resident and the
+    long tail goes. A result bigger than the whole budget is returned but not
+    kept.
+
+    Misses are single-flight: while one caller computes a key, other callers
+    asking for it wait on that computation and share its result (or its
+    exception) instead of starting their own.
+    """
+
+    def __init__(self, name, budget=None, max_entries=None):
+        self.name = name
+        self.budget = shared_budget if budget is None else budget
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = self.budget.lock
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.budget.touch(self, key)
+                self.hits += 1
+                return self._entries[key][0]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            start = time.perf_counter()
+            try:
+                return flight.result()
+            finally:
+                perf.record(f"{self.name}: coalesced wait", time.perf_counter() - start)
+
+        try:
+            value = compute()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            # waiters get the value even if storing it fails
+            flight.set_result(value)
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def put(self, key, value):
+        size = deep_size(value)
+        if size > self.budget.max_bytes:
+            print(f"{self.name}: result of {size / MB:.1f} MB is over the {self.budget.max_bytes / MB:.0f} MB budget; not cached")
+            return
+        with self._lock:
+            if key in self._entries:
+                self.budget.remove(self, key)
+                self._drop(key)
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self.budget.remove(self, oldest)
+                self._drop(oldest)
+                self.evictions += 1
+            self.budget.add(self, key, size)
+
+    def _drop(self, key):
+        """Forget `key` and return its size; called with the lock held"""
+        _, size = self._entries.pop(key)
+        self.bytes -= size
+        return size
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self.budget.remove(self, key)
+                self._drop(key)
+
+    def stats(self):
+        return {
+            "cache": self.name, "entries": len(self._entries), "MB": round(self.bytes / MB, 2),
+            "budget MB": round(self.budget.max_bytes / MB), "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions, "coalesced": self.coalesced,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def memoize(name=None, salt=(), max_entries=None):
+    """Cache a function on its non-underscore arguments plus `salt`.
+
+    Pages should pass a `name`: every page script runs as __main__, so two
+    pages' `load_swap_data` would otherwise share a cache.
+
+    `salt` is folded into every key; use it for module-level parameters the
+    result depends on, e.g. the sniper detection thresholds. Results count
+    against the process-wide RESULT_CACHE_MAX_MB budget.
+    """
+    def wrap(func):
+        signature = inspect.signature(func)
+        keyed = [param for param in signature.parameters if not param.startswith("_")]
+        # Page scripts re-run their decorators on every rerun; the cache itself
+        # has to outlive that, so it is registered once per name.
+        cache = _caches.setdefault(name or func.__qualname__, ResultCache(name or func.__qualname__, max_entries=max_entries))
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (_freeze(salt),) + tuple(_freeze(bound.arguments[param]) for param in keyed)
+            return cache.get(key, lambda: func(*args, **kwargs))
+
+        inner.cache = cache
+        return inner
+    return wrap
+
+
+class StaleWhileRevalidate:
+    """One value served from memory and refreshed in the background.
+
+    Younger than `soft_ttl` seconds it is served as is. Past that and up to
+    `max_stale` it is still served immediately, while one background thread
+    recomputes it and swaps the new value in when done. Older than
+    `max_stale`, or never computed, it is computed in the caller; concurrent
+    callers wait for that one computation. A None result is not kept.
+    """
+
+    def __init__(self, name, soft_ttl, max_stale):
+        self.name = name
+        self.soft_ttl = soft_ttl
+        self.max_stale = max_stale
+        self._value = None
+        self._computed_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+
+    def age(self):
+        """Seconds since the served value was computed, or None"""
+        computed_at = self._computed_at
+        return None if computed_at is None else time.monotonic() - computed_at
+
+    @property
+    def refreshing(self):
+        return self._refreshing
+
+    def get(self, compute):
+        with self._lock:
+            age = self.age()
+            if age is not None and age < self.max_stale:
+                if age >= self.soft_ttl and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._refresh, args=(compute,), name=f"revalidate {self.name}", daemon=True
+                    ).start()
+                return self._value
+        with self._compute_lock:
+            age = self.age()
+            if age is not None and age < self.max_stale:
+                # computed by another caller while this one waited
+                return self._value
+            return self._store(compute())
+
+    def _refresh(self, compute):
+        start = time.perf_counter()
+        try:
+            with self._compute_lock:
+                self._store(compute())
+            print(f"{self.name}: refreshed in the background in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"{self.name}: background refresh failed, still serving the previous value: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _store(self, value):
+        if value is not None:
+            with self._lock:
+                self._value, self._computed_at = value, time.monotonic()
+        return value
+
+
+def stale_while_revalidate(name, soft_ttl, max_stale):
+    """The process-wide StaleWhileRevalidate registered under `name`"""
+    return _revalidating.setdefault(name, StaleWhileRevalidate(name, soft_ttl, max_stale))
+
+
+def caches():
+    """Every named cache by name"""
+    return dict(_caches)
+
+
+def cache_stats():
+    """Size and hit/miss/eviction/coalesced counters of every cache, one dict per cache"""
+    return [cache.stats() for cache in list(_caches.values())]
@@ -0,0 +1,134 @@
+"""Sniper detection engine shared by the global and per-token sniper pages."""
+import numpy as np
+import pandas as pd
+
+from wallet_ids import known_wallets
+
+# ───── Detection Parameters ─────
+CHUNK_WINDOW = pd.Timedelta(minutes=10)
+LARGE_BUY_THRESHOLD = 100000
+HIGH_GAS_FEE = 0.000002
+LAUNCH_BLOCK_WINDOW = 100
+QUICK_SELL_WINDOW = pd.Timedelta(minutes=20)
+# Cached detection results depend on these; see result_cache.memoize(salt=...)
+DETECTION_PARAMS = (CHUNK_WINDOW, LARGE_BUY_THRESHOLD, HIGH_GAS_FEE, LAUNCH_BLOCK_WINDOW, QUICK_SELL_WINDOW)
+
+
+def assign_chunk_ids(group_ids, times, window=CHUNK_WINDOW):
+    """Assign a chunk id to every buy, for rows sorted by (group, time).
+
+    A chunk opens at a group's first buy and takes every later buy that lands
+    within `window` of that opening buy; the first buy past the window opens the
+    next chunk. Buys without a timestamp always sit in a chunk of their own.
+    """
+    group_ids = np.asarray(group_ids, dtype=np.int64)
+    times = np.asarray(times, dtype="datetime64[ns]")
+    n = len(times)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = group_ids[1:] != group_ids[:-1]
+    group_starts = np.flatnonzero(new_group)
+    group_index = np.cumsum(new_group) - 1
+    group_end = np.append(group_starts[1:], n)[group_index]
+
+    # Rank every timestamp so (group, rank) becomes one sorted integer key that
+    # a single searchsorted can probe for "first buy past the window".
+    valid = ~np.isnat(times)
+    t = times.view(np.int64)
+    unique_t = np.unique(t[valid])
+    width = len(unique_t) + 1
+    rank = np.full(n, len(unique_t), dtype=np.int64)
+    rank[valid] = np.searchsorted(unique_t, t[valid])
+    key = group_index * width + rank
+
+    next_start = np.arange(1, n + 1, dtype=np.int64)
+    bound = np.searchsorted(unique_t, t[valid] + window.value, side="right") - 1
+    next_start[valid] = np.searchsorted(key, group_index[valid] * width + bound, side="right")
+
+    # Hop from chunk start to chunk start, all groups at once.
+    is_start = np.zeros(n, dtype=bool)
+    frontier = group_starts
+    while frontier.size:
+        is_start[frontier] = True
+        hop = next_start[frontier]
+        frontier = hop[hop < group_end[frontier]]
+
+    return np.cumsum(is_start) - 1
+
+
+def large_buy_mask(buy_df, amount_col, by, threshold=LARGE_BUY_THRESHOLD):
+    """Flag buys in a chunk whose summed amount exceeds `threshold`.
+
+    `buy_df` must already be sorted by `by` + timestampReadable.
+    """
+    if buy_df.empty:
+        return np.zeros(0, dtype=bool)
+    group_ids = buy_df.groupby(list(by), sort=False, observed=True).ngroup().to_numpy()
+    chunk_ids = assign_chunk_ids(group_ids, buy_df["timestampReadable"].to_numpy())
+
+    if amount_col in buy_df.columns:
+        amounts = pd.to_numeric(buy_df[amount_col], errors="coerce").to_numpy(dtype=float)
+    else:
+        amounts = np.zeros(len(buy_df))
+
+    starts = np.flatnonzero(np.diff(chunk_ids, prepend=-1))
+    ends = np.append(starts[1:], len(chunk_ids)) - 1
+    running = pd.Series(amounts).groupby(chunk_ids, sort=False).cumsum().to_numpy()
+    # A missing amount poisons the whole chunk sum, as a plain running total would.
+    has_nan = np.logical_or.reduceat(np.isnan(amounts), starts)
+    large_chunk = (running[ends] > threshold) & ~has_nan
+    return large_chunk[chunk_ids]
+
+
+def find_sniper_buys(combined_df, token_launch_blocks, amount_col="OUT_BeforeTax", by=("wallet_id", "token_name")):
+    """Return the large, high-gas buys made within the launch block window.
+
+    Buys are grouped by `by`, chunked into 10-minute windows and kept when their
+    chunk is large; high-gas buys landing no later than launch block + 100 are
+    returned.
+    """
+    by = list(by)
+    buy_df = combined_df[combined_df["swapType"] == "buy"]
+    buy_df = buy_df.sort_values(by=by + ["timestampReadable"])
+    # groupby() never yielded buys with a missing key, so they never chunked
+    buy_df = known_wallets(buy_df.dropna(subset=by))
+
+    # Large buys keep their source row label in an "Index" column, matching the
+    # frame the pages used to rebuild from itertuples(). That column also makes
+    # every row distinct, so no drop_duplicates pass is needed.
+    df_chunked_large_buys = buy_df[large_buy_mask(buy_df, amount_col, by)]
+    df_chunked_large_buys = df_chunked_large_buys.rename_axis("Index").reset_index()
+
+    if "transactionFee" in df_chunked_large_buys.columns:
+        df_high_gas = df_chunked_large_buys[df_chunked_large_buys["transactionFee"] > HIGH_GAS_FEE]
+    else:
+        df_high_gas = df_chunked_large_buys
+
+    launch_block = pd.to_numeric(df_high_gas["token_name"].map(token_launch_blocks), errors="coerce")
+    return df_high_gas[df_high_gas["blockNumber"] <= launch_block + LAUNCH_BLOCK_WINDOW]
+
+
+def quick_sell_snipers(sniper_buys, combined_df, by=("wallet_id", "token_name"), window=QUICK_SELL_WINDOW):
+    """Keep the sniper buys of groups that sold within `window` after one of their sniper buys.
+
+    A buy is a quick sell when the first sell of its group at or after it
+    lands within `window`. That is found with a forward as-of join on the
+    sorted times, one match per buy, rather than pairing every buy with
+    every sell of the group.
+    """
+    by = list(by)
+    buys = sniper_buys[by + ["timestampReadable"]].dropna(subset=["timestampReadable"])
+    # only sells of wallets with a sniper buy can match; the rest need no sorting
+    is_candidate = (combined_df["swapType"] == "sell") & combined_df[by[0]].isin(buys[by[0]].unique())
+    sells = combined_df.loc[is_candidate, by + ["timestampReadable"]]
+    sells = sells.dropna(subset=["timestampReadable"]).rename(columns={"timestampReadable": "next_sell"})
+    matched = pd.merge_asof(
+        buys.sort_values("timestampReadable", kind="mergesort"), sells.sort_values("next_sell", kind="mergesort"),
+        left_on="timestampReadable", right_on="next_sell", by=by, direction="forward",
+    )
+    quick_sells = matched[matched["next_sell"] - matched["timestampReadable"] <= window]
+    quick_sell_groups = pd.MultiIndex.from_frame(quick_sells[by])
+    return sniper_buys[pd.MultiIndex.from_frame(sniper_buys[by]).isin(quick_sell_groups)].copy()
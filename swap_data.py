@@ -0,0 +1,228 @@
+"""Loading helpers for the per-token *_swap collections."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pymongo.errors import InvalidOperation
+
+from bson_columns import raw_frame
+
+SWAP_DB = "genesis_tokens_swap_info"
+SWAP_COLLECTIONS = ['jarvis_swap', 'tian_swap', 'badai_swap', 'aispace_swap', 'wint_swap']
+LOAD_WORKERS = int(os.getenv("SWAP_LOAD_WORKERS", "4"))
+# How long a page trusts the collection versions before asking MongoDB again
+VERSION_TTL = int(os.getenv("SWAP_VERSION_TTL", "30"))
+# Documents per batch when streaming a cursor into a frame
+INGEST_BATCH_SIZE = int(os.getenv("SWAP_INGEST_BATCH_SIZE", "50000"))
+# Decode raw BSON batches into columns (bson_columns) instead of dicts
+RAW_BSON = os.getenv("SWAP_RAW_BSON", "1") != "0"
+# Blocks at a collection's tip that may still receive swaps; block checkpoints stay this far behind it
+SETTLE_BLOCKS = int(os.getenv("SWAP_SETTLE_BLOCKS", "3"))
+
+# Compact in-memory dtypes for swap frames. Token amounts and transactionFee
+# stay float64: FIFO leftovers are shown to 4-6 decimals on amounts in the
+# millions, and fees are compared against HIGH_GAS_FEE, so float32 rounding
+# would change results. Prices and tax are only averaged and summed.
+SWAP_SCHEMA = {
+    "maker": "category",
+    "token_name": "category",
+    "swapType": "category",
+    "label": "category",
+    "genesis_token_symbol": "category",
+    "persona_name": "category",
+    "blockNumber": "int32",
+    "timestampReadable": "datetime64[ns]",
+    "genesis_usdc_price": "float32",
+    "genesis_virtual_price": "float32",
+    "virtual_usdc_price": "float32",
+    "Tax_1pct": "float32",
+}
+# Low-cardinality string columns; while streaming, repeats share one str object
+INTERNED_COLUMNS = [col for col, dtype in SWAP_SCHEMA.items() if dtype == "category"]
+
+
+def swap_projection(token_prefix):
+    """Projection of the fields the sniper and PnL pages read"""
+    return {
+        f"{token_prefix}OUT_BeforeTax": 1,
+        f"{token_prefix}OUT_AfterTax": 1,
+        f"{token_prefix}IN_BeforeTax": 1,
+        f"{token_prefix}IN_AfterTax": 1,
+        "maker": 1,
+        "token_name": 1,
+        "swapType": 1,
+        "timestamp": 1,
+        "timestampReadable": 1,
+        "blockNumber": 1,
+        "genesis_usdc_price": 1,
+        "transactionFee": 1,
+        "Tax_1pct": 1
+    }
+
+
+def _intern(values):
+    """`values` with equal strings sharing one object; missing values become NaN"""
+    codes, uniques = pd.factorize(values)
+    return np.append(uniques.astype(object), np.nan)[codes]
+
+
+def _chunk(docs, intern):
+    chunk = pd.DataFrame(docs)
+    for col in intern:
+        if col in chunk.columns and chunk[col].dtype == object:
+            chunk[col] = _intern(chunk[col].to_numpy())
+    return chunk
+
+
+def stream_frame(cursor, batch_size=INGEST_BATCH_SIZE, intern=INTERNED_COLUMNS):
+    """Frame of a cursor's documents, or None if there are none.
+
+    Documents are pulled `batch_size` at a time and each batch is turned into
+    a columnar chunk before the next one is read, so only one batch of dicts
+    is alive at once instead of the whole result set. String columns in
+    `intern` keep one str object per distinct value per chunk rather than
+    one per document. Peak memory is about the chunks plus their concatenation.
+    """
+    chunks = []
+    batch = []
+    for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            chunks.append(_chunk(batch, intern))
+            batch = []
+    if batch:
+        chunks.append(_chunk(batch, intern))
+    del batch
+    if not chunks:
+        return None
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+
+def load_frame(collection, query=None, projection=None, batch_size=INGEST_BATCH_SIZE, raw=None):
+    """Frame of a query's documents without `_id`, or None if there are none.
+
+    Decodes raw BSON batches into columns when `raw` (default SWAP_RAW_BSON),
+    else streams dicts through `stream_frame`; both give the same frame.
+    """
+    if RAW_BSON if raw is None else raw:
+        try:
+            return raw_frame(collection, query, projection, batch_size)
+        except (NotImplementedError, InvalidOperation) as e:
+            # e.g. client-side encryption, which has no raw batch cursors
+            print(f"Raw BSON batches unavailable for {collection.name}, decoding documents: {e}")
+    df = stream_frame(collection.find(query or {}, projection), batch_size)
+    return None if df is None else df.drop(columns=["_id"], errors="ignore")
+
+
+def load_collection(db, col_name, query=None, batch_size=INGEST_BATCH_SIZE, raw=None):
+    """Stream one swap collection with the token prefix stripped from its columns"""
+    token_prefix = col_name.replace('_swap', '').upper() + "_"
+    return decode_swaps(load_frame(db[col_name], query, swap_projection(token_prefix), batch_size, raw), col_name)
+
+
+def collection_version(db, col_name):
+    """(collection, max blockNumber, document count) for one swap collection.
+
+    Swaps are appended in block order, so the version moves whenever a swap
+    is added or removed. The newest block comes off the blockNumber index and the
+    count from collection metadata, so this stays cheap on large collections.
+    """
+    col = db[col_name]
+    newest = col.find_one({}, {"blockNumber": 1, "_id": 0}, sort=[("blockNumber", -1)])
+    return col_name, (newest or {}).get("blockNumber"), col.estimated_document_count()
+
+
+def swap_versions(db, collections):
+    return tuple(collection_version(db, col_name) for col_name in collections)
+
+
+def decode_swaps(data, col_name):
+    """Frame of fetched swap documents (a list, or a frame from `stream_frame`) from `col_name`, or None if there are none"""
+    token_name = col_name.replace('_swap', '')
+    token_prefix = token_name.upper() + "_"
+    if data is None or len(data) == 0:
+        return None
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    df.drop(columns=['_id'], errors='ignore', inplace=True)
+    # Remove token prefix from relevant columns
+    df.columns = [col.replace(token_prefix, '') if col.startswith(token_prefix) else col for col in df.columns]
+    df["token_name"] = token_name.upper()
+    return df
+
+
+def clean_swaps(df):
+    """Drop unpriced or fee-less swaps and parse the readable timestamp"""
+    df = df.dropna(subset=['transactionFee'])
+    df = df.dropna(subset=['genesis_usdc_price'])
+    df['timestampReadable'] = pd.to_datetime(df['timestampReadable'])
+    return df
+
+
+def compact_swaps(df, schema=SWAP_SCHEMA):
+    """Cast the columns of `df` named in `schema` to their compact dtypes.
+
+    Integer columns with missing or out-of-range values are left as they are.
+    """
+    df = df.copy()
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        values = df[col]
+        try:
+            if dtype.startswith("int"):
+                numbers = pd.to_numeric(values, errors="coerce")
+                info = np.iinfo(dtype)
+                if numbers.isna().any() or numbers.min() < info.min or numbers.max() > info.max:
+                    continue
+                df[col] = numbers.astype(dtype)
+            elif dtype.startswith("float"):
+                df[col] = pd.to_numeric(values, errors="coerce").astype(dtype)
+            elif dtype.startswith("datetime"):
+                df[col] = pd.to_datetime(values, errors="coerce")
+            else:
+                df[col] = values.astype(dtype)
+        except (TypeError, ValueError) as e:
+            print(f"Could not cast {col} to {dtype}: {e}")
+    return df
+
+
+def memory_report(before, after):
+    """Deep memory use in MB per column of a frame before and after `compact_swaps`.
+
+    Columns only one side has (e.g. maker replaced by wallet_id) show as 0 MB
+    on the other.
+    """
+    columns = list(before.columns) + [col for col in after.columns if col not in before.columns]
+    report = pd.DataFrame({
+        "dtype before": before.dtypes.astype(str),
+        "dtype after": after.dtypes.astype(str),
+        "MB before": before.memory_usage(index=False, deep=True) / 1e6,
+        "MB after": after.memory_usage(index=False, deep=True) / 1e6,
+    }).reindex(columns)
+    report[["dtype before", "dtype after"]] = report[["dtype before", "dtype after"]].fillna("")
+    report[["MB before", "MB after"]] = report[["MB before", "MB after"]].fillna(0.0)
+    report.loc["total"] = ["", "", report["MB before"].sum(), report["MB after"].sum()]
+    return report.round({"MB before": 2, "MB after": 2})
+
+
+def load_collections(collections, load_one, max_workers=LOAD_WORKERS):
+    """Run `load_one(col_name)` for every collection on a bounded thread pool.
+
+    Returns the non-empty frames in collection order and the wall time each
+    collection took, so a page load tracks the slowest collection rather
+    than the sum of all of them.
+    """
+    def timed(col_name):
+        start = time.perf_counter()
+        df = load_one(col_name)
+        return df, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(collections)))) as pool:
+        results = list(pool.map(timed, collections))
+
+    frames = [df for df, _ in results if df is not None]
+    timings = {col_name: elapsed for col_name, (_, elapsed) in zip(collections, results)}
+    return frames, timings
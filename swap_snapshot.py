@@ -0,0 +1,132 @@
+"""Local Arrow IPC snapshots of the swap collections, synced by blockNumber."""
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+
+from swap_data import SETTLE_BLOCKS, load_collection
+
+SNAPSHOT_DIR = os.getenv("SWAP_SNAPSHOT_DIR", ".swap_snapshots")
+MAX_SEGMENTS = 16
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _collection_lock(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def delta_query(last_block):
+    """Swaps a sync fetches: everything for an empty snapshot, else the blocks past `last_block`
+    plus every swap without a blockNumber, which no block range can pick up.
+    """
+    if last_block is None:
+        return None
+    return {"$or": [{"blockNumber": {"$gt": last_block}}, {"blockNumber": None}]}
+
+
+def _to_frame(tables):
+    try:
+        return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+    except pa.ArrowException:
+        # segments whose column types can't be unified are merged by pandas
+        return pd.concat([table.to_pandas() for table in tables], ignore_index=True)
+
+
+class SwapSnapshot:
+    """On-disk columnar copy of one swap collection.
+
+    The snapshot is a directory of Arrow IPC segment files named by their
+    first and last blockNumber. `load` fetches only swaps past the newest
+    synced block from MongoDB, writes them as a new segment and reads every
+    segment back through memory maps, so cold starts and refreshes mostly hit
+    local disk. Swaps in the newest SETTLE_BLOCKS blocks are returned but not
+    written, since more may still arrive for those blocks; the next load
+    fetches them again. Swaps without a blockNumber are never written either:
+    every load fetches them afresh (there are few, and the blockNumber index
+    finds them), so the snapshot can't miss one written after a sync. Segments are compacted into one once there are more
+    than MAX_SEGMENTS of them.
+    """
+
+    def __init__(self, col_name, root=SNAPSHOT_DIR):
+        self.col_name = col_name
+        self.path = os.path.join(root, col_name)
+
+    def segments(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".arrow")
+        )
+
+    def last_block(self):
+        """Newest blockNumber on disk, or None for an empty snapshot"""
+        segments = self.segments()
+        if not segments:
+            return None
+        return int(os.path.basename(segments[-1]).split(".")[0].split("-")[1])
+
+    def load(self, db):
+        """Sync new swaps from MongoDB and return the whole collection as a DataFrame"""
+        with _collection_lock(self.path):
+            last_block = self.last_block()
+            tail = load_collection(db, self.col_name, delta_query(last_block))
+            tables = [self._read(path) for path in self.segments()]
+            unsaved = []
+            if tail is not None:
+                blocks = tail["blockNumber"] if "blockNumber" in tail.columns else pd.Series(float("nan"), index=tail.index)
+                unsettled = blocks.isna() | (blocks > blocks.max() - SETTLE_BLOCKS)
+                settled = tail[~unsettled]
+                unsaved.append(tail[unsettled])
+                if len(settled):
+                    try:
+                        tail_table = pa.Table.from_pandas(settled, preserve_index=False)
+                        self._write(tail_table)
+                        tables.append(tail_table)
+                    except (pa.ArrowException, OSError) as e:
+                        print(f"Could not write snapshot segment for {self.col_name}: {e}")
+                        unsaved.insert(0, settled)
+            if len(tables) > MAX_SEGMENTS:
+                self._compact(tables)
+
+        frames = ([_to_frame(tables)] if tables else []) + [frame for frame in unsaved if len(frame)]
+        if not frames:
+            return None
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def _read(path):
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        # older segments may hold block-less swaps, which every load now fetches itself
+        if "blockNumber" in table.column_names and table.column("blockNumber").null_count:
+            table = table.filter(pc.is_valid(table.column("blockNumber")))
+        return table
+
+    def _write(self, table, replace=()):
+        if "blockNumber" not in table.column_names:
+            return
+        blocks = table.column("blockNumber").to_pandas().dropna()
+        if blocks.empty:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        name = f"{int(blocks.min()):012d}-{int(blocks.max()):012d}.arrow"
+        target = os.path.join(self.path, name)
+        tmp = target + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, target)
+        for path in replace:
+            if path != target:
+                os.remove(path)
+
+    def _compact(self, tables):
+        try:
+            self._write(pa.concat_tables(tables, promote_options="permissive"), replace=self.segments())
+        except (pa.ArrowException, OSError) as e:
+            print(f"Could not compact snapshot for {self.col_name}: {e}")
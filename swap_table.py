@@ -0,0 +1,267 @@
+"""Server-side filtering, sorting and keyset pagination for the transactions table."""
+import re
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+PAGE_SIZES = [50, 100, 250, 500]
+# Field holding a derived column's sort key inside the page pipeline
+SORT_KEY = "_sort"
+
+
+def sort_fields(token):
+    """Table columns backed by a stored field, and that field.
+
+    Each has a (field, _id) index (see mongo_indexes.SWAP_INDEXES), so a
+    keyset page on them reads the index in order and stops after one page.
+    """
+    return {
+        "BLOCK": "blockNumber",
+        "TIME": "timestamp",
+        "GENESIS \nPRICE ($)": "genesis_usdc_price",
+        "GENESIS PRICE \n($VIRTUAL)": "genesis_virtual_price",
+        "VIRTUAL \nPRICE ($)": "virtual_usdc_price",
+        "TAX (ETH)": "Tax_1pct",
+        f"TX FEE ({token.upper()})": "transactionFee",
+    }
+
+
+def sortable_columns(token):
+    """Every column the table sorts on, in table order.
+
+    The amount columns are derived from the buy or sell side of a swap, so no
+    index can order them: sorting on them computes the column for every
+    filtered row and sorts those on the server (narrow the filters first on
+    large collections).
+    """
+    token_upper = token.upper()
+    return [
+        "BLOCK", "TIME", token_upper, "VIRTUAL", "GENESIS \nPRICE ($)", "TRANSACTION VALUE ($)",
+        "GENESIS PRICE \n($VIRTUAL)", "VIRTUAL \nPRICE ($)", "TAX (ETH)", f"TX FEE ({token_upper})",
+    ]
+
+
+def transaction_fields(token):
+    """Projection of the swap fields the transactions table shows"""
+    token_upper = token.upper()
+    return {
+        "blockNumber": 1, "txHash": 1, "maker": 1, "swapType": 1, "label": 1, "timestamp": 1, "timestampReadable": 1,
+        f"{token_upper}_IN": 1, f"{token_upper}_OUT": 1, "Virtual_IN": 1, "Virtual_OUT": 1,
+        "genesis_usdc_price": 1, "genesis_virtual_price": 1, "virtual_usdc_price": 1, "Tax_1pct": 1, "transactionFee": 1
+    }
+
+
+def _by_swap_type(buy_field, sell_field):
+    return {"$switch": {
+        "branches": [
+            {"case": {"$eq": ["$swapType", "buy"]}, "then": {"$ifNull": [f"${buy_field}", 0]}},
+            {"case": {"$eq": ["$swapType", "sell"]}, "then": {"$ifNull": [f"${sell_field}", 0]}},
+        ],
+        "default": None,
+    }}
+
+
+def column_expressions(token):
+    """Mongo expression for every range-filterable table column.
+
+    Stored fields that always exist are plain field paths; the rest mirror the
+    pandas formatting (missing values count as 0, amounts rounded to 4
+    decimals).
+    """
+    token_upper = token.upper()
+    amount = {"$round": [_by_swap_type(f"{token_upper}_OUT", f"{token_upper}_IN"), 4]}
+    return {
+        "BLOCK": "$blockNumber",
+        "TIME": "$timestamp",
+        token_upper: amount,
+        "VIRTUAL": {"$round": [_by_swap_type("Virtual_IN", "Virtual_OUT"), 4]},
+        "GENESIS \nPRICE ($)": {"$ifNull": ["$genesis_usdc_price", 0]},
+        "TRANSACTION VALUE ($)": {"$round": [{"$multiply": [amount, {"$ifNull": ["$genesis_usdc_price", 0]}]}, 4]},
+        "GENESIS PRICE \n($VIRTUAL)": {"$ifNull": ["$genesis_virtual_price", 0]},
+        "VIRTUAL \nPRICE ($)": {"$ifNull": ["$virtual_usdc_price", 0]},
+        "TAX (ETH)": {"$ifNull": ["$Tax_1pct", 0]},
+        f"TX FEE ({token_upper})": {"$ifNull": ["$transactionFee", 0]},
+    }
+
+
+def _epoch(day):
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+def build_query(token, swap_type="all", label="All", date_range=None, search="", value_range=None,
+                search_anywhere=False):
+    """Mongo filter for the table's controls.
+
+    `date_range` is a (start, end) pair of dates, both inclusive, matched on
+    the UTC `timestamp`. `search` matches a block number exactly, or a maker
+    or tx hash by its start (a full value matches itself). Addresses and
+    hashes are stored as lowercase hex, so the search is lowercased and
+    matched with an anchored regex, which both indexes can answer with a
+    range scan. With `search_anywhere` it matches anywhere in the block
+    number, maker or tx hash, ignoring case, as the table's search used to;
+    that reads every filtered document. `value_range` is (column, low, high)
+    for a table column.
+    """
+    clauses = []
+    if swap_type != "all":
+        clauses.append({"swapType": swap_type.lower()})
+    if label != "All":
+        clauses.append({"label": label})
+    if date_range is not None and len(date_range) == 2:
+        start, end = date_range
+        clauses.append({"timestamp": {"$gte": _epoch(start), "$lte": _epoch(end + timedelta(days=1))}})
+    q = search.strip()
+    if q and search_anywhere:
+        anywhere = {"$regex": re.escape(q), "$options": "i"}
+        clauses.append({"$or": [
+            {"maker": anywhere},
+            {"txHash": anywhere},
+            {"$expr": {"$regexMatch": {"input": {"$toString": "$blockNumber"}, "regex": re.escape(q)}}},
+        ]})
+    elif q:
+        prefix = {"$regex": "^" + re.escape(q.lower())}
+        matches = [{"maker": prefix}, {"txHash": prefix}]
+        if q.isdigit():
+            matches.append({"blockNumber": int(q)})
+        clauses.append({"$or": matches})
+    if value_range is not None:
+        column, low, high = value_range
+        expr = column_expressions(token)[column]
+        clauses.append({"$expr": {"$and": [{"$gte": [expr, low]}, {"$lte": [expr, high]}]}})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def count_rows(collection, query):
+    """Rows matching `query`; the unfiltered count comes from collection metadata instead of a scan"""
+    if not query:
+        return collection.estimated_document_count()
+    return collection.count_documents(query)
+
+
+def bounds_pipeline(token, query, column):
+    expr = column_expressions(token)[column]
+    return [
+        {"$match": query},
+        {"$group": {"_id": None, "low": {"$min": expr}, "high": {"$max": expr}}},
+    ]
+
+
+def column_bounds(collection, token, query, column):
+    """(min, max) of a table column over the rows matching `query`, or None"""
+    result = next(collection.aggregate(bounds_pipeline(token, query, column)), None)
+    if result is None or result["low"] is None or result["high"] is None:
+        return None
+    return result["low"], result["high"]
+
+
+def _after(key, value, last_id, ascending):
+    """Match for the rows after (value, last_id) in (key, _id) order.
+
+    MongoDB sorts null and missing keys before every value, and `$gt` /
+    `$lt` never match them, so a null cursor value gets its own bracket.
+    """
+    cmp = "$gt" if ascending else "$lt"
+    tie = {key: value, "_id": {cmp: last_id}}
+    if value is None:
+        # the rest of the nulls, then (ascending) every non-null key
+        return {"$or": [tie, {key: {"$ne": None}}]} if ascending else tie
+    later = [{key: {cmp: value}}, tie]
+    if not ascending:
+        later.append({key: None})
+    return {"$or": later}
+
+
+def page_pipeline(token, query, sort_col="TIME", ascending=False, after=None, page_size=100):
+    """Aggregation pipeline for one page ordered by (sort column, _id), after the keyset `after`.
+
+    `sort_col` is one of `sortable_columns`. A column with a stored field
+    sorts on it; a derived column is computed into SORT_KEY first. Fetches one
+    row past `page_size` so the caller can tell whether another page follows.
+    Returns (pipeline, key) where `key` is the sorted field.
+    """
+    direction = 1 if ascending else -1
+    pipeline = [{"$match": query}]
+    key = sort_fields(token).get(sort_col)
+    if key is None:
+        key = SORT_KEY
+        pipeline.append({"$addFields": {SORT_KEY: column_expressions(token)[sort_col]}})
+    if after is not None:
+        value, last_id = after
+        pipeline.append({"$match": _after(key, value, last_id, ascending)})
+    pipeline += [
+        {"$sort": {key: direction, "_id": direction}},
+        {"$limit": page_size + 1},
+        {"$project": {**transaction_fields(token), **({SORT_KEY: 1} if key == SORT_KEY else {})}},
+    ]
+    return pipeline, key
+
+
+def fetch_page(collection, token, query, sort_col="TIME", ascending=False, after=None, page_size=100):
+    """One page of rows ordered by (sort column, _id), starting after the keyset `after`.
+
+    Returns (rows, next_after); `next_after` is the keyset to pass for the
+    following page, or None on the last page. Paging never skips over earlier
+    rows, so every page costs the same however deep it is.
+    """
+    pipeline, key = page_pipeline(token, query, sort_col, ascending, after, page_size)
+    # a derived sort key is sorted in memory, which may need to spill to disk
+    rows = list(collection.aggregate(pipeline, allowDiskUse=key == SORT_KEY))
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, (rows[-1].get(key), rows[-1]["_id"])
+
+
+def format_transactions(data, token):
+    """Swap documents as the transactions table's display frame"""
+    token_upper = token.upper()
+    token_in_col, token_out_col = f"{token_upper}_IN", f"{token_upper}_OUT"
+    tabdf = pd.DataFrame(data).fillna(0)
+    for col in transaction_fields(token):
+        if col not in tabdf.columns:
+            tabdf[col] = 0
+
+    # Extract TokenAmount and Virtual, round to 4 decimals
+    is_buy = tabdf["swapType"] == "buy"
+    is_sell = tabdf["swapType"] == "sell"
+    tabdf[token_upper] = pd.to_numeric(
+        tabdf[token_out_col].where(is_buy, tabdf[token_in_col].where(is_sell)), errors="coerce").round(4)
+    tabdf["Virtual"] = pd.to_numeric(
+        tabdf["Virtual_IN"].where(is_buy, tabdf["Virtual_OUT"].where(is_sell)), errors="coerce").round(4)
+
+    # Select and rename required columns
+    tabdf = tabdf[[
+        "blockNumber", "txHash", "maker", "swapType", "label", "timestampReadable", token_upper, "Virtual", "genesis_usdc_price", "genesis_virtual_price", "virtual_usdc_price", "Tax_1pct", "transactionFee"
+    ]].rename(columns={
+        "blockNumber": "BLOCK",
+        "txHash": "TX HASH",
+        "maker": "MAKER",
+        "swapType": "TX TYPE",
+        "label": "SWAP TYPE",
+        "timestampReadable": "TIME",
+        "Virtual": "VIRTUAL",
+        "genesis_usdc_price": "GENESIS \nPRICE ($)",
+        "genesis_virtual_price": "GENESIS PRICE \n($VIRTUAL)",
+        "virtual_usdc_price": "VIRTUAL \nPRICE ($)",
+        "Tax_1pct": "TAX (ETH)",
+        "transactionFee": f"TX FEE ({token_upper})"
+    })
+
+    # Transaction Value Calculation
+    tabdf["TRANSACTION VALUE ($)"] = (
+        pd.to_numeric(tabdf[token_upper], errors="coerce") *
+        pd.to_numeric(tabdf["GENESIS \nPRICE ($)"], errors="coerce")
+    ).round(4)
+    tabdf["TIME"] = pd.to_datetime(tabdf["TIME"], errors="coerce")
+    return tabdf
+
+
+def display_transactions(tabdf):
+    """Shorten hashes and addresses for the table; no HTML tags"""
+    tabdf = tabdf.copy()
+    tabdf["TX HASH"] = tabdf["TX HASH"].astype(str).str[:8] + "..." + tabdf["TX HASH"].astype(str).str[-4:]
+    tabdf["MAKER"] = tabdf["MAKER"].apply(lambda addr: f"{addr[:5]}...{addr[-5:]}" if isinstance(addr, str) else addr)
+    tabdf["TX TYPE"] = tabdf["TX TYPE"].astype(str)
+    return tabdf
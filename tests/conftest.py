@@ -0,0 +1,39 @@
+"""Shared fixtures: seeded swaps from bench.generator, decoded the way the pages load them."""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.generator import documents, generate_swaps  # noqa: E402
+from swap_data import compact_swaps, decode_swaps, swap_projection  # noqa: E402
+from wallet_ids import encode_makers  # noqa: E402
+
+
+def token_prefix(col_name):
+    return col_name.replace('_swap', '').upper() + "_"
+
+
+def shared_frame(collections):
+    """Every collection's swaps with the token prefix stripped, as precompute.py and the global page load them"""
+    frames = [
+        decode_swaps(documents(frame, swap_projection(token_prefix(col_name))), col_name)
+        for col_name, frame in collections.items()
+    ]
+    return encode_makers(compact_swaps(pd.concat(frames, ignore_index=True)))
+
+
+def token_frame(collections, col_name):
+    """One collection's swaps with their token prefix kept, as the token page loads them"""
+    df = pd.DataFrame(documents(collections[col_name]))
+    df["token_name"] = col_name.replace('_swap', '').upper()
+    df["timestampReadable"] = pd.to_datetime(df["timestampReadable"], errors='coerce')
+    return encode_makers(compact_swaps(df))
+
+
+@pytest.fixture(scope="session")
+def generated():
+    """({collection: frame of documents}, {token: launch block}) for 5k seeded swaps"""
+    return generate_swaps(5_000, seed=7)
@@ -0,0 +1,51 @@
+import bson
+import pandas as pd
+import pytest
+
+from bench.generator import documents
+from bson_columns import Unsupported, decode_batch, decode_batch_dicts
+from conftest import token_prefix
+from swap_data import swap_projection
+
+
+def encode(docs):
+    return b"".join(bson.encode(doc) for doc in docs)
+
+
+def assert_decodes_like_dicts(docs):
+    data = encode(docs)
+    pd.testing.assert_frame_equal(decode_batch(data), decode_batch_dicts(data))
+
+
+def test_swap_batches_decode_like_dicts(generated):
+    collections, _ = generated
+    for col_name, frame in collections.items():
+        docs = documents(frame, swap_projection(token_prefix(col_name)))
+        for doc in docs:
+            doc["_id"] = bson.ObjectId()
+        assert_decodes_like_dicts(docs)
+
+
+def test_uneven_documents_decode_like_dicts():
+    assert_decodes_like_dicts([
+        {"_id": 1, "a": 1, "s": "x"},
+        {"_id": 2, "a": None, "s": None, "n": None},
+        {"_id": 3, "b": 2, "a": 2.5, "s": "é"},
+        {"_id": "z", "i": 5, "s": ""},
+        {"_id": 5, "c": 1 << 40, "s": "x"},
+    ])
+
+
+def test_strings_differing_in_trailing_nuls_stay_apart():
+    assert_decodes_like_dicts([{"s": "ab"}, {"s": "ab\x00"}, {"s": "ab\x00\x00"}, {"s": "ab"}, {"s": "\x00"}, {"s": ""}])
+
+
+@pytest.mark.parametrize("docs", [
+    [{"d": pd.Timestamp("2025-01-01").to_pydatetime()}],
+    [{"x": [1]}],
+    [{"m": 1, "q": True}],
+    [{"m": "a"}, {"m": 1}],
+])
+def test_unsupported_batches_raise(docs):
+    with pytest.raises(Unsupported):
+        decode_batch(encode(docs))
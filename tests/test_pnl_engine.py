@@ -0,0 +1,85 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+import pnl_engine
+from conftest import shared_frame
+from pnl_engine import match_lots, match_lots_sharded
+from pnl_state import matchable_trades
+from swap_data import clean_swaps
+
+KEY = ["wallet_id", "token_name"]
+
+
+def baseline_fifo(trades):
+    """(realized, remaining) per group from the pages' original per-wallet deque loop"""
+    realized, remaining = [], []
+    for group in trades:
+        pnl = 0.0
+        buy_queue = deque()
+        for is_buy, amount, cost, sell_net, price in group:
+            if is_buy:
+                buy_queue.append({'amount': amount, 'amount_paid_for': cost, 'price': price})
+                continue
+            remaining_to_match = amount
+            while remaining_to_match > 0 and buy_queue:
+                buy = buy_queue.popleft()
+                matched_amount = min(remaining_to_match, buy['amount'])
+                matched_paid = buy['amount_paid_for'] * (matched_amount / buy['amount'])
+                pnl += sell_net * price * (matched_amount / amount) - matched_paid * buy['price']
+                remaining_to_match -= matched_amount
+                remaining_buy = buy['amount'] - matched_amount
+                if remaining_buy > 0:
+                    buy_queue.appendleft({
+                        'amount': remaining_buy,
+                        'amount_paid_for': buy['amount_paid_for'] * (remaining_buy / buy['amount']),
+                        'price': buy['price'],
+                    })
+        realized.append(pnl)
+        remaining.append(sum(b['amount'] for b in buy_queue))
+    return np.array(realized), np.array(remaining)
+
+
+@pytest.fixture(scope="module")
+def lots(generated):
+    """match_lots arguments for every (wallet, token) of the seeded swaps, and the same trades grouped for the deque loop"""
+    collections, _ = generated
+    trades = matchable_trades(clean_swaps(shared_frame(collections)))
+    # the deque loop divides by a lot's amount, so it can't take empty lots (match_lots skips them)
+    trades = trades[~((trades["swapType"] == "buy") & (trades["OUT_AfterTax"] <= 0))]
+    trades = trades.sort_values(KEY + ["timestamp"], kind="mergesort")
+    is_buy = (trades["swapType"] == "buy").to_numpy()
+    args = dict(
+        wallet_ids=trades.groupby(KEY, sort=False, observed=True).ngroup().to_numpy(),
+        is_buy=is_buy,
+        amount=np.where(is_buy, trades["OUT_AfterTax"], trades["IN_BeforeTax"]).astype(float),
+        cost=trades["OUT_BeforeTax"].to_numpy(dtype=float),
+        sell_net=trades["IN_AfterTax"].to_numpy(dtype=float),
+        price=trades["genesis_usdc_price"].to_numpy(dtype=float),
+    )
+    args["n_wallets"] = int(args["wallet_ids"].max()) + 1
+    rows = list(zip(args["is_buy"], args["amount"], args["cost"], args["sell_net"], args["price"]))
+    bounds = np.flatnonzero(np.diff(args["wallet_ids"], prepend=-1, append=-1))
+    grouped = [rows[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    return args, grouped
+
+
+def test_match_lots_matches_deque_fifo(lots):
+    args, grouped = lots
+    realized, remaining = match_lots(**args)
+    expected_realized, expected_remaining = baseline_fifo(grouped)
+    assert (expected_realized != 0).sum() > 100
+    np.testing.assert_allclose(realized, expected_realized, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(remaining, expected_remaining, rtol=1e-9, atol=1e-9)
+
+
+def test_sharded_matches_serial(lots, monkeypatch):
+    args, _ = lots
+    monkeypatch.setattr(pnl_engine, "PNL_PARALLEL_MIN_ROWS", 0)
+    expected = match_lots(**args, keep_lots=True)
+    result = match_lots_sharded(**args, keep_lots=True, workers=2)
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
+    for got, want in zip(result[2], expected[2]):
+        np.testing.assert_array_equal(got, want)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pnl_state
+from conftest import shared_frame
+from pnl_state import PnLStateStore
+from swap_data import SETTLE_BLOCKS, clean_swaps
+
+# tax and fee columns are float32, so sums over different row ranges agree to float32 precision
+RTOL = 1e-6
+
+
+@pytest.fixture(scope="module")
+def swaps(generated):
+    collections, _ = generated
+    swaps = clean_swaps(shared_frame(collections))
+    return swaps.sort_values("blockNumber", kind="mergesort", ignore_index=True)
+
+
+def full_fold(swaps):
+    state = PnLStateStore()
+    state.fold(swaps)
+    return state.wallet_pnl()
+
+
+@pytest.mark.parametrize("n_ranges", [2, 7, 40])
+def test_incremental_fold_matches_full_fold(swaps, n_ranges):
+    edges = np.linspace(swaps["blockNumber"].min(), swaps["blockNumber"].max() + 1, n_ranges + 1)
+    state = PnLStateStore()
+    for low, high in zip(edges[:-1], edges[1:]):
+        state.fold(swaps[(swaps["blockNumber"] >= low) & (swaps["blockNumber"] < high)])
+    pd.testing.assert_frame_equal(state.wallet_pnl(), full_fold(swaps), rtol=RTOL)
+
+
+def test_refresh_holds_back_unsettled_blocks_then_matches_full_fold(swaps, monkeypatch):
+    tip = swaps.groupby("token_name", observed=True)["blockNumber"].transform("max")
+    # every other swap in each token's newest blocks is written late
+    late = ((swaps["blockNumber"] > tip - SETTLE_BLOCKS) & (np.arange(len(swaps)) % 2 == 0)).to_numpy()
+    edges = np.linspace(swaps["blockNumber"].min(), swaps["blockNumber"].max(), 5)[1:]
+    state = PnLStateStore()
+    for high in edges:
+        state.refresh(swaps[(swaps["blockNumber"] <= high).to_numpy() & ~late])
+    state.refresh(swaps)
+
+    pairs = swaps[["wallet_id", "token_name"]].drop_duplicates()
+    pending = state.pending(swaps, pairs)
+    held = swaps[swaps["blockNumber"] > swaps["token_name"].map(state.checkpoints).astype(float)]
+    assert pending.sum() == len(held[["wallet_id", "token_name"]].drop_duplicates())
+    assert pending.any()
+
+    monkeypatch.setattr(pnl_state, "SETTLE_SECONDS", 0)
+    state.refresh(swaps)
+    assert not state.pending(swaps, pairs).any()
+    pd.testing.assert_frame_equal(state.wallet_pnl(), full_fold(swaps), rtol=RTOL)
+
+
+def test_wallet_pnl_for_given_pairs_keeps_their_order(swaps):
+    state = PnLStateStore()
+    state.fold(swaps)
+    pairs = swaps[["wallet_id", "token_name"]].drop_duplicates().sample(50, random_state=0)
+    pairs = pd.concat([pairs, pd.DataFrame({"wallet_id": [10**6], "token_name": ["JARVIS"]})], ignore_index=True)
+    pnl = state.wallet_pnl(pairs)
+    assert list(pnl.index) == list(zip(pairs["wallet_id"], pairs["token_name"]))
+    pd.testing.assert_frame_equal(pnl.iloc[:-1], state.wallet_pnl().loc[pnl.index[:-1]])
+    assert pnl.iloc[-1]["buy_count"] == 0 and pd.isna(pnl.iloc[-1]["first_buy_time"])
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from conftest import shared_frame, token_frame
+from pnl_engine import swap_pnl
+from precompute import compute
+from wallet_ids import decode_makers
+
+KEY = ["wallet_id", "token_name"]
+
+
+def by_maker(pnl):
+    """`pnl` indexed by (maker, token_name) instead of (wallet_id, token_name)"""
+    return pnl.set_axis(pd.MultiIndex.from_arrays([
+        decode_makers(pnl.index.get_level_values("wallet_id")),
+        pnl.index.get_level_values("token_name").astype(object),
+    ], names=["maker", "token_name"]))
+
+
+def test_wallet_pnl_matches_token_page_with_unpriced_swaps(generated):
+    collections, launch_blocks = generated
+    collections = {col_name: frame.copy() for col_name, frame in collections.items()}
+    rng = np.random.default_rng(0)
+    for frame in collections.values():
+        frame.loc[rng.choice(len(frame), 6, replace=False), "genesis_usdc_price"] = 0.0
+
+    _, wallet_pnl, _ = compute(shared_frame(collections), launch_blocks, launch_blocks)
+    wallet_pnl = wallet_pnl.set_index(["maker", "token_name"])
+
+    for col_name in collections:
+        df = token_frame(collections, col_name)
+        live = by_maker(swap_pnl(df, KEY, prefix=f"{df['token_name'].iloc[0]}_"))
+        precomputed = wallet_pnl.loc[live.index, live.columns]
+        pd.testing.assert_frame_equal(precomputed, live, check_dtype=False)
@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+from conftest import shared_frame
+from sniper_engine import (
+    CHUNK_WINDOW, HIGH_GAS_FEE, LARGE_BUY_THRESHOLD, LAUNCH_BLOCK_WINDOW, QUICK_SELL_WINDOW,
+    find_sniper_buys, large_buy_mask, quick_sell_snipers,
+)
+from swap_data import clean_swaps
+
+KEY = ["wallet_id", "token_name"]
+
+
+def sorted_buys(combined_df):
+    buy_df = combined_df[combined_df['swapType'] == 'buy']
+    return buy_df.sort_values(by=KEY + ['timestampReadable'])
+
+
+def baseline_large_buys(buy_df):
+    """The pages' original per-group chunking loop: every buy in a chunk over the threshold, as itertuples rows"""
+    chunked_buys = []
+    for _, group in buy_df.groupby(KEY, observed=True):
+        current_chunk = []
+        current_sum = 0
+        chunk_start_time = None
+        for row in group.itertuples():
+            if current_chunk and row.timestampReadable - chunk_start_time <= CHUNK_WINDOW:
+                current_chunk.append(row)
+                current_sum += row.OUT_BeforeTax
+            else:
+                if current_sum > LARGE_BUY_THRESHOLD:
+                    chunked_buys.extend(current_chunk)
+                chunk_start_time = row.timestampReadable
+                current_chunk = [row]
+                current_sum = row.OUT_BeforeTax
+        if current_sum > LARGE_BUY_THRESHOLD:
+            chunked_buys.extend(current_chunk)
+    return pd.DataFrame(chunked_buys)
+
+
+def baseline_sniper_buys(combined_df, token_launch_blocks):
+    """The row labels of the original loop's large buys that are high-gas and inside the launch window"""
+    large = baseline_large_buys(sorted_buys(combined_df))
+    high_gas = large[large['transactionFee'] > HIGH_GAS_FEE]
+    launch_block = high_gas['token_name'].astype(object).map(token_launch_blocks)
+    return sorted(high_gas.loc[high_gas['blockNumber'] <= launch_block + LAUNCH_BLOCK_WINDOW, 'Index'])
+
+
+def baseline_quick_sell_pairs(sniper_buys, combined_df):
+    """The (wallet, token) pairs the pages' original buy x sell merge kept"""
+    sells = combined_df[combined_df['swapType'] == 'sell'][KEY + ['timestampReadable']]
+    merged = pd.merge(sniper_buys[KEY + ['timestampReadable']], sells, on=KEY, suffixes=('_buy', '_sell'))
+    time_diff = (merged['timestampReadable_sell'] - merged['timestampReadable_buy']).dt.total_seconds()
+    quick_sells = merged[time_diff.between(0, QUICK_SELL_WINDOW.total_seconds())]
+    return set(zip(quick_sells['wallet_id'], quick_sells['token_name'].astype(object)))
+
+
+@pytest.fixture(scope="module")
+def swaps(generated):
+    collections, _ = generated
+    return clean_swaps(shared_frame(collections))
+
+
+@pytest.fixture(params=["launch", "everything"])
+def launch_blocks(request, generated, swaps):
+    """The generator's launch blocks, or blocks past every swap so every large high-gas buy counts"""
+    if request.param == "launch":
+        return generated[1]
+    return {token: int(swaps['blockNumber'].max()) for token in generated[1]}
+
+
+def test_large_buys_match_baseline_loop(swaps):
+    buy_df = sorted_buys(swaps)
+    large = buy_df.index[large_buy_mask(buy_df, "OUT_BeforeTax", KEY)]
+    assert len(large)
+    assert sorted(large) == sorted(baseline_large_buys(buy_df)['Index'])
+
+
+def test_sniper_buys_match_baseline_loop(swaps, launch_blocks):
+    sniper_buys = find_sniper_buys(swaps, launch_blocks)
+    assert len(sniper_buys)
+    assert sorted(sniper_buys['Index']) == baseline_sniper_buys(swaps, launch_blocks)
+
+
+def assert_quick_sells_match(sniper_buys, swaps):
+    snipers = quick_sell_snipers(sniper_buys, swaps)
+    expected = baseline_quick_sell_pairs(sniper_buys, swaps)
+    assert expected
+    assert set(zip(snipers['wallet_id'], snipers['token_name'].astype(object))) == expected
+    pairs = pd.MultiIndex.from_frame(sniper_buys[KEY].astype({"token_name": object}))
+    assert len(snipers) == pairs.isin(list(expected)).sum()
+
+
+def test_quick_sells_match_baseline_merge(swaps, launch_blocks):
+    assert_quick_sells_match(find_sniper_buys(swaps, launch_blocks), swaps)
+
+
+def test_quick_sells_of_every_buy_match_baseline_merge(swaps):
+    assert_quick_sells_match(sorted_buys(swaps).rename_axis("Index").reset_index(), swaps)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from bench.generator import documents
+from swap_table import build_query, fetch_page, sort_fields
+
+mongomock = pytest.importorskip("mongomock")
+
+TOKEN = "jarvis"
+PAGE_SIZE = 23
+
+
+@pytest.fixture(scope="module")
+def collection(generated):
+    collections, _ = generated
+    docs = documents(collections[f"{TOKEN}_swap"].head(400))
+    rng = np.random.default_rng(3)
+    # a few documents with a null or missing value in every sortable field
+    for field in sort_fields(TOKEN).values():
+        for i in rng.choice(len(docs), 6, replace=False):
+            if i % 2:
+                docs[i][field] = None
+            else:
+                docs[i].pop(field, None)
+    # and runs of equal values, so pages break inside ties
+    for i in rng.choice(len(docs), 30, replace=False):
+        docs[i]["genesis_usdc_price"] = 0.005
+    for i, doc in enumerate(docs):
+        doc["_id"] = i
+    collection = mongomock.MongoClient().db[f"{TOKEN}_swap"]
+    collection.insert_many(docs)
+    return collection
+
+
+def expected_ids(collection, query, field, ascending):
+    """_ids in MongoDB's (field, _id) order: null and missing values sort before every number"""
+    docs = list(collection.find(query, {field: 1}))
+    ids = [doc["_id"] for doc in sorted(docs, key=lambda doc: (doc.get(field) is not None, doc.get(field) or 0, doc["_id"]))]
+    return ids if ascending else ids[::-1]
+
+
+def paged_ids(collection, query, sort_col, ascending):
+    ids, after = [], None
+    while True:
+        rows, after = fetch_page(collection, TOKEN, query, sort_col, ascending, after, page_size=PAGE_SIZE)
+        assert len(rows) <= PAGE_SIZE
+        ids += [row["_id"] for row in rows]
+        if after is None:
+            return ids
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+@pytest.mark.parametrize("sort_col", list(sort_fields(TOKEN)))
+def test_keyset_pages_cover_every_row_once_in_order(collection, sort_col, ascending):
+    field = sort_fields(TOKEN)[sort_col]
+    assert paged_ids(collection, {}, sort_col, ascending) == expected_ids(collection, {}, field, ascending)
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_keyset_pages_with_filters(collection, ascending):
+    query = build_query(TOKEN, swap_type="Buy", label="normal")
+    ids = paged_ids(collection, query, "GENESIS \nPRICE ($)", ascending)
+    assert ids == expected_ids(collection, query, "genesis_usdc_price", ascending)
+    assert len(ids) == collection.count_documents(query) > PAGE_SIZE
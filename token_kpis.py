@@ -0,0 +1,144 @@
+"""Token KPIs for the transactions tab, aggregated in MongoDB with a pandas fallback."""
+import pandas as pd
+
+TOP_N = 10
+
+
+class KpiSchemaError(ValueError):
+    """Raised when aggregated KPI results don't fit the expected swap schema"""
+
+
+def shorten_maker(addr):
+    return f"{addr[:5]}...{addr[-5:]}" if isinstance(addr, str) else addr
+
+
+def kpi_pipeline(token):
+    """Single $facet pipeline producing every tab-1 KPI for `token`"""
+    token_in, token_out = f"{token.upper()}_IN", f"{token.upper()}_OUT"
+
+    def top_traders(swap_type):
+        return [
+            {"$match": {"swapType": swap_type, "maker": {"$type": "string"}}},
+            {"$group": {"_id": "$maker", "usd": {"$sum": "$usd"}}},
+            {"$sort": {"usd": -1}},
+            {"$limit": TOP_N},
+        ]
+
+    return [
+        {"$project": {
+            "_id": 0,
+            "maker": 1,
+            "swapType": 1,
+            "day": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": [{"$type": "$timestampReadable"}, "date"]},
+                     "then": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestampReadable"}}},
+                    {"case": {"$eq": [{"$type": "$timestampReadable"}, "string"]},
+                     "then": {"$substrCP": ["$timestampReadable", 0, 10]}},
+                ],
+                "default": None,
+            }},
+            "amount": {"$round": [{"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$swapType", "buy"]}, "then": {"$ifNull": [f"${token_out}", 0]}},
+                    {"case": {"$eq": ["$swapType", "sell"]}, "then": {"$ifNull": [f"${token_in}", 0]}},
+                ],
+                "default": None,
+            }}, 4]},
+            "price": {"$ifNull": ["$genesis_usdc_price", 0]},
+        }},
+        {"$addFields": {"usd": {"$multiply": ["$amount", "$price"]}}},
+        {"$facet": {
+            "traders": [
+                {"$match": {"maker": {"$type": "string"}}},
+                {"$group": {"_id": "$maker"}},
+                {"$count": "n"},
+            ],
+            "volume": [{"$group": {"_id": "$swapType", "usd": {"$sum": "$usd"}}}],
+            "daily": [
+                {"$match": {"day": {"$type": "string"}}},
+                {"$group": {"_id": "$day", "amount": {"$sum": "$amount"}}},
+                {"$sort": {"_id": 1}},
+            ],
+            "buyers": top_traders("buy"),
+            "sellers": top_traders("sell"),
+        }},
+    ]
+
+
+def _top_frame(rows, value_col):
+    df = pd.DataFrame({
+        "MAKER_CLEAN": [shorten_maker(row["_id"]) for row in rows],
+        value_col: [float(row["usd"]) for row in rows],
+    })
+    df["MAKER_SHORT"] = df["MAKER_CLEAN"].apply(lambda a: a[:6] + "..." + a[-4:])
+    return df
+
+
+def aggregate_token_kpis(db, token):
+    """Compute tab-1 KPIs server-side; only the small result sets are transferred.
+
+    Raises pymongo's OperationFailure if the server rejects the pipeline and
+    KpiSchemaError if the results don't look like the expected schema.
+    """
+    result = next(db[f"{token}_swap"].aggregate(kpi_pipeline(token), allowDiskUse=True), None)
+    if result is None:
+        raise KpiSchemaError("aggregation returned no document")
+
+    daily = result["daily"]
+    dates = pd.to_datetime(pd.Series([row["_id"] for row in daily], dtype=object), format="%Y-%m-%d", errors="coerce")
+    if dates.isna().any():
+        raise KpiSchemaError("timestampReadable is not an ISO date")
+    volume = {row["_id"]: float(row["usd"]) for row in result["volume"]}
+
+    return {
+        "unique_makers": result["traders"][0]["n"] if result["traders"] else 0,
+        "buy_volume_usd": volume.get("buy", 0.0),
+        "sell_volume_usd": volume.get("sell", 0.0),
+        "volume_df": pd.DataFrame({"date": dates.dt.date, token.upper(): [float(row["amount"]) for row in daily]}),
+        "buyers": _top_frame(result["buyers"], "buy_volume_usd"),
+        "sellers": _top_frame(result["sellers"], "sell_volume_usd"),
+    }
+
+
+def token_kpis_from_frame(tabdf, token):
+    """Compute tab-1 KPIs in pandas from the fully loaded transactions frame"""
+    token_col = token.upper()
+    tabdf = tabdf.copy()
+    tabdf["date"] = tabdf["TIME"].dt.date
+    volume_df = tabdf.groupby("date")[token_col].sum().reset_index()
+
+    tabdf["MAKER_CLEAN"] = tabdf["MAKER"].str.replace(r"<.*?>", "", regex=True)
+    unique_makers = tabdf["MAKER_CLEAN"].nunique()
+
+    sells = tabdf[tabdf["TX TYPE"] == "sell"]
+    buys = tabdf[tabdf["TX TYPE"] == "buy"]
+    sell_volume_usd = (sells[token_col] * sells["GENESIS \nPRICE ($)"]).sum()
+    buy_volume_usd = (buys[token_col] * buys["GENESIS \nPRICE ($)"]).sum()
+
+    # BUYERS / SELLERS: Group by address, compute total USD traded
+    buyers = (
+        buys.groupby("MAKER_CLEAN")
+        .apply(lambda df: (df[token_col] * df["GENESIS \nPRICE ($)"]).sum())
+        .nlargest(TOP_N)
+        .reset_index(name="buy_volume_usd")
+    )
+    sellers = (
+        sells.groupby("MAKER_CLEAN")
+        .apply(lambda df: (df[token_col] * df["GENESIS \nPRICE ($)"]).sum())
+        .nlargest(TOP_N)
+        .reset_index(name="sell_volume_usd")
+    )
+
+    # Shorten address for readability
+    buyers["MAKER_SHORT"] = buyers["MAKER_CLEAN"].apply(lambda a: a[:6] + "..." + a[-4:])
+    sellers["MAKER_SHORT"] = sellers["MAKER_CLEAN"].apply(lambda a: a[:6] + "..." + a[-4:])
+
+    return {
+        "unique_makers": unique_makers,
+        "buy_volume_usd": buy_volume_usd,
+        "sell_volume_usd": sell_volume_usd,
+        "volume_df": volume_df,
+        "buyers": buyers,
+        "sellers": sellers,
+    }
@@ -0,0 +1,74 @@
+"""Process-wide dictionary of wallet addresses to dense integer IDs."""
+import threading
+
+import numpy as np
+import pandas as pd
+
+MISSING_ID = -1
+
+
+class WalletDictionary:
+    """Append-only address <-> ID mapping shared by every page and token.
+
+    IDs are int32s handed out in first-seen order and never reused, so frames
+    and PnL state encoded at different times (or for different tokens) join
+    on the same integers. A batch is hashed once by `pd.factorize`, so the
+    dictionary is only consulted once per distinct address.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._addresses = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def encode(self, addresses):
+        """int32 IDs for `addresses`; missing addresses get MISSING_ID"""
+        codes, uniques = pd.factorize(pd.Series(addresses, copy=False))
+        with self._lock:
+            for address in uniques:
+                if address not in self._ids:
+                    self._ids[address] = len(self._addresses)
+                    self._addresses.append(address)
+            unique_ids = np.fromiter((self._ids[address] for address in uniques), dtype=np.int32, count=len(uniques))
+        # code -1 (missing) picks the trailing MISSING_ID
+        return np.append(unique_ids, np.int32(MISSING_ID))[codes]
+
+    def decode(self, ids):
+        """Addresses for `ids`, as an object array; MISSING_ID decodes to None"""
+        addresses = self._addresses
+        return np.array([addresses[i] if i >= 0 else None for i in np.asarray(ids).tolist()], dtype=object)
+
+
+wallets = WalletDictionary()
+
+
+def encode_makers(df, dictionary=wallets):
+    """Replace the `maker` address column with its `wallet_id`.
+
+    Swaps without a maker are kept with MISSING_ID: they still count for
+    latest prices, launch blocks and volumes. Per-wallet groupings leave them
+    out with `known_wallets`.
+    """
+    if "maker" not in df.columns:
+        return df
+    df = df.copy()
+    position = df.columns.get_loc("maker")
+    ids = dictionary.encode(df.pop("maker"))
+    df.insert(position, "wallet_id", ids)
+    return df
+
+
+def known_wallets(df):
+    """Rows of `df` with a wallet, as a groupby on the old `maker` column skipped missing makers"""
+    if "wallet_id" not in df.columns:
+        return df
+    known = df["wallet_id"].to_numpy() != MISSING_ID
+    return df if known.all() else df[known]
+
+
+def decode_makers(ids, dictionary=wallets):
+    """Wallet addresses for display"""
+    return dictionary.decode(ids)